@@ -0,0 +1,139 @@
+"""Client-side throughput, connection pooling, and retry behavior against a FakeMattermost on localhost.
+
+Posts incoming webhooks with the sync MattermostClient (one thread, then a thread pool) and with the pooled
+AsyncMattermostClient (directly, then through send_incoming_webhooks across 50 channels), with and without simulated
+server latency; then delivers delayed responses through DeliveryQueue while the server throttles and fails a share of
+requests, to show what the retries recover.
+
+    python benchmarks/bench_client.py [--messages N] [--concurrency C] [--latency SECONDS]
+
+Requires the `bench` extra (httpx and aiohttp).
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from matterbot import AsyncMattermostClient, Incoming, MattermostClient
+from matterbot.server.delivery import DeliveryQueue
+from matterbot.testing import FakeMattermost
+
+
+def sync_sequential(mattermost: FakeMattermost, messages: int, concurrency: int) -> None:
+    client = MattermostClient()
+    for n in range(messages):
+        client.incoming_webhook(
+            hook_url=mattermost.hook_url("bench"), body=Incoming(text=f"message {n}")
+        ).raise_for_status()
+
+
+def sync_threads(mattermost: FakeMattermost, messages: int, concurrency: int) -> None:
+    client = MattermostClient()
+
+    def post(n: int) -> None:
+        client.incoming_webhook(
+            hook_url=mattermost.hook_url("bench"), body=Incoming(text=f"message {n}")
+        ).raise_for_status()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(post, range(messages)))
+
+
+def async_pooled(mattermost: FakeMattermost, messages: int, concurrency: int) -> None:
+    async def run() -> None:
+        async with AsyncMattermostClient(limit_per_host=concurrency) as client:
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def post(n: int) -> None:
+                async with semaphore:
+                    await client.incoming_webhook(
+                        hook_url=mattermost.hook_url("bench"),
+                        body=Incoming(text=f"message {n}"),
+                    )
+
+            await asyncio.gather(*(post(n) for n in range(messages)))
+
+    asyncio.run(run())
+
+
+def async_bulk(mattermost: FakeMattermost, messages: int, concurrency: int) -> None:
+    async def run() -> None:
+        async with AsyncMattermostClient(limit_per_host=concurrency) as client:
+            hook_url = mattermost.hook_url("bench")
+            results = await client.send_incoming_webhooks(
+                (
+                    (hook_url, Incoming(text=f"message {n}", channel=f"c{n % 50}"))
+                    for n in range(messages)
+                ),
+                concurrency=concurrency,
+            )
+            assert all(result.ok for result in results)
+
+    asyncio.run(run())
+
+
+CLIENTS = {
+    "sync, sequential": sync_sequential,
+    "sync, thread pool": sync_threads,
+    "async, pooled": async_pooled,
+    "async, bulk": async_bulk,
+}
+
+
+def retries(mattermost: FakeMattermost, messages: int) -> dict:
+    """Deliver one delayed response per response_url through DeliveryQueue; returns its counters"""
+
+    async def run() -> dict:
+        async with AsyncMattermostClient() as client:
+
+            async def send(response_url: str, body: dict) -> int:
+                response = await client.slash_command_delayed_response(
+                    response_url=response_url, body=body
+                )
+                return response.status
+
+            queue = DeliveryQueue(send, coalesce_window=0, backoff=0.01, max_backoff=0.2)
+            deadline = asyncio.get_running_loop().time() + 60
+            for n in range(messages):
+                queue.submit(mattermost.response_url(str(n)), {"text": f"done {n}"}, deadline)
+            while len(queue):
+                await asyncio.sleep(0.01)
+            return queue.stats()
+
+    return asyncio.run(run())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    for latency in (0.0, args.latency):
+        print(f"server latency {latency * 1000:.0f} ms")
+        for name, run in CLIENTS.items():
+            # A sequential client can't overlap latency; keep its run short
+            messages = args.messages if latency == 0 or run is not sync_sequential else 100
+            with FakeMattermost(latency=latency) as mattermost:
+                started = time.perf_counter()
+                run(mattermost, messages, args.concurrency)
+                elapsed = time.perf_counter() - started
+                assert len(mattermost.received(mattermost.hook_url("bench"))) == messages
+            print(f"  {name:<20} {messages / elapsed:8.0f} msg/s")
+
+    with FakeMattermost(throttle_rate=0.05, error_rate=0.05, seed=0) as mattermost:
+        started = time.perf_counter()
+        stats = retries(mattermost, args.messages)
+        elapsed = time.perf_counter() - started
+        print("retries with 5% 429s and 5% 503s")
+        print(
+            f"  delivered {stats['sent']}/{args.messages} in {elapsed:.2f} s"
+            f"  ({stats['retried']} retries, {stats['failed']} failed, {stats['dropped']} dropped)"
+            f"  server saw {mattermost.stats()['by_status']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Import time of matterbot's entry points, each in a fresh interpreter.
+
+Short-lived scripts (a cron job posting one incoming webhook, say) can spend longer importing than working, so this
+times each import the way such a script would pay for it: a new `python -c` per run, less the interpreter's own
+startup, median of --runs.  It also reports how many modules each import loads and whether FastAPI and uplink are
+among them, and with --detail, the modules that cost the most (from `python -X importtime`).
+
+    python benchmarks/bench_import.py [--runs N] [--detail] [--json PATH]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+STATEMENTS = {
+    "package": "import matterbot",
+    "models": "from matterbot.models import Incoming",
+    "client": "from matterbot import Incoming, MattermostClient",
+    "async client": "from matterbot import AsyncMattermostClient",
+    "server": "from matterbot import MatterbotServer",
+    "everything": "from matterbot import *",
+}
+
+_PROBE = "; import sys, json; print(json.dumps([len(sys.modules), 'fastapi' in sys.modules, 'uplink' in sys.modules]))"
+
+
+def run(code: str) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-W", "ignore", "-c", code], check=True)
+    return time.perf_counter() - started
+
+
+def probe(code: str) -> tuple[int, bool, bool]:
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", code + _PROBE],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return tuple(json.loads(output))
+
+
+def heaviest(code: str, count: int = 8) -> list[tuple[str, float]]:
+    """The modules with the most cumulative import time, outermost first among equals"""
+    stderr = subprocess.run(
+        [sys.executable, "-W", "ignore", "-X", "importtime", "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        modules.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(modules, key=lambda m: -m[1])[:count]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--detail", action="store_true")
+    parser.add_argument("--json", metavar="PATH", help="also write the results here")
+    args = parser.parse_args()
+
+    baseline = statistics.median(run("pass") for _ in range(args.runs))
+    print(f"interpreter startup {baseline * 1000:7.1f} ms (subtracted below)")
+    results = {}
+    for name, code in STATEMENTS.items():
+        run(code)  # warm the OS file cache and the bytecode cache
+        seconds = statistics.median(run(code) for _ in range(args.runs)) - baseline
+        modules, fastapi, uplink = probe(code)
+        results[name] = {
+            "statement": code,
+            "seconds": seconds,
+            "modules": modules,
+            "fastapi": fastapi,
+            "uplink": uplink,
+        }
+        loaded = ", ".join(n for n, on in (("fastapi", fastapi), ("uplink", uplink)) if on)
+        print(f"{name:<13} {seconds * 1000:7.1f} ms  {modules:5} modules  {loaded or '-':<16} {code}")
+        if args.detail:
+            for module, cumulative in heaviest(code):
+                print(f"    {cumulative * 1000:7.1f} ms  {module}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
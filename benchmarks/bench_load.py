@@ -0,0 +1,291 @@
+"""End-to-end latency, throughput, and memory of a MatterbotServer app under synthetic webhook traffic.
+
+Each scenario builds a fresh FastAPI app wrapped by MatterbotServer, in dispatcher mode (one endpoint for every
+command) and in route mode (a path per command), and drives it in-process through httpx's ASGI transport at a fixed
+concurrency, so the numbers cover matterbot and FastAPI rather than a network stack.  Delayed
+responses are POSTed by the real AsyncMattermostClient to a FakeMattermost on localhost, which records when each one
+arrives.  Memory is measured in a second, shorter pass under tracemalloc (which is too slow to leave on while timing).
+
+    python benchmarks/bench_load.py [--requests N] [--concurrency C] [--scenario NAME ...] [--mode MODE ...] [--json PATH]
+
+Requires the `bench` extra (httpx and aiohttp).  Save a run with --json and compare against it before upgrading.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+from typing import Any, Callable
+
+import fastapi
+import httpx
+
+from matterbot import AsyncMattermostClient, MatterbotServer
+from matterbot.testing import FakeMattermost
+
+DISPATCH_PATH = "/hooks"
+TOKEN = "benchmark-token"
+
+
+def slash_payload(n: int, command: str, mattermost: FakeMattermost) -> dict:
+    return {
+        "channel_id": "c" * 26,
+        "channel_name": "town-square",
+        "command": command,
+        "response_url": mattermost.response_url(str(n)),
+        "team_domain": "example",
+        "team_id": "t" * 26,
+        "text": f"api production {n}",
+        "token": TOKEN,
+        "trigger_id": f"trigger-{n}",
+        "user_id": "u" * 26,
+        "user_name": "benchmark",
+    }
+
+
+def outgoing_payload(n: int, trigger_word: str, mattermost: FakeMattermost) -> dict:
+    return {
+        "channel_id": "c" * 26,
+        "channel_name": "town-square",
+        "team_domain": "example",
+        "team_id": "t" * 26,
+        "post_id": f"post-{n}",
+        "text": f"{trigger_word} api production {n}",
+        "timestamp": "2024-01-01T00:00:00Z",
+        "token": TOKEN,
+        "trigger_word": trigger_word,
+        "user_id": "u" * 26,
+        "user_name": "benchmark",
+    }
+
+
+def attachments(count: int) -> list[dict]:
+    return [
+        {
+            "fallback": f"Service {n} status",
+            "color": "#36a64f",
+            "pretext": "Status report",
+            "text": f"Service {n} is healthy " * 8,
+            "title": f"service-{n}",
+            "title_link": f"https://status.example.com/services/{n}",
+            "fields": [
+                {"title": "Latency", "value": "12ms", "short": True},
+                {"title": "Error rate", "value": "0.01%", "short": True},
+                {"title": "Version", "value": f"3f9c2e{n}", "short": True},
+            ],
+        }
+        for n in range(count)
+    ]
+
+
+async def deploy(request):
+    return {"response_type": "in_channel", "text": f"Deploying {request.text}"}
+
+
+async def notify_hook(request):
+    return {"text": f"Deployed {request.text}"}
+
+
+def audit_hook(request):
+    return {"response_type": "ephemeral", "text": f"Audit logged for {request.user_name}"}
+
+
+async def status(request):
+    return {"response_type": "in_channel", "attachments": attachments(40)}
+
+
+async def progress(request):
+    yield {"response_type": "in_channel", "text": f"Deploying {request.text}"}
+    for step in ("built", "tested", "released"):
+        await asyncio.sleep(0.01)
+        yield {"response_type": "in_channel", "text": f"{request.text}: {step}"}
+
+
+async def echo(request):
+    return {"text": request.text, "props": None}
+
+
+# Each scenario registers its commands, and returns a payload factory, the command's own path (for route mode), and
+# whether requests get delayed responses
+Built = tuple[Callable[[int, FakeMattermost], dict], str, bool]
+Scenario = Callable[[MatterbotServer], Built]
+MODES = ("dispatch", "route")
+
+
+def plain_slash(server: MatterbotServer) -> Built:
+    server.slash(deploy, path="/deploy", token=TOKEN, command="/deploy")()
+    return lambda n, mattermost: slash_payload(n, "/deploy", mattermost), "/deploy", False
+
+
+def slash_with_hooks(server: MatterbotServer) -> Built:
+    server.slash_delayed_response(
+        deploy,
+        path="/deploy",
+        token=TOKEN,
+        command="/deploy",
+        hooks=[notify_hook, audit_hook],
+    )()
+    return lambda n, mattermost: slash_payload(n, "/deploy", mattermost), "/deploy", True
+
+
+def streaming_slash(server: MatterbotServer) -> Built:
+    server.slash(progress, path="/deploy", token=TOKEN, command="/deploy")()
+    return lambda n, mattermost: slash_payload(n, "/deploy", mattermost), "/deploy", True
+
+
+def outgoing(server: MatterbotServer) -> Built:
+    server.outgoing(echo, path="/echo", trigger_words=["echo"])()
+    return lambda n, mattermost: outgoing_payload(n, "echo", mattermost), "/echo", False
+
+
+def large_attachments(server: MatterbotServer) -> Built:
+    server.slash(status, path="/status", token=TOKEN, command="/status")()
+    return lambda n, mattermost: slash_payload(n, "/status", mattermost), "/status", False
+
+
+SCENARIOS = {
+    "plain slash": plain_slash,
+    "slash with hooks": slash_with_hooks,
+    "streaming slash": streaming_slash,
+    "outgoing": outgoing,
+    "large attachments": large_attachments,
+}
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    if len(samples) < 2:
+        return {"p50": samples[0] if samples else 0.0, "p95": 0.0, "p99": 0.0}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+async def drive(
+    build: Scenario, requests: int, concurrency: int, mode: str = "dispatch"
+) -> dict[str, Any]:
+    """Send `requests` webhooks from `concurrency` concurrent senders, and wait for every delayed response"""
+    mattermost = FakeMattermost()
+    await mattermost.start()
+    client = AsyncMattermostClient()
+    app = fastapi.FastAPI()
+    dispatch_path = DISPATCH_PATH if mode == "dispatch" else None
+    server = MatterbotServer(app, client=client, dispatch_path=dispatch_path)
+    payload_for, path, delayed = build(server)
+    server()
+    url = dispatch_path or path
+
+    latencies: list[float] = []
+    sent_at: dict[str, float] = {}
+    errors = 0
+    counter = iter(range(requests))
+
+    async def sender(http: httpx.AsyncClient) -> None:
+        nonlocal errors
+        for n in counter:
+            payload = payload_for(n, mattermost)
+            started = time.perf_counter()
+            sent_at[f"/hooks/commands/{n}"] = started
+            response = await http.post(url, data=payload)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://matterbot") as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(sender(http) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    # Shut down the way a deploy would: let every hook finish and every delayed response go out
+    await server.drain(timeout=60)
+    await client.close()
+    await mattermost.stop()
+
+    # A request's delayed response is complete when the last post for its response_url arrives
+    completed: dict[str, float] = {}
+    for post in mattermost.posts:
+        completed[post.path] = post.received_at
+    deliveries = [at - sent_at[path] for path, at in completed.items()]
+    return {
+        "requests": requests,
+        "errors": errors,
+        "elapsed": elapsed,
+        "throughput": requests / elapsed,
+        "latency": percentiles(sorted(latencies)),
+        "delivery": percentiles(sorted(deliveries)) if delayed else None,
+        "posts": len(mattermost.posts),
+        "undelivered": requests - len(deliveries) if delayed else 0,
+    }
+
+
+async def measure_memory(
+    build: Scenario, requests: int, concurrency: int, mode: str = "dispatch"
+) -> dict[str, float]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        await drive(build, requests, concurrency, mode)
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_kib": (peak - baseline) / 1024,
+        "retained_kib": (current - baseline) / 1024,
+        "kib_per_request": (peak - baseline) / 1024 / requests,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--memory-requests", type=int, default=200)
+    parser.add_argument(
+        "--scenario", action="append", choices=list(SCENARIOS), dest="scenarios"
+    )
+    parser.add_argument("--mode", action="append", choices=MODES, dest="modes")
+    parser.add_argument("--json", metavar="PATH", help="also write the results here")
+    args = parser.parse_args()
+
+    results = {}
+    runs = [(name, mode) for name in args.scenarios or SCENARIOS for mode in args.modes or MODES]
+    for name, mode in runs:
+        build = SCENARIOS[name]
+        # Warm up imports, pydantic schemas and connection pools outside the timed run
+        asyncio.run(drive(build, min(args.requests, 100), args.concurrency, mode))
+        result = asyncio.run(drive(build, args.requests, args.concurrency, mode))
+        result["memory"] = asyncio.run(
+            measure_memory(build, args.memory_requests, args.concurrency, mode)
+        )
+        results[f"{name} ({mode})"] = result
+
+        latency = result["latency"]
+        print(
+            f"{name} ({mode}): {result['throughput']:8.0f} req/s  ({result['errors']} errors)"
+        )
+        print(
+            "  response  "
+            + "  ".join(f"{k} {v * 1000:7.2f} ms" for k, v in latency.items())
+        )
+        if result["delivery"] is not None:
+            print(
+                "  delivery  "
+                + "  ".join(f"{k} {v * 1000:7.2f} ms" for k, v in result["delivery"].items())
+                + f"  ({result['posts']} posts, {result['undelivered']} undelivered)"
+            )
+        memory = result["memory"]
+        print(
+            f"  memory    peak {memory['peak_kib']:9.1f} KiB  retained {memory['retained_kib']:9.1f} KiB"
+            f"  {memory['kib_per_request']:6.2f} KiB/request"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Per-response CPU cost of turning a handler's return value into a JSON response body.
+
+Compares FastAPI's response_model path (validate, dump to Python, json.dumps) with matterbot's `render`, both
+validated and in trusted mode.
+
+    python benchmarks/bench_serialization.py [--iterations N]
+"""
+
+import argparse
+import json
+import time
+
+from matterbot.server.serialization import SLASH_ADAPTER, render
+
+PAYLOADS = {
+    "text": {
+        "text": "Deployed api@3f9c2e1 to production",
+        "response_type": "in_channel",
+        "username": "deploybot",
+        "icon_url": "https://example.com/deploybot.png",
+    },
+    "attachments": {
+        "response_type": "in_channel",
+        "attachments": [
+            {
+                "fallback": f"Service {n} status",
+                "color": "#36a64f",
+                "pretext": "Status report",
+                "text": f"Service {n} is healthy",
+                "title": f"service-{n}",
+                "title_link": f"https://status.example.com/services/{n}",
+                "fields": [
+                    {"title": "Latency", "value": "12ms", "short": True},
+                    {"title": "Error rate", "value": "0.01%", "short": True},
+                ],
+                "actions": [
+                    {
+                        "id": f"restart{n}",
+                        "name": "Restart",
+                        "style": "danger",
+                        "integration": {
+                            "url": "https://bot.example.com/actions/restart",
+                            "context": {"service": n},
+                        },
+                    }
+                ],
+            }
+            for n in range(10)
+        ],
+    },
+}
+
+
+def fastapi_default(result):
+    """What FastAPI does for a response_model route: validate, serialize to JSON-able Python, then json.dumps"""
+    model = SLASH_ADAPTER.validate_python(result)
+    content = SLASH_ADAPTER.dump_python(model, mode="json")
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode()
+
+
+PATHS = {
+    "fastapi response_model": fastapi_default,
+    "render": lambda result: render(result, SLASH_ADAPTER).body,
+    "render trusted": lambda result: render(result, SLASH_ADAPTER, trusted=True).body,
+}
+
+
+def measure(fn, payload, iterations: int) -> float:
+    """Mean CPU microseconds per call"""
+    for _ in range(min(iterations, 1000)):
+        fn(payload)
+    started = time.process_time()
+    for _ in range(iterations):
+        fn(payload)
+    return (time.process_time() - started) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    for payload_name, payload in PAYLOADS.items():
+        print(f"{payload_name} payload ({len(fastapi_default(payload))} bytes)")
+        baseline = None
+        for path_name, fn in PATHS.items():
+            cost = measure(fn, payload, args.iterations)
+            baseline = baseline or cost
+            print(f"  {path_name:<24} {cost:8.2f} us/response  {baseline / cost:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,32 +5,111 @@
 
 __version__ = "0.1.0"
 
-from matterbot.client import MattermostClient
-from matterbot.models.actions import MessageAction as Action
-from matterbot.models.actions import MessageActionIntegration as ActionIntegration
-from matterbot.models.actions import MessageActionSelectOption as ActionSelect
-from matterbot.models.incoming import IncomingWebhookBody as Incoming
-from matterbot.models.outgoing import OutgoingWebhookBody as OutgoingRequest
-from matterbot.models.outgoing import OutgoingWebhookResponseBody as Outgoing
-from matterbot.models.outgoing import OutgoingWebhookResponseType as OutgoingResponseType
-from matterbot.models.slash import SlashWebhookBody as SlashRequest
-from matterbot.models.slash import SlashWebhookExtraResponse as SlashExtra
-from matterbot.models.slash import SlashWebhookResponseBody as Slash
-from matterbot.models.slash import SlashWebhookResponseType as SlashResponseType
-from matterbot.server import MatterbotServer
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from matterbot.client import AsyncMattermostClient, MattermostClient
+    from matterbot.client.bulk import IncomingResult
+    from matterbot.models.actions import MessageAction as Action
+    from matterbot.models.actions import MessageActionIntegration as ActionIntegration
+    from matterbot.models.actions import MessageActionSelectOption as ActionSelect
+    from matterbot.models.incoming import IncomingWebhookBody as Incoming
+    from matterbot.models.outgoing import OutgoingWebhookBody as OutgoingRequest
+    from matterbot.models.outgoing import OutgoingWebhookResponseBody as Outgoing
+    from matterbot.models.outgoing import OutgoingWebhookResponseType as OutgoingResponseType
+    from matterbot.models.slash import SlashWebhookBody as SlashRequest
+    from matterbot.models.slash import SlashWebhookExtraResponse as SlashExtra
+    from matterbot.models.slash import SlashWebhookResponseBody as Slash
+    from matterbot.models.slash import SlashWebhookResponseType as SlashResponseType
+    from matterbot.models.templates import Slot, Template
+    from matterbot.server import MatterbotServer
+    from matterbot.server.cache import ResultCache
+    from matterbot.server.commands import Commands
+    from matterbot.server.dedupe import DedupeStore
+    from matterbot.server.jobs import JobStore
+    from matterbot.server.metrics import Metrics
+    from matterbot.server.ratelimit import RateLimiter
+    from matterbot.server.state import MemoryState, SQLiteState, StateBackend
+    from matterbot.tracing import LoggingExporter, OTLPExporter, Tracer
+
+# Exports are imported on first use (PEP 562), so a script that only posts an Incoming message with the client never
+# imports FastAPI and the server: name -> (module, attribute)
+_EXPORTS = {
+    "Action": ("matterbot.models.actions", "MessageAction"),
+    "ActionIntegration": ("matterbot.models.actions", "MessageActionIntegration"),
+    "ActionSelect": ("matterbot.models.actions", "MessageActionSelectOption"),
+    "AsyncMattermostClient": ("matterbot.client", "AsyncMattermostClient"),
+    "Commands": ("matterbot.server.commands", "Commands"),
+    "DedupeStore": ("matterbot.server.dedupe", "DedupeStore"),
+    "Incoming": ("matterbot.models.incoming", "IncomingWebhookBody"),
+    "IncomingResult": ("matterbot.client.bulk", "IncomingResult"),
+    "JobStore": ("matterbot.server.jobs", "JobStore"),
+    "LoggingExporter": ("matterbot.tracing", "LoggingExporter"),
+    "MatterbotServer": ("matterbot.server", "MatterbotServer"),
+    "MattermostClient": ("matterbot.client", "MattermostClient"),
+    "MemoryState": ("matterbot.server.state", "MemoryState"),
+    "Metrics": ("matterbot.server.metrics", "Metrics"),
+    "OTLPExporter": ("matterbot.tracing", "OTLPExporter"),
+    "Outgoing": ("matterbot.models.outgoing", "OutgoingWebhookResponseBody"),
+    "OutgoingRequest": ("matterbot.models.outgoing", "OutgoingWebhookBody"),
+    "OutgoingResponseType": ("matterbot.models.outgoing", "OutgoingWebhookResponseType"),
+    "RateLimiter": ("matterbot.server.ratelimit", "RateLimiter"),
+    "ResultCache": ("matterbot.server.cache", "ResultCache"),
+    "SQLiteState": ("matterbot.server.state", "SQLiteState"),
+    "Slash": ("matterbot.models.slash", "SlashWebhookResponseBody"),
+    "SlashExtra": ("matterbot.models.slash", "SlashWebhookExtraResponse"),
+    "SlashRequest": ("matterbot.models.slash", "SlashWebhookBody"),
+    "SlashResponseType": ("matterbot.models.slash", "SlashWebhookResponseType"),
+    "Slot": ("matterbot.models.templates", "Slot"),
+    "StateBackend": ("matterbot.server.state", "StateBackend"),
+    "Template": ("matterbot.models.templates", "Template"),
+    "Tracer": ("matterbot.tracing", "Tracer"),
+}
 
 __all__ = [
     "Action",
     "ActionIntegration",
     "ActionSelect",
+    "AsyncMattermostClient",
+    "Commands",
+    "DedupeStore",
     "Incoming",
+    "IncomingResult",
+    "JobStore",
+    "LoggingExporter",
     "MattermostClient",
     "MatterbotServer",
+    "MemoryState",
+    "Metrics",
+    "OTLPExporter",
     "Outgoing",
     "OutgoingRequest",
     "OutgoingResponseType",
+    "RateLimiter",
+    "ResultCache",
+    "SQLiteState",
     "Slash",
     "SlashExtra",
     "SlashRequest",
     "SlashResponseType",
+    "Slot",
+    "StateBackend",
+    "Template",
+    "Tracer",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module, attribute = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(module), attribute)
+    # Cache it, so __getattr__ isn't called for this name again
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
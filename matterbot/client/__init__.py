@@ -1,12 +1,200 @@
+from typing import AsyncIterable, Iterable, Optional, Union
+
 import uplink
+from pydantic import TypeAdapter
+from uplink.hooks import TransactionHook
 
+from matterbot.client.bulk import BulkSender, IncomingResult, Message
 from matterbot.models import Incoming, SlashExtra
+from matterbot.tracing import current_span
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+class _ModelBodyConverter(uplink.converters.Factory):
+    """Serializes Incoming / SlashExtra bodies straight to JSON bytes with precompiled pydantic TypeAdapters"""
+
+    _adapters = {Incoming: TypeAdapter(Incoming), SlashExtra: TypeAdapter(SlashExtra)}
+
+    def create_request_body_converter(self, cls, request_definition=None):
+        adapter = self._adapters.get(cls)
+        if adapter is None:
+            return None
+
+        def convert(value):
+            if isinstance(value, (bytes, bytearray)):
+                return value
+            if not isinstance(value, cls):
+                value = adapter.validate_python(value)
+            return adapter.dump_json(value, exclude_none=True)
+
+        return convert
+
+
+class _TraceContext(TransactionHook):
+    """Sends the current span's context along as a W3C `traceparent` header"""
+
+    def audit_request(self, consumer, request_builder):
+        span = current_span()
+        if span is not None:
+            request_builder.info["headers"]["traceparent"] = span.traceparent
 
 
 class MattermostClient(uplink.Consumer):
     """A Python client for (some small parts of) the Mattermost API / webhook integration"""
 
-    @uplink.json
+    def __init__(self, *args, converter=(), hooks=(), **kwargs) -> None:
+        if not isinstance(converter, (list, tuple)):
+            converter = (converter,)
+        if not isinstance(hooks, (list, tuple)):
+            hooks = (hooks,)
+        super().__init__(
+            *args,
+            converter=(_ModelBodyConverter(), *converter),
+            hooks=(_TraceContext(), *hooks),
+            **kwargs,
+        )
+
+    @uplink.headers(_JSON_HEADERS)
+    @uplink.post
+    def incoming_webhook(
+        self,
+        hook_url: uplink.Url,
+        body: uplink.Body(type=Incoming),  # type: ignore
+    ):
+        pass
+
+    @uplink.headers(_JSON_HEADERS)
+    @uplink.post
+    def slash_command_delayed_response(
+        self,
+        response_url: uplink.Url,
+        body: uplink.Body(type=SlashExtra),  # type: ignore
+    ):
+        pass
+
+
+async def _release(response):
+    """Read the body so the connection goes back to the pool, then surface HTTP errors"""
+    await response.read()
+    response.raise_for_status()
+    return response
+
+
+class _PooledAiohttpClient(uplink.AiohttpClient):
+    """An uplink aiohttp adapter that builds its connection pool on first use, since aiohttp
+    connectors must be created inside a running event loop."""
+
+    def __init__(self, connector_options: dict, session_options: dict) -> None:
+        super().__init__(session=None)
+        self._connector_options = connector_options
+        self._session_options = session_options
+        self._pool = None
+
+    async def session(self):
+        if self._pool is None or self._pool.closed:
+            import aiohttp
+
+            self._pool = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**self._connector_options),
+                **self._session_options,
+            )
+        return self._pool
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+class AsyncMattermostClient(MattermostClient):
+    """An asyncio variant of MattermostClient; every call returns an awaitable.
+
+    All calls share one aiohttp connection pool with per-host keep-alive, so repeated posts to the same Mattermost
+    host reuse warm connections instead of paying for TCP/TLS setup each time.  Requires the `async` extra (aiohttp).
+
+    ## Example
+
+    ```python
+    async with AsyncMattermostClient(limit_per_host=20, timeout=5) as client:
+        await client.incoming_webhook(hook_url=url, body=Incoming(text="deployed"))
+    ```
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        keepalive_timeout: float = 30.0,
+        timeout: Optional[float] = 30.0,
+        connect_timeout: Optional[float] = None,
+        **kwargs,
+    ) -> None:
+        """
+        limit: maximum number of open connections across all hosts (0 for no limit)
+        limit_per_host: maximum number of open connections to any one host (0 for no limit)
+        keepalive_timeout: seconds an idle connection is kept open for reuse
+        timeout: total seconds allowed per request, including connecting and reading the response
+        connect_timeout: seconds allowed to acquire a connection (from the pool or a new one)
+        """
+        try:
+            import aiohttp
+        except ImportError as e:
+            raise ImportError(
+                "AsyncMattermostClient requires aiohttp; install matterbot[async]"
+            ) from e
+
+        self._http = _PooledAiohttpClient(
+            connector_options=dict(
+                limit=limit,
+                limit_per_host=limit_per_host,
+                keepalive_timeout=keepalive_timeout,
+            ),
+            session_options=dict(
+                timeout=aiohttp.ClientTimeout(total=timeout, connect=connect_timeout),
+            ),
+        )
+        super().__init__(client=self._http, **kwargs)
+
+    async def close(self) -> None:
+        """Close every pooled connection"""
+        await self._http.close()
+
+    async def send_incoming_webhooks(
+        self,
+        messages: Union[Iterable[tuple[str, Message]], AsyncIterable[tuple[str, Message]]],
+        concurrency: int = 20,
+        rate_limit: Optional[float] = None,
+        burst: int = 1,
+        attempts: int = 3,
+        split: bool = True,
+    ) -> list[IncomingResult]:
+        """Post many (hook_url, message) pairs concurrently, returning one result per message in the order given.
+
+        Messages for the same hook URL and channel are posted one at a time, in order; up to `concurrency` posts are in
+        flight at once across them.  With `rate_limit`, each hook URL gets at most that many posts per second (in
+        bursts of up to `burst`).  Throttled, failed, and unreachable posts are retried, up to `attempts` tries in
+        total; failures are reported in the results rather than raised.  With `split`, a message over Mattermost's
+        size limits is sent as several consecutive posts, split at line and attachment boundaries.
+        """
+        sender = BulkSender(
+            self,
+            concurrency=concurrency,
+            rate_limit=rate_limit,
+            burst=burst,
+            attempts=attempts,
+            split=split,
+        )
+        return await sender.run(messages)
+
+    async def __aenter__(self) -> "AsyncMattermostClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    @uplink.response_handler(_release)
+    @uplink.headers(_JSON_HEADERS)
     @uplink.post
     def incoming_webhook(
         self,
@@ -15,7 +203,8 @@ class MattermostClient(uplink.Consumer):
     ):
         pass
 
-    @uplink.json
+    @uplink.response_handler(_release)
+    @uplink.headers(_JSON_HEADERS)
     @uplink.post
     def slash_command_delayed_response(
         self,
@@ -0,0 +1,199 @@
+import asyncio
+import random
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, Iterable, Optional, Union
+
+from matterbot.models import Incoming
+from matterbot.models.splitting import MAX_MESSAGE_LENGTH, split_post
+
+Message = Union[Incoming, dict]
+
+
+@dataclass
+class IncomingResult:
+    """The outcome of one message sent by `AsyncMattermostClient.send_incoming_webhooks`"""
+
+    index: int
+    hook_url: str
+    message: Message
+    status: Optional[int] = None
+    error: Optional[BaseException] = None
+    attempts: int = 0
+    posts: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status is not None and self.status < 400
+
+
+def _channel(message: Message) -> Optional[str]:
+    if isinstance(message, dict):
+        return message.get("channel")
+    return message.channel
+
+
+def _parts(message: Message) -> list[Message]:
+    """The message, or the posts it must be split into to fit Mattermost's limits"""
+    if isinstance(message, dict):
+        text, attachments = message.get("text"), message.get("attachments")
+    else:
+        text, attachments = message.text, message.attachments
+    # Only long text or attachments can be oversized; everything else is sent as it is, without another dump
+    if len(text or "") <= MAX_MESSAGE_LENGTH and not attachments:
+        return [message]
+    if not isinstance(message, dict):
+        message = message.model_dump(mode="json", exclude_none=True)
+    return split_post(message)
+
+
+def _transient(exc: BaseException) -> bool:
+    """Whether an error without an HTTP status is worth another try: connection failures and timeouts are, but
+    anything else (e.g. a message that fails validation) would only fail the same way again"""
+    if isinstance(exc, ValueError):
+        # Including requests' InvalidURL and MissingSchema, which are OSErrors as well
+        return False
+    if isinstance(exc, (OSError, asyncio.TimeoutError)):
+        return True
+    # aiohttp's connection errors aren't all OSErrors; it's only loaded if the client uses it
+    aiohttp = sys.modules.get("aiohttp")
+    return aiohttp is not None and isinstance(exc, aiohttp.ClientConnectionError)
+
+
+class _Pacer:
+    """Spaces out posts to each hook URL: `rate` per second on average, in bursts of up to `burst` (GCRA, like the
+    server's RateLimiter, but waiting for a slot instead of refusing)."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self._interval = 1.0 / rate
+        self._tolerance = (burst - 1) * self._interval
+        self._full_at: dict[str, float] = {}
+
+    async def wait(self, hook_url: str) -> None:
+        now = time.monotonic()
+        full_at = max(self._full_at.get(hook_url, now), now)
+        self._full_at[hook_url] = full_at + self._interval
+        delay = full_at - now - self._tolerance
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class BulkSender:
+    """Sends many incoming-webhook messages concurrently, in order within each (hook URL, channel) lane.
+
+    Each lane is worked through one message at a time, so a channel sees its messages in the order given, while up to
+    `concurrency` lanes post at once.  Only `max_queued` messages are read ahead of those in flight, so an endless (or
+    async) source is consumed as fast as it can be sent and no faster.  429s, 5xxs, connection errors and timeouts
+    are retried up to `attempts` times in total, honoring `Retry-After`, before the message is recorded as failed and
+    its lane moves on; other errors, such as a message that fails validation, fail it at once.  With `split`,
+    messages over Mattermost's size limits are sent as several consecutive posts.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        concurrency: int = 20,
+        rate_limit: Optional[float] = None,
+        burst: int = 1,
+        attempts: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        max_queued: Optional[int] = None,
+        split: bool = True,
+    ) -> None:
+        self.client = client
+        self.split = split
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._in_flight = asyncio.Semaphore(concurrency)
+        self._queued = asyncio.Semaphore(max_queued or concurrency * 8)
+        self._pacer = _Pacer(rate_limit, burst) if rate_limit else None
+        self._lanes: dict[tuple, deque[IncomingResult]] = {}
+        self._workers: set[asyncio.Task] = set()
+
+    async def run(
+        self,
+        messages: Union[Iterable[tuple[str, Message]], AsyncIterable[tuple[str, Message]]],
+    ) -> list[IncomingResult]:
+        results: list[IncomingResult] = []
+        try:
+            if isinstance(messages, AsyncIterable):
+                async for hook_url, message in messages:
+                    await self._enqueue(results, hook_url, message)
+            else:
+                for hook_url, message in messages:
+                    await self._enqueue(results, hook_url, message)
+            while self._workers:
+                await asyncio.gather(*self._workers)
+        except BaseException:
+            for worker in self._workers:
+                worker.cancel()
+            raise
+        return results
+
+    async def _enqueue(self, results: list, hook_url: str, message: Message) -> None:
+        await self._queued.acquire()
+        result = IncomingResult(len(results), str(hook_url), message)
+        results.append(result)
+        key = (result.hook_url, _channel(message))
+        lane = self._lanes.get(key)
+        if lane is not None:
+            lane.append(result)
+            return
+        self._lanes[key] = deque([result])
+        worker = asyncio.create_task(self._drain(key))
+        self._workers.add(worker)
+        worker.add_done_callback(self._workers.discard)
+
+    async def _drain(self, key: tuple) -> None:
+        lane = self._lanes[key]
+        while lane:
+            result = lane.popleft()
+            try:
+                await self._send(result)
+            finally:
+                self._queued.release()
+        # No await between the check above and here, so nothing can be added to the lane in between
+        del self._lanes[key]
+
+    async def _send(self, result: IncomingResult) -> None:
+        parts = _parts(result.message) if self.split else [result.message]
+        for part in parts:
+            if not await self._post(result, part):
+                return
+            result.posts += 1
+
+    async def _post(self, result: IncomingResult, body: Message) -> bool:
+        for attempt in range(self.attempts):
+            result.attempts += 1
+            if self._pacer is not None:
+                await self._pacer.wait(result.hook_url)
+            async with self._in_flight:
+                try:
+                    response = await self.client.incoming_webhook(
+                        hook_url=result.hook_url, body=body
+                    )
+                except Exception as exc:
+                    status = getattr(exc, "status", None)
+                    result.status, result.error = status, exc
+                    if status is None:
+                        retryable = _transient(exc)
+                    else:
+                        retryable = status == 429 or status >= 500
+                    if not retryable or attempt + 1 == self.attempts:
+                        return False
+                else:
+                    result.status, result.error = response.status, None
+                    return True
+            await asyncio.sleep(self._delay(result.error, attempt))
+        return False
+
+    def _delay(self, exc: BaseException, attempt: int) -> float:
+        headers = getattr(exc, "headers", None) or {}
+        try:
+            return min(float(headers["Retry-After"]), self.max_backoff)
+        except (KeyError, TypeError, ValueError):
+            return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
@@ -1,19 +1,46 @@
-from matterbot.models.actions import MessageAction as Action
-from matterbot.models.actions import MessageActionDataSource as ActionDataSource
-from matterbot.models.actions import MessageActionIntegration as ActionIntegration
-from matterbot.models.actions import MessageActionSelectOption as ActionSelect
-from matterbot.models.actions import MessageActionStyle as ActionStyle
-from matterbot.models.actions import MessageActionType as ActionType
-from matterbot.models.attachments import MessageAttachment as Attachment
-from matterbot.models.attachments import MessageAttachmentField as AttachmentField
-from matterbot.models.incoming import IncomingWebhookBody as Incoming
-from matterbot.models.outgoing import OutgoingWebhookBody as OutgoingRequest
-from matterbot.models.outgoing import OutgoingWebhookResponseBody as Outgoing
-from matterbot.models.outgoing import OutgoingWebhookResponseType as OutgoingType
-from matterbot.models.slash import SlashWebhookBody as SlashRequest
-from matterbot.models.slash import SlashWebhookExtraResponse as SlashExtra
-from matterbot.models.slash import SlashWebhookResponseBody as Slash
-from matterbot.models.slash import SlashWebhookResponseType as SlashType
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from matterbot.models.actions import MessageAction as Action
+    from matterbot.models.actions import MessageActionDataSource as ActionDataSource
+    from matterbot.models.actions import MessageActionIntegration as ActionIntegration
+    from matterbot.models.actions import MessageActionSelectOption as ActionSelect
+    from matterbot.models.actions import MessageActionStyle as ActionStyle
+    from matterbot.models.actions import MessageActionType as ActionType
+    from matterbot.models.attachments import MessageAttachment as Attachment
+    from matterbot.models.attachments import MessageAttachmentField as AttachmentField
+    from matterbot.models.incoming import IncomingWebhookBody as Incoming
+    from matterbot.models.outgoing import OutgoingWebhookBody as OutgoingRequest
+    from matterbot.models.outgoing import OutgoingWebhookResponseBody as Outgoing
+    from matterbot.models.outgoing import OutgoingWebhookResponseType as OutgoingType
+    from matterbot.models.slash import SlashWebhookBody as SlashRequest
+    from matterbot.models.slash import SlashWebhookExtraResponse as SlashExtra
+    from matterbot.models.slash import SlashWebhookResponseBody as Slash
+    from matterbot.models.slash import SlashWebhookResponseType as SlashType
+    from matterbot.models.templates import Slot, Template
+
+# Imported on first use (PEP 562), so using one model doesn't build them all: name -> (module, attribute)
+_EXPORTS = {
+    "Action": ("matterbot.models.actions", "MessageAction"),
+    "ActionDataSource": ("matterbot.models.actions", "MessageActionDataSource"),
+    "ActionIntegration": ("matterbot.models.actions", "MessageActionIntegration"),
+    "ActionSelect": ("matterbot.models.actions", "MessageActionSelectOption"),
+    "ActionStyle": ("matterbot.models.actions", "MessageActionStyle"),
+    "ActionType": ("matterbot.models.actions", "MessageActionType"),
+    "Attachment": ("matterbot.models.attachments", "MessageAttachment"),
+    "AttachmentField": ("matterbot.models.attachments", "MessageAttachmentField"),
+    "Incoming": ("matterbot.models.incoming", "IncomingWebhookBody"),
+    "Outgoing": ("matterbot.models.outgoing", "OutgoingWebhookResponseBody"),
+    "OutgoingRequest": ("matterbot.models.outgoing", "OutgoingWebhookBody"),
+    "OutgoingType": ("matterbot.models.outgoing", "OutgoingWebhookResponseType"),
+    "Slash": ("matterbot.models.slash", "SlashWebhookResponseBody"),
+    "SlashExtra": ("matterbot.models.slash", "SlashWebhookExtraResponse"),
+    "SlashRequest": ("matterbot.models.slash", "SlashWebhookBody"),
+    "SlashType": ("matterbot.models.slash", "SlashWebhookResponseType"),
+    "Slot": ("matterbot.models.templates", "Slot"),
+    "Template": ("matterbot.models.templates", "Template"),
+}
 
 __all__ = [
     "Action",
@@ -32,4 +59,20 @@ __all__ = [
     "SlashExtra",
     "SlashRequest",
     "SlashType",
+    "Slot",
+    "Template",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module, attribute = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(module), attribute)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
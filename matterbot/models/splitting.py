@@ -0,0 +1,145 @@
+from typing import Any, Optional
+
+from matterbot import _json
+
+# Mattermost's limits: post message length in characters, and request body size in bytes
+# (ServiceSettings.MaximumPayloadSizeBytes)
+MAX_MESSAGE_LENGTH = 16383
+MAX_PAYLOAD_BYTES = 300_000
+# Attachments are measured as JSON bytes, leaving room in the request for the rest of the post
+MAX_ATTACHMENTS_SIZE = MAX_PAYLOAD_BYTES - 20_000
+
+# Carried over from an oversized post to each of the posts it's split into
+_CONTINUED = (
+    "response_type",
+    "username",
+    "icon_url",
+    "icon_emoji",
+    "channel",
+    "channel_id",
+    "type",
+    "skip_slack_parsing",
+)
+# Carried over to each of the attachments an oversized attachment is split into
+_CONTINUED_ATTACHMENT = ("color", "fallback")
+
+
+def _size(value: Any) -> int:
+    return len(_json.dumps(value))
+
+
+def split_text(text: str, limit: int = MAX_MESSAGE_LENGTH) -> list[str]:
+    """Split text into chunks of at most `limit` characters, at line boundaries where possible (else at spaces)"""
+    if len(text) <= limit:
+        return [text]
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            cut = line.rfind(" ", 0, limit) + 1 or limit
+            if current:
+                chunks.append("".join(current))
+                current, size = [], 0
+            chunks.append(line[:cut])
+            line = line[cut:]
+        if size + len(line) > limit:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line)
+    if current:
+        chunks.append("".join(current))
+    return [chunk.rstrip("\n") for chunk in chunks if chunk.strip()]
+
+
+def _split_attachment(attachment: dict, limit: int) -> list[dict]:
+    """Split one oversized attachment into several: its text by lines, then its fields in groups"""
+    if _size(attachment) <= limit:
+        return [attachment]
+    common = {k: attachment[k] for k in _CONTINUED_ATTACHMENT if attachment.get(k)}
+    # Mattermost (and the Attachment model) require a text, even an empty one
+    common["text"] = ""
+    head = {k: v for k, v in attachment.items() if k != "fields"}
+    head["text"] = ""
+    # Leave room in each piece for the keys it repeats
+    room = max(limit - _size(head) - 64, 1)
+    pieces = [dict(head)]
+    texts = split_text(attachment.get("text") or "", room) if attachment.get("text") else []
+    for n, text in enumerate(texts):
+        if n:
+            pieces.append(dict(common))
+        pieces[-1]["text"] = text
+    size = _size(pieces[-1]) + len(',"fields":[]')
+    for field in attachment.get("fields") or []:
+        field_size = _size(field) + 1
+        if "fields" in pieces[-1] and size + field_size > limit:
+            pieces.append(dict(common))
+            size = _size(pieces[-1]) + len(',"fields":[]')
+        pieces[-1].setdefault("fields", []).append(field)
+        size += field_size
+    return pieces
+
+
+def split_post(
+    body: dict,
+    message_limit: int = MAX_MESSAGE_LENGTH,
+    attachments_limit: int = MAX_ATTACHMENTS_SIZE,
+) -> list[dict]:
+    """Split a post body (Slash, SlashExtra, Incoming, as a dict) that's over Mattermost's limits into several.
+
+    Text is split at line boundaries and attachments at attachment boundaries; an attachment that's too big on its
+    own is split across several, by lines of its text and then by its fields.  The first post keeps every other key
+    of the original; the rest keep only its presentation (response type, username, icon, channel, ...).  A body
+    within the limits comes back as it is, as the only item, and one whose oversized text is only whitespace comes
+    back with its text emptied.
+    """
+    text = body.get("text") or ""
+    attachments = body.get("attachments") or []
+    if len(text) <= message_limit and (
+        not attachments or _size(attachments) <= attachments_limit
+    ):
+        return [body]
+
+    common = {k: body[k] for k in _CONTINUED if body.get(k) is not None}
+    contents: list[dict] = [{"text": chunk} for chunk in split_text(text, message_limit) if chunk]
+    batch: list[dict] = []
+    size = 2
+    for attachment in attachments:
+        for piece in _split_attachment(attachment, attachments_limit - 2):
+            piece_size = _size(piece) + 1
+            if batch and size + piece_size > attachments_limit:
+                contents.append({"attachments": batch})
+                batch, size = [], 2
+            batch.append(piece)
+            size += piece_size
+    if batch:
+        contents.append({"attachments": batch})
+    if not contents:
+        # Nothing but whitespace, too long to post as it is but with nothing in it worth posting
+        return [{**body, "text": ""}]
+
+    first = {k: v for k, v in body.items() if k not in ("text", "attachments")}
+    return [{**first, **contents[0]}] + [{**common, **content} for content in contents[1:]]
+
+
+def split_slash(
+    body: dict,
+    message_limit: int = MAX_MESSAGE_LENGTH,
+    attachments_limit: int = MAX_ATTACHMENTS_SIZE,
+) -> Optional[dict]:
+    """Fit an oversized immediate slash response into one, moving the overflow into its `extra_responses`.
+
+    Returns None if nothing needed splitting.
+    """
+    posts = split_post(body, message_limit, attachments_limit)
+    extras = body.get("extra_responses") or []
+    split_extras = [
+        part for extra in extras for part in split_post(extra, message_limit, attachments_limit)
+    ]
+    if posts == [body] and len(split_extras) == len(extras):
+        return None
+    first, *overflow = posts
+    if not overflow and not split_extras:
+        return first
+    return {**first, "extra_responses": overflow + split_extras}
@@ -0,0 +1,15 @@
+"""pytest fixtures for testing Mattermost bots and clients, registered automatically when matterbot is installed"""
+
+import pytest
+
+from matterbot.testing import FakeMattermost
+
+
+@pytest.fixture
+def fake_mattermost():
+    """A FakeMattermost running on a background thread, usable from sync and async tests alike.
+
+    Adjust its latency and failure rates through its attributes, or force failures with `fail_next()`.
+    """
+    with FakeMattermost(seed=0) as mattermost:
+        yield mattermost
@@ -1,14 +1,21 @@
+import asyncio
+import contextlib
+import contextvars
 import functools
-import sys
+import inspect
+import logging
+import os
 import threading
-from concurrent.futures import ThreadPoolExecutor, thread
+import time
+from collections import Counter
+from concurrent.futures import Executor, ThreadPoolExecutor
 from enum import Enum
 from typing import (
     Annotated,
     Any,
     Callable,
     Dict,
-    Doc,
+    Iterable,
     List,
     Literal,
     Optional,
@@ -18,43 +25,66 @@ from typing import (
 )
 
 import fastapi
+import pydantic
 import starlette
+from starlette.concurrency import run_in_threadpool
+from typing_extensions import Doc
+
+from matterbot.client import AsyncMattermostClient, MattermostClient
+from matterbot.models import Outgoing, OutgoingRequest, Slash, SlashExtra, SlashRequest
+from matterbot.server.admission import AdmissionController
+from matterbot.server.cache import ResultCache
+from matterbot.server.deadlines import DeadlineScheduler
+from matterbot.server.dedupe import DedupeStore
+from matterbot.server.delivery import DeliveryQueue
+from matterbot.server.jobs import JobStore
+from matterbot.server.metrics import Metrics, MetricsMiddleware
+from matterbot.server.process import check_picklable, default_pool, run_hook
+from matterbot.server.ratelimit import RateLimiter
+from matterbot.server.serialization import OUTGOING_ADAPTER, SLASH_ADAPTER, render
+from matterbot.server.state import StateBackend
+from matterbot.server.tokens import TokenMiddleware, TokenRegistry
+from matterbot.tracing import Tracer
+
+logger = logging.getLogger(__name__)
+
+# Mattermost only accepts posts to a slash command's response_url for 30 minutes
+RESPONSE_URL_TTL = 60 * 30
+
+DEFAULT_BUSY_RESPONSE = {
+    "text": "Sorry, I'm too busy to take that on right now; please try again in a few minutes.",
+    "response_type": "ephemeral",
+}
+
+DEFAULT_SLOW_DOWN_RESPONSE = {
+    "text": "Slow down! You're using this command too often; please wait a moment and try again.",
+    "response_type": "ephemeral",
+}
+
+
+def _is_async(fn: Callable) -> bool:
+    """True for coroutine functions, including partials and objects with an async __call__"""
+    while isinstance(fn, functools.partial):
+        fn = fn.func
+    return inspect.iscoroutinefunction(fn) or inspect.iscoroutinefunction(
+        getattr(fn, "__call__", None)
+    )
 
-from matterbot.client import MattermostClient
-from matterbot.models import Outgoing, OutgoingRequest, Slash, SlashRequest
-
-
-def _cdquit(fn_name):
-    """
-    Interrupt current thread.
-    From https://gist.github.com/aaronchall/6331661fe0185c30a0b4
-    """
-    print(f"{fn_name} took too long", file=sys.stderr, flush=True)
-    thread.interrupt_main()  # raises KeyboardInterrupt
 
+def _hook_key(hook: Callable) -> str:
+    """How a hook is identified in the job store: by its import path, which survives a restart"""
+    return f"{getattr(hook, '__module__', '')}.{getattr(hook, '__qualname__', repr(hook))}"
 
-def _exit_after(s):
-    """
-    use as decorator to exit process if function takes longer than s seconds
-    from https://gist.github.com/aaronchall/6331661fe0185c30a0b4
-    """
 
-    def outer(fn):
-        @functools.wraps(fn)
-        def inner(*args, **kwargs):
-            timer = threading.Timer(interval=s, function=_cdquit, args=[fn.__name__])
-            timer.start()
-            try:
-                result = fn(*args, **kwargs)
-            except KeyboardInterrupt:
-                pass
-            finally:
-                timer.cancel()
-            return result
+def _is_stream(fn: Callable) -> bool:
+    """True for generator and async generator functions, including partials"""
+    while isinstance(fn, functools.partial):
+        fn = fn.func
+    return inspect.isgeneratorfunction(fn) or inspect.isasyncgenfunction(fn)
 
-        return inner
 
-    return outer
+# Returned by MatterbotServer._next when a streaming handler is exhausted
+_DONE = object()
 
 
 def _partialmethod(meth, *args, **kwargs):
@@ -68,20 +98,766 @@ class MatterbotServer:
     Mattermost slash commands and "outgoing" webhooks.
     """
 
-    def __init__(self, fastapiapp: fastapi.FastAPI) -> None:
+    def __init__(
+        self,
+        fastapiapp: fastapi.FastAPI,
+        client: Annotated[
+            Optional[MattermostClient],
+            Doc(
+                """
+                The client used to deliver hook responses.  Pass an AsyncMattermostClient to send them from the event
+                loop over pooled keep-alive connections instead of blocking an executor thread per response.
+                """
+            ),
+        ] = None,
+        max_pending_hooks: Annotated[
+            Optional[int],
+            Doc(
+                """
+                The most hooks (across all commands) that may be queued or running at once.  Slash commands whose
+                hooks would exceed this, or which could not be expected to finish within their response_url's
+                30 minutes at the current pace, are answered with `busy_response` instead.
+                """
+            ),
+        ] = None,
+        busy_response: Annotated[
+            Union[Slash, Dict[str, Any]],
+            Doc(
+                """
+                The slash response returned when hooks are refused because the server is saturated.
+                """
+            ),
+        ] = DEFAULT_BUSY_RESPONSE,
+        slow_down_response: Annotated[
+            Union[Slash, Dict[str, Any]],
+            Doc(
+                """
+                The slash response returned to requests refused by a command's `rate_limit`.  (Rate-limited outgoing
+                webhooks get an empty response, so nothing is posted.)
+                """
+            ),
+        ] = DEFAULT_SLOW_DOWN_RESPONSE,
+        dispatch_path: Annotated[
+            Optional[str],
+            Doc(
+                """
+                Enables dispatcher mode: instead of one route per command, every slash command and outgoing webhook
+                is served from this single path and routed on its `command` / `trigger_word` with a dict lookup.
+                Configure this one URL for every command in Mattermost; it takes both POST and GET requests, whatever
+                `method` each command was registered with.
+                """
+            ),
+        ] = None,
+        tokens: Annotated[
+            Optional[TokenRegistry],
+            Doc(
+                """
+                The registry the slash command tokens are checked against.  Pass one with a `source` file or callback
+                to rotate tokens without restarting; tokens given to `slash()` are always valid as well.
+                """
+            ),
+        ] = None,
+        dedupe: Annotated[
+            Optional[DedupeStore],
+            Doc(
+                """
+                Deduplicate retried webhooks by their slash `trigger_id` / outgoing `post_id`: a repeat gets the
+                original response (waiting for it if it's still being handled) instead of running the callable and
+                hooks again.
+                """
+            ),
+        ] = None,
+        metrics: Annotated[
+            Union[bool, Metrics],
+            Doc(
+                """
+                Record per-command latency histograms (split into parse, token, handler, and serialize phases), hook
+                queueing and runtime, executor utilization, and delivery latency by status code, and expose them in
+                the Prometheus text format at `metrics_path`.
+                """
+            ),
+        ] = False,
+        metrics_path: Annotated[
+            str,
+            Doc(
+                """
+                The path `server()` adds the metrics route at, when `metrics` is enabled.
+                """
+            ),
+        ] = "/metrics",
+        tracer: Annotated[
+            Optional[Tracer],
+            Doc(
+                """
+                Trace each request, its handler, its hooks (including time queued for an executor thread), and the
+                delivery of delayed responses.  Hooks and client calls run inside the request's trace context, and
+                client calls carry it to Mattermost as a `traceparent` header.  By default nothing is recorded.
+                """
+            ),
+        ] = None,
+        process_pool: Annotated[
+            Optional[Executor],
+            Doc(
+                """
+                The pool that runs hooks of commands registered with `hook_executor="process"`.  By default, a
+                ProcessPoolExecutor with a (spawned) worker per CPU is started the first time such a command is
+                registered.  The pool is shut down when the server drains; the default one is started again if the
+                app is, but a pool passed here isn't.
+                """
+            ),
+        ] = None,
+        jobs: Annotated[
+            Optional[JobStore],
+            Doc(
+                """
+                Persist scheduled hooks and undelivered delayed responses, so a restart (or crash) doesn't lose them:
+                on startup, those whose response_url hasn't expired yet are run (or delivered) again.  Writes are
+                group-committed in the background, so requests never wait on the disk.  Streaming handlers aren't
+                persisted, nor are requests' tokens.  Hooks are found again by their import path, so with a job store
+                they must be named, top-level functions (not lambdas or closures).
+                """
+            ),
+        ] = None,
+        state: Annotated[
+            Optional[StateBackend],
+            Doc(
+                """
+                Where to keep state that several worker processes should share: response caches, the dedupe store,
+                rate limiter buckets, and pending hook counts for admission control.  Pass a SQLiteState on the same
+                file in every worker on a host to share it; by default each process keeps its own, in memory.
+                Caches and rate limiters that were given a state of their own keep it.
+                """
+            ),
+        ] = None,
+        drain_timeout: Annotated[
+            float,
+            Doc(
+                """
+                How long shutdown may take: when the app's lifespan ends, the server stops scheduling hooks and gives
+                running hooks and pending deliveries up to this many seconds to finish before abandoning them (see
+                `drain()`).  Keep it under your process manager's grace period.
+                """
+            ),
+        ] = 25.0,
+    ) -> None:
         self.router = fastapi.APIRouter()
         self.fastapp = fastapiapp
-        self._executor = ThreadPoolExecutor()
-        self._client = MattermostClient()
+        workers = min(32, (os.cpu_count() or 1) + 4)
+        self._workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._busy_workers = 0
+        self._busy_lock = threading.Lock()
+        self._client = client if client is not None else MattermostClient()
+        self._hook_tasks: set[asyncio.Task] = set()
+        self._deadlines = DeadlineScheduler()
+        # Shares pending hook counts with the other workers, while the app is running with a state
+        self._sharing: Optional[asyncio.Task] = None
+        self.admission = AdmissionController(
+            max_pending=max_pending_hooks,
+            concurrency=workers,
+            window=RESPONSE_URL_TTL,
+            state=state,
+        )
+        self.busy_response = busy_response
+        # Rendered once, so refusing a rate-limited request costs next to nothing
+        self._slow_down = SLASH_ADAPTER.dump_json(
+            SLASH_ADAPTER.validate_python(slow_down_response), exclude_none=True
+        )
+        self.metrics = Metrics() if metrics is True else (metrics or None)
+        self.metrics_path = metrics_path
+        self.tracer = tracer if tracer is not None else Tracer()
+        self._process_pool = process_pool
+        # Whether the process pool is the default one, which the server may start again after draining
+        self._default_pool = False
+        self.jobs = jobs
+        # (path, hook key) -> (hook, split, executor), to find resumed hooks by what the job store recorded
+        self._job_hooks: dict[tuple[str, str], tuple[Callable, bool, str]] = {}
+        self.delivery = DeliveryQueue(
+            self._deliver, metrics=self.metrics, tracer=self.tracer, jobs=jobs
+        )
+        self.dispatch_path = dispatch_path
+        self._slash_commands: dict[str, Callable] = {}
+        self._outgoing_triggers: dict[str, Callable] = {}
+        self.tokens = tokens if tokens is not None else TokenRegistry()
+        self.state = state
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self.dedupe = dedupe
+        if dedupe is not None and dedupe.state is None:
+            dedupe.state = state
+        if self.metrics is not None:
+            self.metrics.gauge(
+                "matterbot_executor_utilization",
+                "Fraction of hook executor threads busy.",
+                lambda: self._busy_workers / self._workers,
+            )
+            self.metrics.gauge(
+                "matterbot_hooks_pending",
+                "Hooks queued or running, by path.",
+                lambda: {(p,): n for p, n in self.admission.pending_by_path.items()},
+                ("path",),
+            )
+            self.metrics.gauge(
+                "matterbot_hooks_rejected",
+                "Requests whose hooks were refused by admission control, by path.",
+                lambda: {(p,): n for p, n in self.admission.rejected_by_path.items()},
+                ("path",),
+            )
+            self.metrics.gauge(
+                "matterbot_deliveries_pending",
+                "Response URLs with delayed responses waiting to be sent.",
+                lambda: len(self.delivery),
+            )
 
     def __call__(self) -> None:
+        if self.dispatch_path is not None:
+            self.router.add_api_route(
+                self.dispatch_path, self._dispatch, methods=["POST", "GET"]
+            )
+        if self.metrics is not None:
+            self.router.add_api_route(
+                self.metrics_path,
+                self._metrics_endpoint,
+                methods=["GET"],
+                include_in_schema=False,
+            )
         self.fastapp.include_router(self.router)
+        self.fastapp.add_middleware(
+            TokenMiddleware, registry=self.tokens, dispatch_path=self.dispatch_path
+        )
+        if self.metrics is not None:
+            # Added last, so it's outermost and times the token check as well
+            self.fastapp.add_middleware(MetricsMiddleware, metrics=self.metrics)
+        lifespan = self.fastapp.router.lifespan_context
+
+        # Inside the app's own lifespan, so whatever it sets up is still there while hooks are resumed and drained
+        @contextlib.asynccontextmanager
+        async def matterbot_lifespan(app):
+            async with lifespan(app) as state:
+                if self.draining:
+                    self._restart()
+                if self.state is not None:
+                    self._sharing = asyncio.create_task(
+                        self.admission.share(), name="admission sharing"
+                    )
+                await self.resume_jobs()
+                try:
+                    yield state
+                finally:
+                    await self.drain()
+
+        self.fastapp.router.lifespan_context = matterbot_lifespan
+
+    def _restart(self) -> None:
+        """Undo what drain() shut down, for an app started again (a TestClient used for a second time, say)"""
+        self.draining = False
+        self._executor = ThreadPoolExecutor(max_workers=self._workers)
+        if self._default_pool:
+            self._process_pool = default_pool()
+
+    async def drain(self, timeout: Optional[float] = None) -> dict:
+        """Shut down gracefully, within `timeout` seconds (by default, the server's `drain_timeout`).
+
+        Stops scheduling hooks (commands that have any are answered with `busy_response`), waits for running hooks
+        and streaming handlers to finish and for their results to be delivered, then cancels whatever is left and
+        shuts the executors down.  With a job store, what was cancelled stays in it, to be resumed by the next start.
+        Runs when the app's lifespan ends; returns (and logs) a report of what was finished and what was abandoned.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        give_up = started + (self.drain_timeout if timeout is None else timeout)
+        self.draining = True
+        sent = self.delivery.sent
+
+        hooks = len(self._hook_tasks)
+        while self._hook_tasks and loop.time() < give_up:
+            await asyncio.wait(set(self._hook_tasks), timeout=give_up - loop.time())
+        abandoned = set(self._hook_tasks)
+        for task in abandoned:
+            task.cancel()
+        await asyncio.gather(*abandoned, return_exceptions=True)
+        abandoned_hooks = sorted(task.get_name() for task in abandoned)
+        abandoned_deliveries = await self.delivery.drain(max(give_up - loop.time(), 0))
+        if self._sharing is not None:
+            self._sharing.cancel()
+            await asyncio.gather(self._sharing, return_exceptions=True)
+            self._sharing = None
+            # This worker has nothing pending any more, as far as the others are concerned
+            await asyncio.to_thread(self.admission.sync, {})
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+        if self.jobs is not None:
+            await asyncio.to_thread(self.jobs.flush)
+        await asyncio.to_thread(self.tracer.flush)
+
+        report = {
+            "elapsed": loop.time() - started,
+            "hooks_finished": hooks - len(abandoned_hooks),
+            "hooks_abandoned": abandoned_hooks,
+            "deliveries_sent": self.delivery.sent - sent,
+            "deliveries_abandoned": abandoned_deliveries,
+        }
+        if abandoned_hooks or abandoned_deliveries:
+            logger.warning(
+                "Drained in %.1fs, abandoning %d hook(s) (%s) and deliveries to %d response_url(s)%s",
+                report["elapsed"],
+                len(abandoned_hooks),
+                ", ".join(f"{name} x{n}" for name, n in Counter(abandoned_hooks).items()),
+                abandoned_deliveries,
+                "; they're kept in the job store" if self.jobs is not None else "",
+            )
+        else:
+            logger.info(
+                "Drained in %.1fs: %d hook(s) finished and delivered",
+                report["elapsed"],
+                report["hooks_finished"],
+            )
+        return report
+
+    async def resume_jobs(self) -> int:
+        """Pick up the hooks and delayed responses a previous run left unfinished, if their response_url hasn't
+        expired; returns how many.  Runs at startup (in the app's lifespan), after every command is registered.
+        Workers sharing the job store only pick up what exited workers left (see JobStore.claim)."""
+        if self.jobs is None:
+            return 0
+        loop = asyncio.get_running_loop()
+        now = time.time()
+        resumed = 0
+        for job, kind, expires_at, payload in await asyncio.to_thread(self.jobs.claim, now):
+            deadline = loop.time() + expires_at - now
+            if kind == "result":
+                self.delivery.submit(
+                    payload["response_url"], payload["body"], deadline, payload["split"], job
+                )
+                resumed += 1
+                continue
+            found = self._job_hooks.get((payload["path"], payload["hook"]))
+            if found is None:
+                logger.warning(
+                    "Can't resume %s for %s: no such hook is registered",
+                    payload["hook"],
+                    payload["path"],
+                )
+                self.jobs.remove(job)
+                continue
+            hook, split, executor = found
+            request = SlashRequest.model_validate({**payload["request"], "token": ""})
+            self.admission.admit(payload["path"], 1, force=True)
+            self._start_hook(
+                hook, request, deadline, payload["path"], split, executor, job
+            )
+            resumed += 1
+        if resumed:
+            logger.info("Resumed %d unfinished hook(s) and delayed response(s)", resumed)
+        return resumed
+
+    async def _metrics_endpoint(self) -> starlette.responses.Response:
+        return starlette.responses.PlainTextResponse(
+            self.metrics.render(), media_type="text/plain; version=0.0.4"
+        )
+
+    @staticmethod
+    async def _payload(request: fastapi.Request) -> dict:
+        """A webhook's fields, whether Mattermost sent them as a form (its default), JSON, or a query string"""
+        if request.method == "GET":
+            return dict(request.query_params)
+        if request.headers.get("content-type", "").startswith("application/json"):
+            return await request.json()
+        return dict(await request.form())
+
+    @staticmethod
+    def _validate(request_model: Type[pydantic.BaseModel], payload: dict) -> Any:
+        try:
+            return request_model.model_validate(payload)
+        except pydantic.ValidationError as e:
+            raise fastapi.exceptions.RequestValidationError(e.errors())
+
+    async def _dispatch(self, request: fastapi.Request) -> Any:
+        """The single endpoint used in dispatcher mode; routes on the slash command or outgoing trigger word"""
+        payload = await self._payload(request)
+        if "command" in payload:
+            route = self._slash_commands.get(payload["command"])
+            request_model = SlashRequest
+        else:
+            route = self._outgoing_triggers.get(payload.get("trigger_word"))
+            request_model = OutgoingRequest
+        if route is None:
+            raise fastapi.HTTPException(status_code=404, detail="Unknown command")
+        return await route(request=self._validate(request_model, payload))
+
+    def _add_route(
+        self,
+        handler: Callable,
+        request_model: Type[pydantic.BaseModel],
+        path: str,
+        **route_options,
+    ) -> Callable:
+        """Serve one command from its own path (route mode), reading its webhook the same way the dispatcher does"""
+
+        async def endpoint(request: fastapi.Request) -> Any:
+            payload = await self._payload(request)
+            return await handler(request=self._validate(request_model, payload))
+
+        if route_options.get("name") is None:
+            route_options["name"] = handler.__name__
+        if route_options.get("description") is None:
+            route_options["description"] = inspect.getdoc(handler)
+        self.router.add_api_route(path, endpoint, **route_options)
+        return handler
+
+    async def _once(self, webhook_id: str, respond: Callable, *args, **kwargs) -> Any:
+        """Respond to a webhook, unless it's a retry of one already handled"""
+        if self.dedupe is None:
+            return await respond(*args, **kwargs)
+        return await self.dedupe.run_once(
+            webhook_id, functools.partial(respond, *args, **kwargs)
+        )
+
+    @staticmethod
+    async def _using_state(component: Any, method: Callable, *args) -> Any:
+        """Call a cache or rate limiter method, off the event loop if the component keeps its entries in a state"""
+        if component.state is None:
+            return method(*args)
+        return await component.state.run(method, *args)
+
+    def _phase(self, path: str, phase: str, started: float) -> float:
+        """Record one phase of a request's latency, returning when it ended (the next phase's start)"""
+        now = time.perf_counter()
+        if self.metrics is not None:
+            self.metrics.phases.observe(now - started, path, phase)
+        return now
+
+    async def _call(self, fn: Callable, *args, **kwargs) -> Any:
+        """Await coroutine functions on the event loop; push anything else onto the threadpool"""
+        if _is_async(fn):
+            return await fn(*args, **kwargs)
+        return await run_in_threadpool(fn, *args, **kwargs)
+
+    def _run_in_worker(
+        self, hook: Callable, request: SlashRequest, name: str
+    ) -> tuple[Any, float, float]:
+        with self._busy_lock:
+            self._busy_workers += 1
+        try:
+            started = time.perf_counter()
+            with self.tracer.span(f"run {name}"):
+                response = hook(request)
+            return response, started, time.perf_counter() - started
+        finally:
+            with self._busy_lock:
+                self._busy_workers -= 1
+
+    async def _run_hook(
+        self,
+        hook: Callable,
+        request: SlashRequest,
+        deadline: float,
+        path: str,
+        split: bool = True,
+        executor: str = "thread",
+        job: Optional[str] = None,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        name = getattr(hook, "__name__", repr(hook))
+        with self.tracer.span(f"hook {name}") as span:
+            queued = time.perf_counter()
+            runtime = None
+            try:
+                if _is_async(hook):
+                    started = queued
+                    response = await hook(request)
+                    runtime = time.perf_counter() - started
+                elif executor == "loop":
+                    started = queued
+                    with self.tracer.span(f"run {name}"):
+                        response = hook(request)
+                    runtime = time.perf_counter() - started
+                elif executor == "process":
+                    # Only the request's fields go over, and the result comes back as plain data
+                    response, runtime = await loop.run_in_executor(
+                        self._process_pool, run_hook, hook, dict(request)
+                    )
+                    started = time.perf_counter() - runtime
+                else:
+                    # Run in a copy of this context, so the hook's spans (and client calls) join this trace
+                    response, started, runtime = await loop.run_in_executor(
+                        self._executor,
+                        contextvars.copy_context().run,
+                        self._run_in_worker,
+                        hook,
+                        request,
+                        name,
+                    )
+            except Exception:
+                self._forget_job(job)
+                raise
+            finally:
+                self.admission.release(path, runtime)
+            span.set_attribute("matterbot.queued_seconds", started - queued)
+            if self.metrics is not None:
+                self.metrics.hook_wait.observe(started - queued, path)
+                self.metrics.hook_runtime.observe(runtime, path)
+            if loop.time() >= deadline:
+                span.set_attribute("matterbot.expired", True)
+                logger.warning(
+                    "%s finished after its response_url expired; dropping the result",
+                    name,
+                )
+                self._forget_job(job)
+                return
+            job = self._persist_result(job, request, response, deadline, split)
+            self.delivery.submit(request.response_url, response, deadline, split, job)
+
+    def _share(self, component: Any, namespace: str) -> None:
+        """Point a command's cache or rate limiter at the server's state, unless it has one of its own"""
+        if component is None:
+            return
+        if component.state is None:
+            component.state = self.state
+        if component.namespace is None:
+            component.namespace = namespace
+
+    def _forget_job(self, job: Optional[str]) -> None:
+        if job is not None:
+            self.jobs.remove(job)
+
+    def _persist_result(
+        self,
+        job: Optional[str],
+        request: SlashRequest,
+        response: Any,
+        deadline: float,
+        split: bool,
+    ) -> Optional[str]:
+        """Swap a finished hook's job for one holding its result, which is removed once the result is delivered"""
+        if job is None:
+            return None
+        if isinstance(response, pydantic.BaseModel):
+            response = response.model_dump(mode="json", exclude_none=True)
+        expires_at = time.time() + deadline - asyncio.get_running_loop().time()
+        payload = {
+            "response_url": str(request.response_url),
+            "body": response,
+            "split": split,
+        }
+        try:
+            result = self.jobs.add("result", payload, expires_at)
+        except TypeError:
+            # Not JSON; DeliveryQueue will reject it as well
+            result = None
+        self.jobs.remove(job)
+        return result
+
+    async def _deliver(
+        self, response_url: str, body: Union[SlashExtra, dict]
+    ) -> int:
+        """Post a delayed response, returning its HTTP status (and raising for error statuses)"""
+        if isinstance(self._client, AsyncMattermostClient):
+            response = await self._client.slash_command_delayed_response(
+                response_url=response_url, body=body
+            )
+            return response.status
+        else:
+            response = await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                contextvars.copy_context().run,
+                functools.partial(
+                    self._client.slash_command_delayed_response,
+                    response_url=response_url,
+                    body=body,
+                ),
+            )
+            response.raise_for_status()
+            return response.status_code
+
+    def _hook_done(self, task: asyncio.Task) -> None:
+        self._hook_tasks.discard(task)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.error("%s failed", task.get_name(), exc_info=task.exception())
+
+    def _schedule_hooks(
+        self,
+        hooks: List[Callable],
+        request: SlashRequest,
+        path: str,
+        split: bool = True,
+        reserve: int = 0,
+        executor: str = "thread",
+    ) -> bool:
+        """Run each hook as a task on the event loop; sync hooks still get an executor thread.
+
+        The response_url is only valid for 30 minutes from the request, so every hook shares that deadline.
+        `reserve` admits that much more background work along with the hooks (a streaming handler's output).
+        Returns False (scheduling nothing) when admission control refuses the hooks.
+        """
+        if not hooks and not reserve:
+            return True
+        if self.draining:
+            logger.warning("Refusing hooks for %s; the server is shutting down", path)
+            return False
+        if not self.admission.admit(path, len(hooks) + reserve):
+            logger.warning("Refusing hooks for %s; the server is saturated", path)
+            return False
+        deadline = asyncio.get_running_loop().time() + RESPONSE_URL_TTL
+        for hook in hooks:
+            job = None
+            if self.jobs is not None:
+                # Not the token: a resumed hook has no use for it, and it has no business on disk
+                payload = {
+                    "path": path,
+                    "hook": _hook_key(hook),
+                    "request": request.model_dump(mode="json", exclude={"token"}),
+                }
+                job = self.jobs.add("hook", payload, time.time() + RESPONSE_URL_TTL)
+            self._start_hook(hook, request, deadline, path, split, executor, job)
+        return True
+
+    def _start_hook(
+        self,
+        hook: Callable,
+        request: SlashRequest,
+        deadline: float,
+        path: str,
+        split: bool,
+        executor: str,
+        job: Optional[str],
+    ) -> None:
+        task = asyncio.create_task(
+            self._run_hook(hook, request, deadline, path, split, executor, job),
+            name=f"hook {getattr(hook, '__name__', hook)}",
+        )
+        self._hook_tasks.add(task)
+        task.add_done_callback(self._hook_done)
+        self._deadlines.add(task, deadline)
+
+    async def _next(self, stream: Any) -> Any:
+        """The next value of a sync or async generator, or _DONE; sync generators are advanced on the executor"""
+        if inspect.isasyncgen(stream):
+            return await anext(stream, _DONE)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, contextvars.copy_context().run, next, stream, _DONE
+        )
+
+    async def _stream(
+        self, stream: Any, request: SlashRequest, path: str, split: bool = True
+    ) -> Any:
+        """Return a streaming handler's first value, and deliver the rest from a task as they're produced.
+
+        Its admission was reserved by _schedule_hooks; it's released once the generator is done.
+        """
+        try:
+            first = await self._next(stream)
+        except BaseException:
+            self.admission.release(path, None)
+            raise
+        if first is _DONE:
+            self.admission.release(path, None)
+            return None
+        deadline = asyncio.get_running_loop().time() + RESPONSE_URL_TTL
+        name = getattr(stream, "__name__", repr(stream))
+        task = asyncio.create_task(
+            self._drain_stream(stream, request, deadline, path, split),
+            name=f"stream {name}",
+        )
+        self._hook_tasks.add(task)
+        task.add_done_callback(self._hook_done)
+        self._deadlines.add(task, deadline)
+        return first
+
+    async def _drain_stream(
+        self,
+        stream: Any,
+        request: SlashRequest,
+        deadline: float,
+        path: str,
+        split: bool = True,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        url = request.response_url
+        held: list = []
+        started = time.perf_counter()
+        with self.tracer.span(f"stream {getattr(stream, '__name__', stream)}") as span:
+            produced = 0
+            try:
+                while (value := await self._next(stream)) is not _DONE:
+                    produced += 1
+                    held.append(value)
+                    # Save the response_url's last post for whatever is still to come, merged with everything since
+                    if self.delivery.remaining(url) > 1:
+                        for value in held:
+                            self.delivery.submit(url, value, deadline, split)
+                        held.clear()
+            finally:
+                span.set_attribute("matterbot.produced", produced)
+                if inspect.isasyncgen(stream):
+                    await stream.aclose()
+                else:
+                    try:
+                        stream.close()
+                    except ValueError:
+                        # Cancelled while an executor thread is still advancing it; it'll finish on its own
+                        pass
+                runtime = time.perf_counter() - started
+                self.admission.release(path, runtime)
+                if self.metrics is not None:
+                    self.metrics.hook_runtime.observe(runtime, path)
+                if held and loop.time() < deadline:
+                    for value in held:
+                        self.delivery.submit(url, value, deadline, split)
+                elif held:
+                    span.set_attribute("matterbot.expired", True)
+                    logger.warning(
+                        "%s produced %d value(s) after its response_url expired; dropping them",
+                        path,
+                        len(held),
+                    )
 
     def outgoing(
         self,
         callable: Callable,
         path: str,
         method: Literal["POST", "GET"] = "POST",
+        trigger_words: Annotated[
+            Optional[List[str]],
+            Doc(
+                """
+                The trigger words this webhook answers to in dispatcher mode; defaults to `path` without its leading
+                slash.  Ignored unless the server has a `dispatch_path`.
+                """
+            ),
+        ] = None,
+        trusted: Annotated[
+            bool,
+            Doc(
+                """
+                Trust the callable to return a well-formed response: skip validating it against the Outgoing model and
+                serialize it directly (dicts with the fast JSON encoder).  Invalid responses will reach Mattermost as-is.
+                """
+            ),
+        ] = False,
+        cache: Annotated[
+            Optional[ResultCache],
+            Doc(
+                """
+                Memoize this command's responses: while a response for an identical request (by default, the same
+                trigger word and text) is fresh, it is returned without running the callable again.
+                """
+            ),
+        ] = None,
+        rate_limit: Annotated[
+            Optional[RateLimiter],
+            Doc(
+                """
+                Limit how often each user (or channel, or team) may use this command.  Requests over the limit are
+                answered with an empty response before the callable runs or any hook is scheduled.  Retried webhooks
+                answered by the server's `dedupe` store, and `cache` hits, don't count against the limit.
+                """
+            ),
+        ] = None,
         status_code: Annotated[
             Optional[int],
             Doc(
@@ -375,6 +1151,8 @@ class MatterbotServer:
         Adds a new FastAPI *path operation* using an HTTP GET or POST (default) operation, depending on the method selected.
         Uses the Outgoing model to validate the response type.
 
+        Coroutine functions (`async def`) are awaited directly on the event loop; plain functions are run in FastAPI's threadpool.
+
         Effectively a wrapper around fastapi.APIRouter.get / .post
 
         ## Example
@@ -400,15 +1178,60 @@ class MatterbotServer:
         ```
         """
 
+        self._share(cache, path)
+        self._share(rate_limit, path)
+        dump_options = dict(
+            include=response_model_include,
+            exclude=response_model_exclude,
+            by_alias=response_model_by_alias,
+            exclude_unset=response_model_exclude_unset,
+            exclude_defaults=response_model_exclude_defaults,
+            exclude_none=response_model_exclude_none,
+        )
+
         @functools.wraps(callable)
-        def handler(request: OutgoingRequest, *args, **kwargs):
-            callable(*args, request=request, **kwargs)
+        async def handler(request: OutgoingRequest, *args, **kwargs):
+            if self.metrics is not None:
+                self.metrics.observe_entry(path, time.perf_counter())
+            with self.tracer.span(f"outgoing {path}") as span:
+                span.set_attribute("matterbot.post_id", request.post_id)
+                return await self._once(
+                    f"outgoing:{request.post_id}", respond, request, *args, **kwargs
+                )
+
+        async def respond(request: OutgoingRequest, *args, **kwargs):
+            if cache is not None:
+                cache_key = cache.key_for(request, ("trigger_word", "text"))
+                cached = await self._using_state(cache, cache.get, cache_key)
+                if cached is not None:
+                    return cached
+            # Charged only here, so retries answered by the dedupe store and cache hits cost no tokens
+            if rate_limit is not None and not await self._using_state(
+                rate_limit, rate_limit.allow, request
+            ):
+                return starlette.responses.Response()
+            started = time.perf_counter()
+            with self.tracer.span("handler"):
+                result = await self._call(callable, *args, request=request, **kwargs)
+            started = self._phase(path, "handler", started)
+            response = render(
+                result, OUTGOING_ADAPTER, trusted, status_code, **dump_options
+            )
+            self._phase(path, "serialize", started)
+            if cache is not None:
+                await self._using_state(cache, cache.set, cache_key, response)
+            return response
 
         @functools.wraps(handler)
         def handler2(*args, **kwargs):
-            return self.router.api_route(
+            if self.dispatch_path is not None:
+                for trigger in trigger_words or [path.lstrip("/")]:
+                    self._outgoing_triggers[trigger] = handler
+                return handler
+            return self._add_route(
                 handler,
-                path=path,
+                OutgoingRequest,
+                path,
                 response_model=Outgoing,
                 status_code=status_code,
                 tags=tags,
@@ -440,8 +1263,64 @@ class MatterbotServer:
         self,
         callable: Callable,
         path: str,
-        token: str,
+        token: Annotated[
+            Union[str, Iterable[str]],
+            Doc(
+                """
+                The Mattermost integration token (or tokens, while rotating) accepted for this command.  Requests
+                with any other token are rejected by middleware before their body is validated.
+                """
+            ),
+        ],
         method: Literal["POST", "GET"] = "POST",
+        command: Annotated[
+            Optional[str],
+            Doc(
+                """
+                The slash command (e.g. "/echo") this handles in dispatcher mode; defaults to `path`.  Ignored unless
+                the server has a `dispatch_path`.
+                """
+            ),
+        ] = None,
+        trusted: Annotated[
+            bool,
+            Doc(
+                """
+                Trust the callable to return a well-formed response: skip validating it against the Slash model and
+                serialize it directly (dicts with the fast JSON encoder).  Invalid responses will reach Mattermost as-is.
+                """
+            ),
+        ] = False,
+        split: Annotated[
+            bool,
+            Doc(
+                """
+                Split responses over Mattermost's size limits into several posts, at line and attachment boundaries:
+                the overflow of the immediate response goes into its `extra_responses`, and each delayed response from
+                a hook is sent as several posts (within the response_url's limit of five).
+                """
+            ),
+        ] = True,
+        cache: Annotated[
+            Optional[ResultCache],
+            Doc(
+                """
+                Memoize this command's responses: while a response for an identical request (by default, the same
+                command and text) is fresh, it is returned without running the callable or its hooks again.
+                """
+            ),
+        ] = None,
+        rate_limit: Annotated[
+            Optional[RateLimiter],
+            Doc(
+                """
+                Limit how often each user (or channel, or team) may use this command.  Requests over the limit are
+                answered with the server's `slow_down_response` before the callable runs or any hook is scheduled.
+                Retried webhooks answered by the server's `dedupe` store, and `cache` hits, don't count against the
+                limit.
+                """
+            ),
+        ] = None,
         hooks: Annotated[
             Optional[Callable | List[Callable]],
             Doc(
@@ -453,6 +1332,27 @@ class MatterbotServer:
                 """
             ),
         ] = None,
+        max_pending_hooks: Annotated[
+            Optional[int],
+            Doc(
+                """
+                The most hooks for this command that may be queued or running at once; beyond this, requests are
+                answered with the server's `busy_response`.
+                """
+            ),
+        ] = None,
+        hook_executor: Annotated[
+            Literal["thread", "process", "loop"],
+            Doc(
+                """
+                Where this command's plain-function hooks run: on the server's thread pool; on its `process_pool`, for
+                CPU-bound hooks that would otherwise hold the GIL against every other command (the hooks must be
+                picklable, top-level functions, and get a copy of the request); or directly on the event loop, for
+                hooks so quick that a thread hop would cost more than they do.  Coroutine hooks always run on the
+                event loop, and delayed responses are always delivered from this process.
+                """
+            ),
+        ] = "thread",
         null_response: Annotated[
             bool,
             Doc(
@@ -755,7 +1655,17 @@ class MatterbotServer:
         send one (or more) responses later.
 
         The callables in `hooks` should take exactly one argument (request), should expect the return value to be validated by SlashExtra,
-        and will be executed using a concurrent.futures.ThreadPoolExecutor.
+        and are scheduled as tasks on the event loop (plain functions are executed using a concurrent.futures.ThreadPoolExecutor).
+        Their results are posted to the request's response_url by `server.delivery`, which retries failed posts and merges
+        results that finish close together, within Mattermost's limit of 5 posts per response_url.
+
+        Coroutine functions (`async def`) are awaited directly on the event loop; plain functions are run in FastAPI's threadpool.
+        The callable may also be a generator (sync or async) to answer progressively: its first value is the immediate
+        response, and each later value is posted to the response_url as soon as it's produced, like a hook result.  The last
+        of the response_url's 5 posts is held back for the end, so it carries everything produced from then on; a generator
+        still running when the response_url expires is closed.  The generator counts as one pending hook for
+        `max_pending_hooks`, and a `cache` hit replays only its first value.
+        Pass a `Commands` object as the callable to split the command text into typed sub-commands and arguments.
 
         Effectively a wrapper around fastapi.APIRouter.get / .post with MM integration token validation.
 
@@ -784,36 +1694,110 @@ class MatterbotServer:
         ```
         """
 
+        if hooks is None:
+            hooks = []
+        elif not isinstance(hooks, (list, tuple)):
+            hooks = [hooks]
+        if hook_executor not in ("thread", "process", "loop"):
+            raise ValueError(f"Unknown hook_executor {hook_executor!r}")
+        if hook_executor == "process":
+            for hook in hooks:
+                if not _is_async(hook):
+                    check_picklable(hook)
+            if self._process_pool is None:
+                self._process_pool = default_pool()
+                self._default_pool = True
+        if self.jobs is not None:
+            for hook in hooks:
+                key = _hook_key(hook)
+                if "<lambda>" in key or "<locals>" in key:
+                    raise ValueError(
+                        f"{key!r} can't be resumed from the job store: hooks must be named functions defined at the "
+                        "top level of a module (or methods of top-level classes)"
+                    )
+        self.admission.limit(path, max_pending_hooks)
+        for hook in hooks:
+            self._job_hooks[(path, _hook_key(hook))] = (hook, split, hook_executor)
+        streaming = _is_stream(callable)
+        token_key = (command or path) if self.dispatch_path is not None else path
+        dump_options = dict(
+            include=response_model_include,
+            exclude=response_model_exclude,
+            by_alias=response_model_by_alias,
+            exclude_unset=response_model_exclude_unset,
+            exclude_defaults=response_model_exclude_defaults,
+            exclude_none=response_model_exclude_none,
+        )
+        self.tokens.add(token_key, token)
+        self._share(cache, path)
+        self._share(rate_limit, path)
+
         @functools.wraps(callable)
-        def handler(request: SlashRequest, *args, **kwargs):
-            if request.token != token:
-                raise fastapi.HTTPException(
-                    status_code=401, detail="Unauthorized: provided token did not match"
+        async def handler(request: SlashRequest, *args, **kwargs):
+            if self.metrics is not None:
+                self.metrics.observe_entry(path, time.perf_counter())
+            with self.tracer.span(f"slash {command or path}") as span:
+                span.set_attribute("matterbot.trigger_id", request.trigger_id)
+                if not self.tokens.verify(token_key, request.token):
+                    raise fastapi.HTTPException(
+                        status_code=401,
+                        detail="Unauthorized: provided token did not match",
+                    )
+                return await self._once(
+                    f"slash:{request.trigger_id}", respond, request, *args, **kwargs
                 )
 
-            # Response URL is only valid for 30 minutes, so don't run any longer than that
-            @_exit_after(60 * 30)
-            def run_hook(hook: Callable):
-                url = request.response_url
-                response = hook(request)
-                self._client.slash_command_delayed_response(
-                    response_url=url,
-                    body=response,
+        async def respond(request: SlashRequest, *args, **kwargs):
+            if cache is not None:
+                cache_key = cache.key_for(request, ("command", "text"))
+                cached = await self._using_state(cache, cache.get, cache_key)
+                if cached is not None:
+                    return cached
+            # Charged only here, so retries answered by the dedupe store and cache hits cost no tokens
+            if rate_limit is not None and not await self._using_state(
+                rate_limit, rate_limit.allow, request
+            ):
+                return starlette.responses.Response(
+                    self._slow_down, media_type="application/json"
                 )
 
-            if __builtins__.callable(hooks):
-                hooks = [hooks]
-            elif hooks is not None:
-                for hook in hooks:
-                    self._executor.submit(run_hook, hook)
-
-            return callable(*args, request=request, **kwargs)
+            started = time.perf_counter()
+            admitted = self._schedule_hooks(
+                hooks, request, path, split, int(streaming), hook_executor
+            )
+            if not admitted:
+                result = self.busy_response
+            elif streaming:
+                with self.tracer.span("handler"):
+                    result = await self._stream(
+                        callable(*args, request=request, **kwargs), request, path, split
+                    )
+                if result is None:
+                    # A generator that yields nothing has nothing to say
+                    return starlette.responses.Response()
+            else:
+                with self.tracer.span("handler"):
+                    result = await self._call(callable, *args, request=request, **kwargs)
+            started = self._phase(path, "handler", started)
+            if null_response:
+                return result
+            response = render(
+                result, SLASH_ADAPTER, trusted, status_code, split, **dump_options
+            )
+            self._phase(path, "serialize", started)
+            if cache is not None and admitted:
+                await self._using_state(cache, cache.set, cache_key, response)
+            return response
 
         @functools.wraps(handler)
         def handler2(*args, **kwargs):
-            return self.router.api_route(
+            if self.dispatch_path is not None:
+                self._slash_commands[command or path] = handler
+                return handler
+            return self._add_route(
                 handler,
-                path=path,
+                SlashRequest,
+                path,
                 response_model=None if null_response else Slash,
                 status_code=status_code,
                 tags=tags,
@@ -838,7 +1822,7 @@ class MatterbotServer:
                 openapi_extra=openapi_extra,
                 generate_unique_id_function=generate_unique_id_function,
             )
-        
+
         return handler2
 
     slash = functools.partialmethod(
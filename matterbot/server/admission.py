@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+from typing import Optional
+
+from matterbot import _json
+from matterbot.server.state import StateBackend
+
+logger = logging.getLogger(__name__)
+
+_SHARED_KEY = "admission:pending"
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class AdmissionController:
+    """Bounds how many hooks may be queued or running, globally and per command path.
+
+    A request's hooks are admitted all together or not at all.  Besides the hard depth limits, work is refused
+    when the estimated queueing delay (pending hooks spread over `concurrency` workers, at the moving average
+    hook runtime) would push it past `window` seconds, since its response_url would have expired by then.
+
+    With a `state` backend, the limits apply to the hooks pending across every worker process sharing it (on one
+    host): each worker's pending counts are kept there under its PID, and those of workers that have exited are
+    dropped.  `pending` and `pending_by_path` still count this worker's hooks.  Admitting and releasing hooks never
+    touch the state: `share()` publishes this worker's counts and reads everyone else's every `sync_interval`
+    seconds, off the event loop, so the other workers' hooks are counted as of the last sync, and together the
+    workers may overshoot a limit by what they admit in between.
+    """
+
+    def __init__(
+        self,
+        max_pending: Optional[int] = None,
+        concurrency: int = 1,
+        window: float = float("inf"),
+        smoothing: float = 0.2,
+        state: Optional[StateBackend] = None,
+        sync_interval: float = 0.1,
+    ) -> None:
+        self.max_pending = max_pending
+        self.state = state
+        self.sync_interval = sync_interval
+        self._pid = str(os.getpid())
+        # The other workers' pending hooks, by path, and how many workers there are, as of the last sync
+        self._shared: tuple[Counter[str], int] = (Counter(), 1)
+        self.concurrency = concurrency
+        self.window = window
+        self._smoothing = smoothing
+        self._limits: dict[str, int] = {}
+        self.pending = 0
+        self.pending_by_path: Counter[str] = Counter()
+        self.rejected = 0
+        self.rejected_by_path: Counter[str] = Counter()
+        self.average_runtime: Optional[float] = None
+
+    def limit(self, path: str, max_pending: Optional[int]) -> None:
+        """Set (or with None, clear) the queue depth limit for one command path"""
+        if max_pending is None:
+            self._limits.pop(path, None)
+        else:
+            self._limits[path] = max_pending
+
+    def estimated_wait(
+        self, count: int = 1, pending: Optional[int] = None, workers: int = 1
+    ) -> float:
+        """Seconds until `count` newly queued hooks would be expected to finish (behind `pending` others, by default
+        this worker's, spread over `workers` processes)"""
+        if self.average_runtime is None:
+            return 0.0
+        if pending is None:
+            pending = self.pending
+        return (pending + count) / (self.concurrency * workers) * self.average_runtime
+
+    def _over(
+        self, path: str, count: int, pending: int, path_pending: int, workers: int = 1
+    ) -> bool:
+        path_limit = self._limits.get(path)
+        return (
+            (self.max_pending is not None and pending + count > self.max_pending)
+            or (path_limit is not None and path_pending + count > path_limit)
+            or self.estimated_wait(count, pending, workers) > self.window
+        )
+
+    def admit(self, path: str, count: int = 1, force: bool = False) -> bool:
+        """Count `count` more hooks for `path` as pending, unless that's over a limit (or `force`, for work that was
+        already admitted once, before a restart)"""
+        others, workers = self._shared
+        admitted = force or not self._over(
+            path,
+            count,
+            self.pending + others.total(),
+            self.pending_by_path[path] + others[path],
+            workers,
+        )
+        if not admitted:
+            self.rejected += 1
+            self.rejected_by_path[path] += 1
+            return False
+        self.pending += count
+        self.pending_by_path[path] += count
+        return True
+
+    def _publish(
+        self, value: Optional[bytes], mine: dict[str, int]
+    ) -> tuple[Optional[bytes], tuple[Counter[str], int]]:
+        workers = {
+            pid: paths
+            for pid, paths in (_json.loads(value) if value else {}).items()
+            if pid != self._pid and _alive(int(pid))
+        }
+        others: Counter[str] = Counter()
+        for paths in workers.values():
+            others.update(paths)
+        if mine:
+            workers[self._pid] = mine
+        return (_json.dumps(workers) if workers else None), (others, len(workers) or 1)
+
+    def sync(self, pending_by_path: dict[str, int]) -> None:
+        """Publish this worker's pending hooks (a snapshot of `pending_by_path`) to the state, and pick up the other
+        workers', dropping those that have exited.  Blocks on the state, so run it off the event loop."""
+        if self.state is not None:
+            self._shared = self.state.update(
+                _SHARED_KEY, lambda value: self._publish(value, pending_by_path)
+            )
+
+    async def share(self) -> None:
+        """Sync with the other workers every `sync_interval` seconds, until cancelled"""
+        while True:
+            try:
+                await self.state.run(self.sync, dict(self.pending_by_path))
+            except Exception:
+                logger.exception("Couldn't share pending hook counts")
+            await asyncio.sleep(self.sync_interval)
+
+    def release(self, path: str, runtime: Optional[float] = None) -> None:
+        """Mark one hook for `path` as finished, optionally feeding its runtime into the moving average"""
+        self.pending -= 1
+        self.pending_by_path[path] -= 1
+        if self.pending_by_path[path] <= 0:
+            del self.pending_by_path[path]
+        if runtime is not None:
+            if self.average_runtime is None:
+                self.average_runtime = runtime
+            else:
+                self.average_runtime += self._smoothing * (runtime - self.average_runtime)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "pending_by_path": dict(self.pending_by_path),
+            "rejected": self.rejected,
+            "rejected_by_path": dict(self.rejected_by_path),
+            "average_runtime": self.average_runtime,
+        }
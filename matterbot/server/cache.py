@@ -0,0 +1,95 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Sequence
+
+from starlette.responses import Response
+
+from matterbot.server.state import StateBackend, dump_response, load_response
+
+
+class ResultCache:
+    """Memoizes a command's rendered responses, so identical requests skip the handler and its hooks while fresh.
+
+    Requests are identified by the request fields named in `key` (e.g. ("command", "text") for a lookup that is the
+    same for everyone, or add "user_id" / "channel_id" to scope it).  Entries live for `ttl` seconds and the least
+    recently used are evicted beyond `maxsize` entries.  With a `state` backend, entries are kept there instead
+    (under `namespace`, by default the command's path) and shared by every worker using it; they still expire after
+    `ttl`, but `maxsize` is up to the backend.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 60.0,
+        maxsize: int = 1024,
+        key: Optional[Sequence[str]] = None,
+        state: Optional[StateBackend] = None,
+        namespace: Optional[str] = None,
+    ) -> None:
+        self.ttl = ttl
+        self.state = state
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.key = tuple(key) if key is not None else None
+        self._entries: OrderedDict[tuple, tuple[float, bytes, int, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key_for(self, request: Any, default: Sequence[str]) -> tuple:
+        return tuple(getattr(request, field, None) for field in self.key or default)
+
+    def _shared_key(self, key: tuple) -> str:
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        return f"cache:{self.namespace}:{digest}"
+
+    def get(self, key: tuple) -> Optional[Response]:
+        if self.state is not None:
+            value = self.state.get(self._shared_key(key))
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            body, status_code, media_type = load_response(value)
+            return Response(body, status_code=status_code, media_type=media_type)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, body, status_code, media_type = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return Response(body, status_code=status_code, media_type=media_type)
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, key: tuple, response: Any) -> None:
+        """Remember a rendered response; anything else (streams, raw results) isn't cacheable and is ignored"""
+        if (
+            not isinstance(response, Response)
+            or not hasattr(response, "body")
+            or response.status_code >= 400
+        ):
+            return
+        if self.state is not None:
+            value = dump_response(response.body, response.status_code, response.media_type)
+            self.state.set(self._shared_key(key), value, self.ttl)
+            return
+        self._entries[key] = (
+            time.monotonic() + self.ttl,
+            response.body,
+            response.status_code,
+            response.media_type,
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget every entry kept in this process (entries in a shared `state` expire on their own)"""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
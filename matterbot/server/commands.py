@@ -0,0 +1,231 @@
+import enum
+import functools
+import inspect
+import shlex
+import types
+import typing
+from typing import Any, Callable, Optional, Union
+
+from starlette.concurrency import run_in_threadpool
+
+from matterbot.models import SlashRequest
+
+
+class UsageError(ValueError):
+    """Raised when slash command text doesn't match a sub-command's arguments"""
+
+
+def _convert_bool(value: str) -> bool:
+    lowered = value.lower()
+    if lowered in ("1", "true", "yes", "y", "on"):
+        return True
+    if lowered in ("0", "false", "no", "n", "off"):
+        return False
+    raise ValueError(f"not a boolean: {value!r}")
+
+
+def _converter(annotation: Any) -> Callable[[str], Any]:
+    """Build the str -> value conversion for a parameter annotation, once"""
+    origin = typing.get_origin(annotation)
+    if origin in (Union, types.UnionType):
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return _converter(args[0])
+        return str
+    if annotation in (inspect.Parameter.empty, str, Any):
+        return str
+    if annotation is bool:
+        return _convert_bool
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return annotation
+    return annotation
+
+
+class _Parser:
+    """An argument parser compiled from a sub-command's signature.
+
+    As in Typer, parameters without a default are positional arguments and parameters with a default are `--options`;
+    `bool` options are flags (`--force` / `--no-force`), and a `list[X]` or `*args` parameter takes any remaining
+    arguments.  The first parameter, `request`, receives the SlashRequest.
+    """
+
+    def __init__(self, fn: Callable, name: str) -> None:
+        self.name = name
+        self.positional: list[tuple[str, Callable[[str], Any]]] = []
+        self.rest: Optional[tuple[str, Callable[[str], Any], bool]] = None
+        self.options: dict[str, tuple[str, Callable[[str], Any]]] = {}
+        self.flags: dict[str, tuple[str, bool]] = {}
+        self.defaults: dict[str, Any] = {}
+        hints = typing.get_type_hints(fn)
+        # The root sub-command (registered as "") has no name of its own to show
+        usage = [name] if name else []
+        for param in list(inspect.signature(fn).parameters.values())[1:]:
+            annotation = hints.get(param.name, param.annotation)
+            if param.kind is param.VAR_KEYWORD:
+                continue
+            if param.kind is param.VAR_POSITIONAL or typing.get_origin(annotation) is list:
+                item = annotation
+                if typing.get_origin(annotation) is list:
+                    item = (typing.get_args(annotation) or (str,))[0]
+                self.rest = (param.name, _converter(item), param.kind is param.VAR_POSITIONAL)
+                usage.append(f"[{param.name}...]")
+            elif param.default is param.empty:
+                self.positional.append((param.name, _converter(annotation)))
+                usage.append(f"<{param.name}>")
+            else:
+                option = "--" + param.name.replace("_", "-")
+                self.defaults[param.name] = param.default
+                if annotation is bool:
+                    self.flags[option] = (param.name, True)
+                    self.flags["--no-" + option[2:]] = (param.name, False)
+                    usage.append(f"[{option}]")
+                else:
+                    self.options[option] = (param.name, _converter(annotation))
+                    usage.append(f"[{option} {param.name.upper()}]")
+        self.usage = " ".join(usage)
+
+    def parse(self, tokens: list[str]) -> tuple[list[Any], dict[str, Any]]:
+        args: list[Any] = []
+        kwargs = dict(self.defaults)
+        values: list[str] = []
+        tokens = iter(tokens)
+        for token in tokens:
+            if token.startswith("--") and len(token) > 2:
+                option, _, value = token.partition("=")
+                if option in self.flags:
+                    if value:
+                        raise UsageError(f"{option} is a flag and doesn't take a value")
+                    kwargs[self.flags[option][0]] = self.flags[option][1]
+                    continue
+                if option not in self.options:
+                    raise UsageError(f"no such option: {option}")
+                param, convert = self.options[option]
+                if not value:
+                    value = next(tokens, None)
+                    if value is None:
+                        raise UsageError(f"{option} needs a value")
+                kwargs[param] = self._convert(convert, value, param)
+            else:
+                values.append(token)
+        if len(values) < len(self.positional):
+            missing = self.positional[len(values)][0]
+            raise UsageError(f"missing argument: {missing}")
+        for (param, convert), value in zip(self.positional, values):
+            kwargs[param] = self._convert(convert, value, param)
+        extra = values[len(self.positional) :]
+        if self.rest is not None:
+            param, convert, variadic = self.rest
+            converted = [self._convert(convert, value, param) for value in extra]
+            if variadic:
+                # Everything after *args must be passed by keyword already, so positional order is preserved
+                args = [kwargs.pop(name) for name, _ in self.positional] + converted
+            else:
+                kwargs[param] = converted
+        elif extra:
+            raise UsageError(f"unexpected argument: {extra[0]}")
+        return args, kwargs
+
+    @staticmethod
+    def _convert(convert: Callable[[str], Any], value: str, param: str) -> Any:
+        try:
+            return convert(value)
+        except (TypeError, ValueError) as e:
+            raise UsageError(f"invalid value for {param}: {value!r}") from e
+
+
+class _Node:
+    __slots__ = ("children", "handler", "parser")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _Node] = {}
+        self.handler: Optional[Callable] = None
+        self.parser: Optional[_Parser] = None
+
+
+class Commands:
+    """A set of sub-commands served behind a single slash command, in the style of Typer.
+
+    Each sub-command's parser is compiled from its signature once, at registration, and sub-commands (including
+    multi-word ones like "cache clear") are found by walking a trie of words, so lookup cost depends only on the
+    length of the command typed.  Pass the Commands object as the callable to `MatterbotServer.slash`.
+
+    ## Example
+
+    ```python
+    ops = Commands()
+
+    @ops.command("deploy")
+    async def deploy(request, service: str, env: str = "staging", force: bool = False) -> dict:
+        return {"text": f"Deploying {service} to {env}"}
+
+    @ops.command("cache clear")
+    def clear(request, names: list[str]) -> dict:
+        return {"text": f"Cleared {', '.join(names)}"}
+
+    server.slash(ops, "/ops", token=ops_token)  # "/ops deploy api --env prod --force"
+    ```
+    """
+
+    def __init__(self) -> None:
+        self._root = _Node()
+
+    def command(self, name: str) -> Callable[[Callable], Callable]:
+        """Register the decorated function as the sub-command `name` (which may be several words); a sub-command named
+        "" handles text that doesn't start with any other sub-command's name"""
+        words = name.split()
+
+        def decorator(fn: Callable) -> Callable:
+            node = self._root
+            for word in words:
+                node = node.children.setdefault(word.lower(), _Node())
+            node.handler = fn
+            node.parser = _Parser(fn, name)
+            return fn
+
+        return decorator
+
+    def usage(self) -> str:
+        lines = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node.parser is not None:
+                lines.append(node.parser.usage)
+            stack.extend(reversed(list(node.children.values())))
+        return "\n".join(sorted(lines))
+
+    def _resolve(self, tokens: list[str]) -> tuple[Optional[_Node], list[str]]:
+        """Walk the trie as far as the tokens go, returning the deepest sub-command and its arguments (the root
+        sub-command, registered as "", if no sub-command's name matches)"""
+        node, rest = self._root, tokens
+        found = node if node.handler is not None else None
+        for depth, token in enumerate(tokens):
+            node = node.children.get(token.lower())
+            if node is None:
+                break
+            if node.handler is not None:
+                found, rest = node, tokens[depth + 1 :]
+        return found, rest
+
+    async def __call__(self, request: SlashRequest) -> Any:
+        try:
+            tokens = shlex.split(request.text)
+        except ValueError:
+            tokens = request.text.split()
+        node, rest = self._resolve(tokens)
+        if node is None:
+            return {
+                "response_type": "ephemeral",
+                "text": f"Usage:\n```\n{self.usage()}\n```",
+            }
+        try:
+            args, kwargs = node.parser.parse(rest)
+        except UsageError as e:
+            return {
+                "response_type": "ephemeral",
+                "text": f"{e}\nUsage: `{node.parser.usage}`",
+            }
+        handler = functools.partial(node.handler, request, *args, **kwargs)
+        if inspect.iscoroutinefunction(node.handler):
+            return await handler()
+        return await run_in_threadpool(handler)
@@ -0,0 +1,71 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    """Tracks the deadline of every in-flight task with one heap and one event loop timer.
+
+    When a task's deadline passes, only that task is cancelled.  A coroutine is interrupted at its next await; a
+    sync hook already running in an executor thread cannot be interrupted, so it is abandoned and its result
+    is discarded.
+
+    Deadlines are in event loop time (`loop.time()`).
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, int, asyncio.Task]] = []
+        self._counter = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_at = math.inf
+        # The loop the timer is on; a task from another (the app started again, on a new loop) re-arms it there
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._live = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        """Number of tracked tasks that have not finished yet"""
+        return self._live
+
+    def add(self, task: asyncio.Task, deadline: float) -> None:
+        heapq.heappush(self._heap, (deadline, next(self._counter), task))
+        self._live += 1
+        task.add_done_callback(self._discard)
+        loop = task.get_loop()
+        if deadline < self._timer_at or loop is not self._loop:
+            self._arm(loop)
+
+    def _discard(self, task: asyncio.Task) -> None:
+        self._live -= 1
+        # Finished tasks are dropped lazily; compact once they dominate the heap
+        if len(self._heap) > 64 and len(self._heap) > 2 * self._live:
+            self._heap = [entry for entry in self._heap if not entry[2].done()]
+            heapq.heapify(self._heap)
+
+    def _arm(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._timer_at = math.inf
+        self._loop = loop
+        while self._heap and self._heap[0][2].done():
+            heapq.heappop(self._heap)
+        if self._heap:
+            self._timer_at = self._heap[0][0]
+            self._timer = loop.call_at(self._timer_at, self._fire, loop)
+
+    def _fire(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._timer = None
+        now = loop.time()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, task = heapq.heappop(self._heap)
+            if not task.done():
+                self.expired += 1
+                logger.warning("%s passed its deadline; cancelling", task.get_name())
+                task.cancel()
+        self._arm(loop)
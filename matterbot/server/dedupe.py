@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import time
+from typing import Any, Awaitable, Callable, Optional, Union
+
+from starlette.responses import Response
+
+from matterbot.server.state import StateBackend, dump_response, load_response
+
+# Stored for completed requests whose response can't be replayed (null responses, streams); replayed as an empty one
+_EMPTY = b""
+# In a shared state: an ID claimed by a worker that's still handling it, and one handled with nothing to replay
+_SHARED_PENDING = b""
+_SHARED_EMPTY = b"-"
+
+
+def _digest(webhook_id: str) -> int:
+    """A 64-bit key for an ID: a small int instead of a ~26-character string per entry"""
+    return int.from_bytes(
+        hashlib.blake2b(webhook_id.encode(), digest_size=8).digest(), "little"
+    )
+
+
+class DedupeStore:
+    """Remembers recently handled webhook IDs (slash `trigger_id`s, outgoing `post_id`s), so a retried webhook gets the
+    original response -- or waits on the original's in-flight work -- instead of running the handler and hooks again.
+
+    IDs are kept as 64-bit digests in two generations of plain dicts: when the current generation is `window` seconds
+    old, or holds `maxsize` / 2 entries, the previous one is dropped wholesale and the current one takes its place.
+    Every ID is therefore remembered for at least `window` seconds (unless the size bound is hit first), expiry costs
+    nothing per entry, and memory stays bounded at `maxsize` entries.  Completed entries keep only the response body
+    bytes (JSON responses with a 200 status, the common case) or a (body, status, media type) tuple.
+
+    With a `state` backend, IDs are also claimed there, so a webhook retried to a different worker is caught as well:
+    that worker polls the state for the original's response for up to `shared_wait` seconds (Mattermost gives up on
+    a slash command after 3), and answers with an empty response if it isn't ready by then.
+    """
+
+    def __init__(
+        self,
+        window: float = 600.0,
+        maxsize: int = 2_000_000,
+        state: Optional[StateBackend] = None,
+        shared_wait: float = 2.5,
+    ) -> None:
+        self.window = window
+        self.maxsize = maxsize
+        self.state = state
+        self.shared_wait = shared_wait
+        self._current: dict[int, Any] = {}
+        self._previous: dict[int, Any] = {}
+        self._rotated = time.monotonic()
+        self.duplicates = 0
+
+    def __len__(self) -> int:
+        return len(self._current) + len(self._previous)
+
+    def _rotate(self) -> None:
+        now = time.monotonic()
+        if now - self._rotated >= self.window or len(self._current) >= self.maxsize // 2:
+            self._previous, self._current = self._current, {}
+            self._rotated = now
+
+    def _lookup(self, key: int) -> Any:
+        entry = self._current.get(key)
+        if entry is None:
+            entry = self._previous.get(key)
+        return entry
+
+    @staticmethod
+    async def _replay(entry: Any) -> Any:
+        if isinstance(entry, asyncio.Future):
+            entry = await asyncio.shield(entry)
+        if entry is _EMPTY:
+            return Response()
+        if isinstance(entry, bytes):
+            return Response(entry, media_type="application/json")
+        body, status_code, media_type = entry
+        return Response(body, status_code=status_code, media_type=media_type)
+
+    async def run_once(
+        self, webhook_id: Optional[str], run: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Run `run` for the first request with this ID; duplicates get (or wait for) the first one's response"""
+        if not webhook_id:
+            return await run()
+        self._rotate()
+        key = _digest(webhook_id)
+        entry = self._lookup(key)
+        if entry is not None:
+            self.duplicates += 1
+            return await self._replay(entry)
+        shared_key = f"dedupe:{key:016x}"
+        if self.state is not None and not await self.state.run(
+            self.state.add, shared_key, _SHARED_PENDING, self.window
+        ):
+            self.duplicates += 1
+            return await self._replay_shared(shared_key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._current[key] = future
+        try:
+            response = await run()
+        except BaseException as e:
+            # Let a later retry start again from scratch
+            self._forget(key, future)
+            if self.state is not None:
+                await self.state.run(self.state.delete, shared_key)
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                future.exception()  # mark retrieved; nobody may be waiting
+            else:
+                future.cancel()
+            raise
+        entry = self._compact(response)
+        for generation in (self._current, self._previous):
+            if generation.get(key) is future:
+                generation[key] = entry
+        future.set_result(entry)
+        if self.state is not None:
+            await self.state.run(self.state.set, shared_key, self._shared(entry), self.window)
+        return response
+
+    async def _replay_shared(self, shared_key: str) -> Any:
+        """Wait for another worker's response to the same webhook, polling the shared state"""
+        give_up = time.monotonic() + self.shared_wait
+        while True:
+            value = await self.state.run(self.state.get, shared_key)
+            if value is None or value == _SHARED_EMPTY:
+                # Handled with nothing to replay, or it failed (and the retry will come again)
+                return Response()
+            if value != _SHARED_PENDING:
+                body, status_code, media_type = load_response(value)
+                return Response(body, status_code=status_code, media_type=media_type)
+            if time.monotonic() >= give_up:
+                return Response()
+            await asyncio.sleep(0.02)
+
+    @staticmethod
+    def _shared(entry: Union[bytes, tuple]) -> bytes:
+        if entry is _EMPTY:
+            return _SHARED_EMPTY
+        if isinstance(entry, bytes):
+            return dump_response(entry, 200, "application/json")
+        return dump_response(*entry)
+
+    def _forget(self, key: int, future: asyncio.Future) -> None:
+        for generation in (self._current, self._previous):
+            if generation.get(key) is future:
+                del generation[key]
+
+    @staticmethod
+    def _compact(response: Any) -> Union[bytes, tuple]:
+        if not isinstance(response, Response) or not hasattr(response, "body"):
+            return _EMPTY
+        if response.status_code == 200 and response.media_type == "application/json":
+            return bytes(response.body)
+        return (bytes(response.body), response.status_code, response.media_type)
+
+    def stats(self) -> dict:
+        return {"size": len(self), "duplicates": self.duplicates}
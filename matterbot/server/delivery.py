@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import pydantic
+
+from matterbot.client.bulk import _transient
+from matterbot.models import SlashExtra
+from matterbot.models.splitting import split_post
+from matterbot.server.jobs import JobStore
+from matterbot.server.metrics import Metrics
+from matterbot.tracing import Tracer
+
+logger = logging.getLogger(__name__)
+
+# Mattermost accepts at most this many posts to a single response_url
+RESPONSE_URL_USES = 5
+
+
+def _status_of(exc: BaseException) -> Optional[int]:
+    """The HTTP status behind a client error, for both aiohttp and requests exceptions"""
+    status = getattr(exc, "status", None)
+    if status is None and getattr(exc, "response", None) is not None:
+        status = getattr(exc.response, "status_code", None)
+    return status
+
+
+def _retryable(exc: BaseException) -> bool:
+    status = _status_of(exc)
+    if status is None:
+        return _transient(exc)
+    return status == 429 or status >= 500
+
+
+def _coalesce(bodies: list[dict]) -> list[dict]:
+    """Merge neighbouring bodies that differ only in their content into single posts.
+
+    Text bodies are joined by blank lines and attachment bodies are concatenated; a body is never merged across
+    a change of username, response_type, etc., or between text and attachments (Mattermost allows only one).
+    """
+    merged: list[dict] = []
+    for body in bodies:
+        if merged:
+            last = merged[-1]
+            content = "text" if body.get("text") else "attachments"
+            if (
+                last.get(content)
+                and {k: v for k, v in last.items() if k != content}
+                == {k: v for k, v in body.items() if k != content}
+            ):
+                if content == "text":
+                    last["text"] = f"{last['text']}\n\n{body['text']}"
+                else:
+                    last["attachments"] = last["attachments"] + body["attachments"]
+                continue
+        merged.append(dict(body))
+    return merged
+
+
+class DeliveryQueue:
+    """Delivers delayed slash responses to their response_url on behalf of hooks.
+
+    Results for the same response_url that arrive within `coalesce_window` seconds of each other are merged into as
+    few posts as possible, and posts over Mattermost's size limits are split into several (for results submitted with
+    `split`); no more than `max_uses` posts are ever sent to one response_url, and results are posted to it in the
+    order they were submitted, one flush at a time.  Failed posts (connection errors and timeouts, 429s and 5xxs)
+    are retried with full-jitter exponential backoff until they succeed, run out of attempts, or the response_url
+    expires.  With a `jobs` store, results submitted with a job id are removed from it once
+    they've been sent (or given up on).
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, dict], Awaitable[Optional[int]]],
+        coalesce_window: float = 0.05,
+        max_uses: int = RESPONSE_URL_USES,
+        attempts: int = 5,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        metrics: Optional[Metrics] = None,
+        tracer: Optional[Tracer] = None,
+        jobs: Optional[JobStore] = None,
+    ) -> None:
+        self._send = send
+        self.jobs = jobs
+        self.metrics = metrics
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.coalesce_window = coalesce_window
+        self.max_uses = max_uses
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._batches: dict[str, tuple[list[dict], float, bool, list[str]]] = {}
+        self._uses: dict[str, int] = {}
+        # The latest flush for each response_url, which the next one waits for
+        self._flushes: dict[str, asyncio.Task] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.sent = 0
+        self.coalesced = 0
+        self.split = 0
+        self.retried = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def __len__(self) -> int:
+        """Number of response_urls with results waiting to be sent"""
+        return len(self._tasks)
+
+    async def drain(self, timeout: float) -> int:
+        """Send everything queued, without waiting out the coalescing window, for up to `timeout` seconds.
+
+        Deliveries still unfinished then are cancelled (and left in the job store, if there is one); returns how
+        many response_urls they were for.
+        """
+        window, self.coalesce_window = self.coalesce_window, 0
+        loop = asyncio.get_running_loop()
+        give_up = loop.time() + timeout
+        while self._tasks and loop.time() < give_up:
+            await asyncio.wait(set(self._tasks), timeout=give_up - loop.time())
+        abandoned = set(self._tasks)
+        for task in abandoned:
+            task.cancel()
+        await asyncio.gather(*abandoned, return_exceptions=True)
+        # Coalescing again, should the queue be used after all (by an app that's started again)
+        self.coalesce_window = window
+        return len(abandoned)
+
+    def remaining(self, response_url: str) -> int:
+        """Posts `response_url` has left, counting results already waiting to be sent to it as one"""
+        response_url = str(response_url)
+        left = self.max_uses - self._uses.get(response_url, 0)
+        return left - (response_url in self._batches)
+
+    def submit(
+        self,
+        response_url: str,
+        body: Any,
+        deadline: float,
+        split: bool = True,
+        job: Optional[str] = None,
+    ) -> None:
+        """Queue a hook result for `response_url`, which stops accepting posts at `deadline` (in loop time)"""
+        if isinstance(body, pydantic.BaseModel):
+            # A Slash (or any other model) is revalidated as a SlashExtra from its fields
+            body = body.model_dump(exclude_none=True)
+        try:
+            body = SlashExtra.model_validate(body).model_dump(
+                mode="json", exclude_none=True
+            )
+        except ValueError:
+            self.failed += 1
+            logger.exception("Invalid delayed response for %s", response_url)
+            if job is not None and self.jobs is not None:
+                self.jobs.remove(job)
+            return
+        response_url = str(response_url)
+        loop = asyncio.get_running_loop()
+        if response_url in self._batches:
+            self._batches[response_url][0].append(body)
+            if job is not None:
+                self._batches[response_url][3].append(job)
+            return
+        jobs = [] if job is None else [job]
+        self._batches[response_url] = ([body], deadline, split, jobs)
+        if response_url not in self._uses:
+            self._uses[response_url] = 0
+            loop.call_at(deadline, self._uses.pop, response_url, None)
+        task = asyncio.create_task(
+            self._flush(response_url, self._flushes.get(response_url)),
+            name=f"delivery {response_url}",
+        )
+        self._flushes[response_url] = task
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda done: self._flushed(response_url, done))
+
+    def _flushed(self, response_url: str, task: asyncio.Task) -> None:
+        if self._flushes.get(response_url) is task:
+            del self._flushes[response_url]
+
+    async def _flush(self, response_url: str, previous: Optional[asyncio.Task]) -> None:
+        if previous is not None:
+            # Results submitted while an earlier batch is still being sent (or retried) wait for it, so they can't
+            # overtake it
+            await asyncio.wait([previous])
+        if self.coalesce_window > 0:
+            await asyncio.sleep(self.coalesce_window)
+        bodies, deadline, split, jobs = self._batches.pop(response_url)
+        await self._send_batch(response_url, bodies, deadline, split)
+        # Not if the flush is cancelled on the way: those results are still owed after a restart
+        if jobs and self.jobs is not None:
+            self.jobs.remove(*jobs)
+
+    async def _send_batch(
+        self, response_url: str, bodies: list[dict], deadline: float, split: bool
+    ) -> None:
+        posts = _coalesce(bodies)
+        self.coalesced += len(bodies) - len(posts)
+        if split:
+            # After coalescing, so merged results are packed into as few posts as the limits allow
+            fitted = [part for post in posts for part in split_post(post)]
+            self.split += len(fitted) - len(posts)
+            posts = fitted
+        remaining = self.max_uses - self._uses.get(response_url, self.max_uses)
+        if len(posts) > remaining:
+            self.dropped += len(posts) - max(remaining, 0)
+            logger.warning(
+                "%s has only %d of its %d posts left; dropping %d result(s)",
+                response_url,
+                max(remaining, 0),
+                self.max_uses,
+                len(posts) - max(remaining, 0),
+            )
+            posts = posts[: max(remaining, 0)]
+        if not posts:
+            return
+        # Reserve the uses up front so remaining() counts them while they're being sent
+        self._uses[response_url] += len(posts)
+        for post in posts:
+            if not await self._post(response_url, post, deadline) and (
+                response_url in self._uses
+            ):
+                self._uses[response_url] -= 1
+
+    async def _post(self, response_url: str, body: dict, deadline: float) -> bool:
+        with self.tracer.span("deliver") as span:
+            loop = asyncio.get_running_loop()
+            for attempt in range(self.attempts):
+                if loop.time() >= deadline:
+                    break
+                span.set_attribute("matterbot.attempts", attempt + 1)
+                started = time.perf_counter()
+                try:
+                    status = await self._send(response_url, body)
+                    self.sent += 1
+                    span.set_attribute("http.status_code", status or 200)
+                    if self.metrics is not None:
+                        self.metrics.deliveries.observe(
+                            time.perf_counter() - started, str(status or 200)
+                        )
+                    return True
+                except Exception as exc:
+                    status = _status_of(exc)
+                    if self.metrics is not None:
+                        self.metrics.deliveries.observe(
+                            time.perf_counter() - started, str(status or "error")
+                        )
+                    if not _retryable(exc) or attempt + 1 == self.attempts:
+                        self.failed += 1
+                        span.record_exception(exc)
+                        logger.exception("Delivery to %s failed", response_url)
+                        return False
+                    delay = random.uniform(
+                        0, min(self.max_backoff, self.backoff * 2**attempt)
+                    )
+                    if loop.time() + delay >= deadline:
+                        break
+                    self.retried += 1
+                    await asyncio.sleep(delay)
+            self.dropped += 1
+            span.set_attribute("matterbot.expired", True)
+            logger.warning("%s expired before its result could be delivered", response_url)
+            return False
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._tasks),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "split": self.split,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
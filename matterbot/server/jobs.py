@@ -0,0 +1,226 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Optional
+
+from matterbot import _json
+from matterbot.server.admission import _alive
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    payload BLOB NOT NULL,
+    owner TEXT
+)
+"""
+
+
+class JobStore:
+    """Persists scheduled hooks and undelivered delayed responses in SQLite, so a restart doesn't lose them.
+
+    Writes never block the caller: they're queued and committed by a writer thread in batches, one transaction
+    (and one fsync of the write-ahead log) every `commit_interval` seconds or `max_batch` writes, whichever comes
+    first.  A job removed before its batch is committed is never written at all, so work that finishes quickly costs
+    nothing on disk.  The price is that a crash loses up to `commit_interval` seconds of writes.
+
+    Jobs are `kind` ("hook" or "result") plus a JSON-serializable payload, and expire at a wall-clock time.  Each is
+    owned by the PID of the worker that added it, so several workers on one host can share a file: on startup,
+    `claim()` takes over the unexpired jobs of workers that have exited (forgetting the expired ones), and leaves
+    those of live workers -- which are still running them -- alone.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        commit_interval: float = 0.05,
+        max_batch: int = 1024,
+    ) -> None:
+        self.path = path
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self._adds: dict[str, tuple[str, str, float, bytes]] = {}
+        self._removes: list[str] = []
+        self._queued = 0
+        self._committed = 0
+        self._closing = False
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._done = threading.Condition(self._lock)
+        self.written = 0
+        self.skipped = 0
+        self.commits = 0
+
+        connection = self._connect()
+        connection.close()
+        self._thread = threading.Thread(
+            target=self._run, name="matterbot-jobs", daemon=True
+        )
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=FULL")
+        connection.execute(_SCHEMA)
+        return connection
+
+    def add(self, kind: str, payload: Any, expires_at: float) -> str:
+        """Queue a job for writing; returns its id"""
+        job_id = uuid.uuid4().hex
+        row = (job_id, kind, expires_at, _json.dumps(payload), str(os.getpid()))
+        with self._lock:
+            self._adds[job_id] = row
+            self._queued += 1
+            self._notify()
+        return job_id
+
+    def remove(self, *job_ids: str) -> None:
+        """Queue jobs for removal, once they're done (or can't ever be done)"""
+        with self._lock:
+            for job_id in job_ids:
+                if self._adds.pop(job_id, None) is not None:
+                    self.skipped += 1
+                else:
+                    self._removes.append(job_id)
+            self._queued += 1
+            self._notify()
+
+    def _notify(self) -> None:
+        # Wake the writer for the first write of a batch, and again once the batch is full
+        size = len(self._adds) + len(self._removes)
+        if size <= 1 or size >= self.max_batch:
+            self._wake.notify()
+
+    def pending(self, now: Optional[float] = None) -> list[tuple[str, str, float, Any]]:
+        """The unexpired jobs on disk, oldest first, as (id, kind, expires_at, payload); expired ones are deleted"""
+        now = time.time() if now is None else now
+        connection = self._connect()
+        try:
+            connection.execute("DELETE FROM jobs WHERE expires_at <= ?", (now,))
+            rows = connection.execute(
+                "SELECT id, kind, expires_at, payload FROM jobs ORDER BY expires_at"
+            ).fetchall()
+        finally:
+            connection.close()
+        return [
+            (job_id, kind, expires_at, _json.loads(payload))
+            for job_id, kind, expires_at, payload in rows
+        ]
+
+    def claim(self, now: Optional[float] = None) -> list[tuple[str, str, float, Any]]:
+        """Take over the unexpired jobs left by workers that have exited (or by an earlier run of this one), as
+        pending() does; another worker claiming at the same time gets none of them.  Blocks on the database."""
+        now = time.time() if now is None else now
+        owner = str(os.getpid())
+        connection = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front, so no other worker can claim the same jobs in between
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute("DELETE FROM jobs WHERE expires_at <= ?", (now,))
+                rows = [
+                    row
+                    for row in connection.execute(
+                        "SELECT id, kind, expires_at, payload, owner FROM jobs ORDER BY expires_at"
+                    ).fetchall()
+                    if row[4] is None or row[4] == owner or not _alive(int(row[4]))
+                ]
+                connection.executemany(
+                    "UPDATE jobs SET owner = ? WHERE id = ?", [(owner, row[0]) for row in rows]
+                )
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+        return [
+            (job_id, kind, expires_at, _json.loads(payload))
+            for job_id, kind, expires_at, payload, _ in rows
+        ]
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far is committed; False if `timeout` ran out first"""
+        with self._lock:
+            target = self._queued
+            self._wake.notify()
+            return self._done.wait_for(lambda: self._committed >= target, timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Commit what's queued and stop the writer thread"""
+        with self._lock:
+            self._closing = True
+            self._wake.notify()
+        self._thread.join(timeout)
+
+    def __len__(self) -> int:
+        """Number of writes waiting to be committed"""
+        with self._lock:
+            return len(self._adds) + len(self._removes)
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self),
+            "written": self.written,
+            "skipped": self.skipped,
+            "commits": self.commits,
+        }
+
+    def _run(self) -> None:
+        connection = self._connect()
+        try:
+            while True:
+                with self._lock:
+                    self._wake.wait_for(
+                        lambda: self._queued > self._committed or self._closing
+                    )
+                    # Give the batch a moment to fill up, unless it's full already
+                    if not self._closing:
+                        self._wake.wait_for(
+                            lambda: len(self._adds) + len(self._removes) >= self.max_batch
+                            or self._closing,
+                            self.commit_interval,
+                        )
+                    adds, self._adds = list(self._adds.values()), {}
+                    removes, self._removes = self._removes, []
+                    queued = self._queued
+                    closing = self._closing
+                if adds or removes:
+                    self._commit(connection, adds, removes)
+                with self._lock:
+                    self._committed = queued
+                    self._done.notify_all()
+                if closing:
+                    return
+        finally:
+            connection.close()
+
+    def _commit(
+        self, connection: sqlite3.Connection, adds: list[tuple], removes: list[str]
+    ) -> None:
+        try:
+            connection.execute("BEGIN")
+            connection.executemany(
+                "INSERT OR REPLACE INTO jobs (id, kind, expires_at, payload, owner) VALUES (?, ?, ?, ?, ?)",
+                adds,
+            )
+            connection.executemany(
+                "DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in removes]
+            )
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            logger.exception(
+                "Couldn't write %d job(s) to %s", len(adds) + len(removes), self.path
+            )
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            return
+        self.written += len(adds) + len(removes)
+        self.commits += 1
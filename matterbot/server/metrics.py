@@ -0,0 +1,213 @@
+import bisect
+import contextvars
+import threading
+import time
+from typing import Callable, Optional, Sequence, Union
+
+# Set by the middlewares for the request being handled, so handlers can split its latency into phases
+request_started: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "matterbot_request_started", default=None
+)
+token_seconds: contextvars.ContextVar[float] = contextvars.ContextVar(
+    "matterbot_token_seconds", default=0.0
+)
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0,
+)  # fmt: skip
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labelset(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Sharded:
+    """Per-thread storage: each thread only ever writes its own shard, so recording needs no lock.
+    Shards are summed when scraped."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str]) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards: list[dict] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def _series(self) -> list[tuple[tuple, object]]:
+        with self._lock:
+            shards = list(self._shards)
+        # list() copies each dict in one C call, so a concurrent insert can't break the iteration
+        return [item for shard in shards for item in list(shard.items())]
+
+
+class Histogram(_Sharded):
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            # One count per bucket (non-cumulative), one for +Inf, then the sum
+            series = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> list[str]:
+        totals: dict[tuple, list] = {}
+        for labels, series in self._series():
+            total = totals.setdefault(labels, [0] * len(series))
+            for i, value in enumerate(series):
+                total[i] += value
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, total in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), total):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format(bound)
+                labelset = _labelset(self.labels, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labelset} {cumulative}")
+            lines.append(f"{self.name}_sum{_labelset(self.labels, labels)} {_format(total[-1])}")
+            lines.append(f"{self.name}_count{_labelset(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """A value read from a callback at scrape time, so it costs nothing until scraped"""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        read: Callable[[], Union[float, dict[tuple, float]]],
+        labels: Sequence[str] = (),
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.read = read
+        self.labels = tuple(labels)
+
+    def render(self) -> list[str]:
+        value = self.read()
+        values = value if isinstance(value, dict) else {(): value}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, v in sorted(values.items()):
+            lines.append(f"{self.name}{_labelset(self.labels, labels)} {_format(v)}")
+        return lines
+
+
+class Metrics:
+    """MatterbotServer's metrics, exposed in the Prometheus text format"""
+
+    def __init__(self) -> None:
+        self.requests = Histogram(
+            "matterbot_request_seconds",
+            "End-to-end request latency, by route (path template) and response status.",
+            ("path", "status"),
+        )
+        self.phases = Histogram(
+            "matterbot_request_phase_seconds",
+            "Request latency by path and phase (parse, token, handler, serialize).",
+            ("path", "phase"),
+        )
+        self.hook_wait = Histogram(
+            "matterbot_hook_wait_seconds",
+            "Time hooks spent queued before starting, by path.",
+            ("path",),
+        )
+        self.hook_runtime = Histogram(
+            "matterbot_hook_seconds", "Hook runtime, by path.", ("path",)
+        )
+        self.deliveries = Histogram(
+            "matterbot_delivery_seconds",
+            "Delayed response delivery latency, by HTTP status (or 'error').",
+            ("status",),
+        )
+        self._metrics: list = [
+            self.requests,
+            self.phases,
+            self.hook_wait,
+            self.hook_runtime,
+            self.deliveries,
+        ]
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        read: Callable[[], Union[float, dict[tuple, float]]],
+        labels: Sequence[str] = (),
+    ) -> None:
+        self._metrics.append(Gauge(name, help, read, labels))
+
+    def observe_entry(self, path: str, entered: float) -> None:
+        """Record the parse and token phases of the current request, as its handler is entered"""
+        started = request_started.get()
+        if started is None:
+            return
+        token = token_seconds.get()
+        self.phases.observe(token, path, "token")
+        self.phases.observe(max(entered - started - token, 0.0), path, "parse")
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every request end to end, and marking when each started for the phase breakdown"""
+
+    def __init__(self, app, metrics: Metrics) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        reset = request_started.set(started)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_started.reset(reset)
+            # By route template (/items/{id}), so neither path parameters nor scans of unknown paths create
+            # unbounded label sets
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "other"
+            self.metrics.requests.observe(time.perf_counter() - started, path, str(status))
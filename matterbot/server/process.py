@@ -0,0 +1,48 @@
+"""Running CPU-bound hooks in worker processes, out of reach of the server's GIL.
+
+Only plain data crosses the process boundary: the request goes over as a dict of its (already validated) fields, and
+the hook's result comes back as a dict, for the parent to validate and deliver.  Hooks must be picklable, i.e. plain
+functions defined at the top level of an importable module.
+"""
+
+import multiprocessing
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+import pydantic
+
+from matterbot.models import SlashRequest
+
+
+def check_picklable(hook: Callable) -> None:
+    """Raise ValueError for hooks that can't be sent to a worker process (lambdas, closures, bound methods of
+    unpicklable objects, ...), so they're caught when the command is registered rather than when it's used."""
+    try:
+        pickle.dumps(hook)
+    except Exception as exc:
+        raise ValueError(
+            f"{getattr(hook, '__name__', hook)!r} can't run in a process pool: it must be picklable "
+            "(a function defined at the top level of a module)"
+        ) from exc
+
+
+def run_hook(hook: Callable, fields: dict[str, Any]) -> tuple[Any, float]:
+    """Run `hook` in a worker process; returns its result as plain data, and its runtime"""
+    # The fields were validated by the parent, so skip doing it again
+    request = SlashRequest.model_construct(**fields)
+    started = time.perf_counter()
+    result = hook(request)
+    runtime = time.perf_counter() - started
+    if isinstance(result, pydantic.BaseModel):
+        result = result.model_dump(mode="json", exclude_none=True)
+    return result, runtime
+
+
+def default_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """A process pool whose workers are spawned fresh: forking a server with running threads and an event loop isn't
+    safe."""
+    return ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    )
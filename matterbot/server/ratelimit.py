@@ -0,0 +1,76 @@
+import time
+from typing import Any, Literal, Optional
+
+from matterbot.server.state import StateBackend
+
+
+class RateLimiter:
+    """A token bucket per user, channel, or team for one command: `limit` requests per `period` seconds on average,
+    in bursts of up to `burst` (default: `limit`) requests.
+
+    Buckets are kept in GCRA form -- a single float per key, the time at which the bucket will be full again -- and a
+    bucket that has refilled is the same as no bucket at all, so idle keys are pruned in bulk as the table grows.
+    With a `state` backend, the buckets are kept there instead (under `namespace`, by default the command's path),
+    so every worker sharing it enforces one limit; each bucket expires once it has refilled.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        period: float = 60.0,
+        key: Literal["user_id", "channel_id", "team_id"] = "user_id",
+        burst: Optional[int] = None,
+        state: Optional[StateBackend] = None,
+        namespace: Optional[str] = None,
+    ) -> None:
+        self.key = key
+        self.state = state
+        self.namespace = namespace
+        self._interval = period / limit
+        self._tolerance = ((burst or limit) - 1) * self._interval
+        self._full_at: dict[str, float] = {}
+        self._prune_at = 1024
+        self.limited = 0
+
+    def __len__(self) -> int:
+        return len(self._full_at)
+
+    def allow(self, request: Any) -> bool:
+        if self.state is not None:
+            return self._allow_shared(getattr(request, self.key))
+        now = time.monotonic()
+        key = getattr(request, self.key)
+        full_at = max(self._full_at.get(key, now), now)
+        if full_at - now > self._tolerance:
+            self.limited += 1
+            return False
+        self._full_at[key] = full_at + self._interval
+        if len(self._full_at) >= self._prune_at:
+            self._prune(now)
+        return True
+
+    def _allow_shared(self, key: str) -> bool:
+        # Wall-clock time, which (unlike the monotonic clock) every process agrees on
+        now = time.time()
+
+        def take(value: Optional[bytes]) -> tuple[Optional[bytes], bool]:
+            full_at = max(float(value) if value else now, now)
+            if full_at - now > self._tolerance:
+                return value, False
+            return repr(full_at + self._interval).encode(), True
+
+        allowed = self.state.update(
+            f"ratelimit:{self.namespace}:{self.key}:{key}",
+            take,
+            ttl=self._tolerance + self._interval,
+        )
+        if not allowed:
+            self.limited += 1
+        return allowed
+
+    def _prune(self, now: float) -> None:
+        self._full_at = {k: v for k, v in self._full_at.items() if v > now}
+        self._prune_at = max(1024, 2 * len(self._full_at))
+
+    def stats(self) -> dict:
+        return {"tracked": len(self._full_at), "limited": self.limited}
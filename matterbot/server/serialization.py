@@ -0,0 +1,46 @@
+from typing import Any, Optional
+
+from pydantic import BaseModel, TypeAdapter
+from starlette.responses import Response
+
+from matterbot import _json
+from matterbot.models import Outgoing, Slash
+from matterbot.models.splitting import MAX_MESSAGE_LENGTH, split_slash
+
+# Built once at import, rather than per response
+SLASH_ADAPTER = TypeAdapter(Slash)
+OUTGOING_ADAPTER = TypeAdapter(Outgoing)
+
+
+def render(
+    result: Any,
+    adapter: TypeAdapter,
+    trusted: bool = False,
+    status_code: Optional[int] = None,
+    split: bool = False,
+    **dump_options,
+) -> Response:
+    """Turn a handler's return value into a JSON response in one pass.
+
+    Untrusted results are validated once against `adapter` and serialized by pydantic-core straight to bytes.  Trusted
+    results skip validation entirely: models are serialized as they are, and plain dicts go to the fast JSON encoder.
+    Responses and pre-serialized bytes are passed through untouched.
+
+    With `split`, a slash response over Mattermost's size limits has its overflow moved into `extra_responses`.  Only
+    bodies longer than the message limit (in bytes, which is never less than in characters) are looked at again.
+    """
+    if isinstance(result, Response):
+        return result
+    if isinstance(result, (bytes, bytearray)):
+        body = bytes(result)
+    elif trusted and not isinstance(result, BaseModel):
+        body = _json.dumps(result)
+    else:
+        if not trusted:
+            result = adapter.validate_python(result)
+        body = adapter.dump_json(result, **dump_options)
+    if split and len(body) > MAX_MESSAGE_LENGTH:
+        fitted = split_slash(_json.loads(body))
+        if fitted is not None:
+            body = _json.dumps(fitted)
+    return Response(body, status_code=status_code or 200, media_type="application/json")
@@ -0,0 +1,212 @@
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional
+
+# An update function gets the current value (None if there's none) and returns (new value or None to delete, result)
+Update = Callable[[Optional[bytes]], tuple[Optional[bytes], Any]]
+
+
+class StateBackend:
+    """Key-value state shared by the server's caches, dedupe store, rate limiters, and admission control.
+
+    Values are bytes and expire `ttl` seconds after they're written (None: never).  Implementations must make `add`
+    and `update` atomic with respect to every process sharing the state.
+    """
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """Set `key` only if it has no (unexpired) value; True if it was set"""
+        raise NotImplementedError
+
+    def update(self, key: str, fn: Update, ttl: Optional[float] = None) -> Any:
+        """Atomically replace `key`'s value with what `fn` makes of it; returns `fn`'s result"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Call `fn(*args)`, something that uses this state, without holding up the event loop: in a thread, since a
+        backend may have to wait for a lock (or the disk)"""
+        return await asyncio.to_thread(fn, *args)
+
+    def close(self) -> None:
+        pass
+
+
+def _expiry(ttl: Optional[float]) -> float:
+    return math.inf if ttl is None else time.time() + ttl
+
+
+class MemoryState(StateBackend):
+    """State in a dict, for a single process (any number of threads)"""
+
+    def __init__(self) -> None:
+        self._values: dict[str, tuple[bytes, float]] = {}
+        self._lock = threading.Lock()
+        self._prune_at = 1024
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        # Never more than a moment's wait for the lock, so not worth a thread
+        return fn(*args)
+
+    def _get(self, key: str) -> Optional[bytes]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del self._values[key]
+            return None
+        return entry[0]
+
+    def _set(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        self._values[key] = (value, _expiry(ttl))
+        if len(self._values) >= self._prune_at:
+            now = time.time()
+            self._values = {k: v for k, v in self._values.items() if v[1] > now}
+            self._prune_at = max(1024, 2 * len(self._values))
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._set(key, value, ttl)
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        with self._lock:
+            if self._get(key) is not None:
+                return False
+            self._set(key, value, ttl)
+            return True
+
+    def update(self, key: str, fn: Update, ttl: Optional[float] = None) -> Any:
+        with self._lock:
+            value, result = fn(self._get(key))
+            if value is None:
+                self._values.pop(key, None)
+            else:
+                self._set(key, value, ttl)
+            return result
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+
+class SQLiteState(StateBackend):
+    """State in a SQLite database in WAL mode, shared by every worker process on the host that opens the same file.
+
+    Writes aren't synced to disk (the state is only worth as much as the processes using it), so each operation is a
+    short local transaction; put the file on a tmpfs such as /dev/shm to keep it entirely in memory.  Each thread
+    gets its own connection.  Expired values are ignored, and deleted every `prune_every` writes.
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0, prune_every: int = 4096) -> None:
+        self.path = path
+        self.timeout = timeout
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._writes = 0
+        self._db()
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=OFF")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS state"
+                " (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._local.db = db
+        return db
+
+    def _wrote(self, db: sqlite3.Connection) -> None:
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            db.execute("DELETE FROM state WHERE expires_at <= ?", (time.time(),))
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._db().execute(
+            "SELECT value FROM state WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        db = self._db()
+        db.execute(
+            "INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, _expiry(ttl)),
+        )
+        self._wrote(db)
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        db = self._db()
+        cursor = db.execute(
+            "INSERT INTO state (key, value, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at"
+            " WHERE state.expires_at <= ?",
+            (key, value, _expiry(ttl), time.time()),
+        )
+        self._wrote(db)
+        return cursor.rowcount > 0
+
+    def update(self, key: str, fn: Update, ttl: Optional[float] = None) -> Any:
+        db = self._db()
+        # IMMEDIATE takes the write lock up front, so no other process can change the value between read and write
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT value FROM state WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+            value, result = fn(None if row is None else row[0])
+            if value is None:
+                db.execute("DELETE FROM state WHERE key = ?", (key,))
+            else:
+                db.execute(
+                    "INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, _expiry(ttl)),
+                )
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        self._wrote(db)
+        return result
+
+    def delete(self, key: str) -> None:
+        db = self._db()
+        db.execute("DELETE FROM state WHERE key = ?", (key,))
+        self._wrote(db)
+
+    def close(self) -> None:
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+
+def dump_response(body: bytes, status_code: int = 200, media_type: Optional[str] = None) -> bytes:
+    """A rendered response as one bytes value, for caches and dedupe stores to share"""
+    return b"%d %s\n" % (status_code, (media_type or "").encode()) + bytes(body)
+
+
+def load_response(value: bytes) -> tuple[bytes, int, Optional[str]]:
+    """The (body, status code, media type) of a value made by dump_response"""
+    head, _, body = value.partition(b"\n")
+    status_code, _, media_type = head.decode().partition(" ")
+    return body, int(status_code), media_type or None
@@ -0,0 +1,188 @@
+import hmac
+import json
+import logging
+import os
+import time
+from typing import Callable, Iterable, Mapping, Optional, Union
+from urllib.parse import parse_qsl
+
+from starlette.responses import JSONResponse
+
+from matterbot.models.splitting import MAX_PAYLOAD_BYTES
+from matterbot.server.metrics import token_seconds
+
+logger = logging.getLogger(__name__)
+
+TokenSource = Union[str, os.PathLike, Callable[[], Mapping[str, Iterable[str]]]]
+
+
+def _encode(tokens: Union[str, Iterable[str]]) -> frozenset[bytes]:
+    if isinstance(tokens, str):
+        tokens = [tokens]
+    return frozenset(token.encode() for token in tokens)
+
+
+class TokenRegistry:
+    """The valid Mattermost integration tokens for each command, keyed on its path (or command, in dispatcher mode).
+
+    Each command may have several valid tokens at once so they can be rotated without downtime, and every check is
+    constant-time.  Tokens from a `source` (a JSON file mapping keys to lists of tokens, or a callable returning such a
+    mapping) are merged with those registered in code, and re-read at most every `reload_interval` seconds -- for a
+    file, only when its modification time changes -- so tokens can change without restarting workers.
+    """
+
+    def __init__(
+        self, source: Optional[TokenSource] = None, reload_interval: float = 5.0
+    ) -> None:
+        self.source = source
+        self.reload_interval = reload_interval
+        self._static: dict[str, frozenset[bytes]] = {}
+        self._loaded: dict[str, frozenset[bytes]] = {}
+        self._tokens: dict[str, frozenset[bytes]] = {}
+        self._next_check = 0.0
+        self._mtime: Optional[int] = None
+
+    def add(self, key: str, tokens: Union[str, Iterable[str]]) -> None:
+        self._static[key] = self._static.get(key, frozenset()) | _encode(tokens)
+        self._merge()
+
+    def _merge(self) -> None:
+        merged = dict(self._loaded)
+        for key, tokens in self._static.items():
+            merged[key] = merged.get(key, frozenset()) | tokens
+        self._tokens = merged
+
+    def reload(self) -> None:
+        """Re-read the token source now"""
+        if self.source is None:
+            return
+        try:
+            if callable(self.source):
+                loaded = self.source()
+            else:
+                mtime = os.stat(self.source).st_mtime_ns
+                if mtime == self._mtime:
+                    return
+                with open(self.source) as f:
+                    loaded = json.load(f)
+                self._mtime = mtime
+        except Exception:
+            logger.exception("Could not reload tokens; keeping the current set")
+            return
+        self._loaded = {key: _encode(tokens) for key, tokens in loaded.items()}
+        self._merge()
+
+    def _maybe_reload(self) -> None:
+        if self.source is not None and time.monotonic() >= self._next_check:
+            self._next_check = time.monotonic() + self.reload_interval
+            self.reload()
+
+    def protects(self, key: str) -> bool:
+        self._maybe_reload()
+        return key in self._tokens
+
+    def verify(self, key: str, token: Optional[str]) -> bool:
+        """True if `token` is valid for `key`, or if `key` has no tokens registered at all"""
+        self._maybe_reload()
+        valid = self._tokens.get(key)
+        if valid is None:
+            return True
+        candidate = token.encode() if isinstance(token, str) else b""
+        matched = False
+        for expected in valid:
+            # No early exit, so timing doesn't reveal which (or whether any) token matched
+            matched |= hmac.compare_digest(candidate, expected)
+        return matched
+
+
+def _fields(scope: dict, body: bytes) -> dict:
+    """Pull the form, JSON, or query string fields out of a raw request, without building any models"""
+    if scope["method"] == "GET":
+        return dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+    content_type = b""
+    for name, value in scope["headers"]:
+        if name == b"content-type":
+            content_type = value
+            break
+    if content_type.startswith(b"application/json"):
+        try:
+            fields = json.loads(body)
+        except ValueError:
+            return {}
+        return fields if isinstance(fields, dict) else {}
+    return dict(parse_qsl(body.decode("utf-8", "replace")))
+
+
+class TokenMiddleware:
+    """ASGI middleware that rejects requests with unknown tokens before FastAPI parses or validates them.
+
+    Bodies over `max_body` bytes (by default, the most Mattermost will send) are refused without being read in full.
+    """
+
+    def __init__(
+        self,
+        app,
+        registry: TokenRegistry,
+        dispatch_path: Optional[str] = None,
+        max_body: int = MAX_PAYLOAD_BYTES,
+    ) -> None:
+        self.app = app
+        self.registry = registry
+        self.dispatch_path = dispatch_path
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send) -> None:
+        path = scope.get("path")
+        if scope["type"] != "http" or (
+            path != self.dispatch_path and not self.registry.protects(path)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if size > self.max_body:
+                response = JSONResponse({"detail": "Request body too large"}, status_code=413)
+                await response(scope, receive, send)
+                return
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        started = time.perf_counter()
+        fields = _fields(scope, body)
+        key = path
+        if path == self.dispatch_path:
+            key = fields.get("command") or fields.get("trigger_word") or ""
+        token = fields.get("token")
+        # Anything but strings (from a JSON body) is as good as a wrong token
+        verified = (
+            isinstance(key, str)
+            and isinstance(token, (str, type(None)))
+            and self.registry.verify(key, token)
+        )
+        token_seconds.set(time.perf_counter() - started)
+        if not verified:
+            response = JSONResponse(
+                {"detail": "Unauthorized: provided token did not match"},
+                status_code=401,
+            )
+            await response(scope, receive, send)
+            return
+
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if replayed:
+                return await receive()
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app(scope, replay, send)
@@ -0,0 +1,292 @@
+"""A local stand-in for Mattermost, for testing and benchmarking clients and bots offline.
+
+`FakeMattermost` accepts incoming-webhook posts (`/hooks/<id>`) and slash command delayed responses
+(`/hooks/commands/<id>`) the way Mattermost does.  It enforces the payload size and message length limits and the
+five-posts-per-response_url limit, and it can add latency and fail requests with 5xxs or 429s, at random or on demand.
+It runs on the current event loop (`async with`) or on a background thread (`with`), so sync clients can use it too.
+With pytest, the `fake_mattermost` fixture provides a started instance.
+
+## Example
+
+```python
+with FakeMattermost(latency=0.01, throttle_rate=0.05) as mattermost:
+    client.incoming_webhook(hook_url=mattermost.hook_url("deploys"), body=Incoming(text="deployed"))
+    assert mattermost.posts[0].body["text"] == "deployed"
+```
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional, Union
+from urllib.parse import parse_qsl
+
+from matterbot.models.splitting import MAX_MESSAGE_LENGTH, MAX_PAYLOAD_BYTES
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+    503: "Service Unavailable",
+}
+
+
+@dataclass
+class Post:
+    """One request received by FakeMattermost, and how it was answered"""
+
+    path: str
+    body: Optional[dict]
+    status: int
+    received_at: float = field(default_factory=time.perf_counter)
+    headers: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def accepted(self) -> bool:
+        return self.status == 200
+
+
+class FakeMattermost:
+    """An HTTP server imitating Mattermost's webhook endpoints, with injectable latency and failures.
+
+    latency: seconds to wait before answering each request, or a (low, high) range to draw from uniformly
+    error_rate: fraction of requests answered with a 503
+    throttle_rate: fraction of requests answered with a 429 carrying a `Retry-After` of `retry_after` seconds
+    max_payload_bytes / max_text_length: request size and message length limits, answered with a 413 / 400
+    response_url_uses / response_url_ttl: how many posts each response_url accepts, and for how many seconds after its
+        first use; beyond either, posts get a 400 / 404
+    seed: seeds the random failures, for reproducible runs
+
+    Injected failures are decided before the request is checked, and aren't counted against a response_url's uses.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: Union[float, tuple[float, float]] = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: int = 1,
+        max_payload_bytes: int = MAX_PAYLOAD_BYTES,
+        max_text_length: int = MAX_MESSAGE_LENGTH,
+        response_url_uses: int = 5,
+        response_url_ttl: float = 30 * 60,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.max_payload_bytes = max_payload_bytes
+        self.max_text_length = max_text_length
+        self.response_url_uses = response_url_uses
+        self.response_url_ttl = response_url_ttl
+        self.posts: list[Post] = []
+        self._random = random.Random(seed)
+        self._forced: deque[int] = deque()
+        self._response_urls: dict[str, tuple[float, int]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def hook_url(self, hook_id: str) -> str:
+        """An incoming webhook URL"""
+        return f"{self.url}/hooks/{hook_id}"
+
+    def response_url(self, command_id: str) -> str:
+        """A slash command response_url"""
+        return f"{self.url}/hooks/commands/{command_id}"
+
+    def received(self, url_or_path: str) -> list[Post]:
+        """The accepted posts to one URL (or path), in order of arrival"""
+        path = url_or_path.removeprefix(self.url)
+        return [post for post in self.posts if post.path == path and post.accepted]
+
+    def fail_next(self, status: int = 503, count: int = 1) -> None:
+        """Answer the next `count` requests with `status` (429s get a Retry-After), whatever the random rates say"""
+        self._forced.extend([status] * count)
+
+    def reset(self) -> None:
+        """Forget every post and response_url use"""
+        self.posts.clear()
+        self._response_urls.clear()
+        self._forced.clear()
+
+    def stats(self) -> dict:
+        by_status: dict[int, int] = {}
+        for post in self.posts:
+            by_status[post.status] = by_status.get(post.status, 0) + 1
+        return {"posts": len(self.posts), "by_status": by_status}
+
+    async def start(self) -> None:
+        """Start listening on the running event loop"""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self._server.close()
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def __aenter__(self) -> "FakeMattermost":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    def start_in_thread(self) -> None:
+        """Start listening on an event loop of its own, in a background thread"""
+        started = threading.Event()
+
+        def run() -> None:
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="fake-mattermost", daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop_thread(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self) -> "FakeMattermost":
+        self.start_in_thread()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop_thread()
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                request_line, headers, body = await self._read_request(reader)
+                method, target = request_line.split(" ")[:2]
+                status, headers_out, text = await self._respond(method, target, headers, body)
+                head = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}"]
+                head += [f"{name}: {value}" for name, value in headers_out.items()]
+                payload = text.encode()
+                head += ["Content-Type: text/plain", f"Content-Length: {len(payload)}"]
+                writer.write("\r\n".join(head).encode() + b"\r\n\r\n" + payload)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            del self._connections[task]
+            writer.close()
+
+    @staticmethod
+    async def _read_request(
+        reader: asyncio.StreamReader,
+    ) -> tuple[str, dict[str, str], bytes]:
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        request_line, *lines = head.rstrip("\r\n").split("\r\n")
+        headers = {}
+        for line in lines:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                chunks.append(chunk[:-2])
+            return request_line, headers, b"".join(chunks)
+        length = int(headers.get("content-length", 0))
+        return request_line, headers, await reader.readexactly(length)
+
+    async def _respond(
+        self, method: str, path: str, headers: dict[str, str], raw: bytes
+    ) -> tuple[int, dict[str, str], str]:
+        latency = self.latency
+        if isinstance(latency, tuple):
+            latency = self._random.uniform(*latency)
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+        body = None
+        status = self._fault()
+        if status is None:
+            body, status, text = self._check(method, path, headers, raw)
+        else:
+            text = _REASONS.get(status, "Error")
+        headers_out = {"Retry-After": str(self.retry_after)} if status == 429 else {}
+        self.posts.append(Post(path, body, status, headers=headers))
+        return status, headers_out, text
+
+    def _fault(self) -> Optional[int]:
+        if self._forced:
+            return self._forced.popleft()
+        if self.throttle_rate and self._random.random() < self.throttle_rate:
+            return 429
+        if self.error_rate and self._random.random() < self.error_rate:
+            return 503
+        return None
+
+    def _check(
+        self, method: str, path: str, headers: dict[str, str], raw: bytes
+    ) -> tuple[Optional[dict], int, str]:
+        if method != "POST":
+            return None, 405, "Method not allowed"
+        if not path.startswith("/hooks/"):
+            return None, 404, "Not found"
+        if len(raw) > self.max_payload_bytes:
+            return None, 413, "Request body too large"
+
+        try:
+            if headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+                raw = dict(parse_qsl(raw.decode())).get("payload", "")
+            body = json.loads(raw)
+        except ValueError:
+            return None, 400, "Unable to parse incoming data"
+        if not isinstance(body, dict):
+            return None, 400, "Unable to parse incoming data"
+
+        text = body.get("text") or ""
+        if not text and not body.get("attachments"):
+            return body, 400, "Unable to parse incoming data: no text specified"
+        if len(text) > self.max_text_length:
+            return body, 400, f"Message text is longer than {self.max_text_length} characters"
+
+        if path.startswith("/hooks/commands/"):
+            now = time.monotonic()
+            first_used, uses = self._response_urls.get(path, (now, 0))
+            if now - first_used > self.response_url_ttl:
+                return body, 404, "Response URL has expired"
+            if uses >= self.response_url_uses:
+                return body, 400, f"Response URL can only be used {self.response_url_uses} times"
+            self._response_urls[path] = (first_used, uses + 1)
+        return body, 200, "ok"
@@ -0,0 +1,313 @@
+"""Pluggable request tracing: a span per webhook request, propagated into hooks, delayed-response delivery, and
+client calls.
+
+The default `Tracer()` has no exporter and records nothing -- every `span()` is the same inert object -- so tracing
+costs next to nothing until an exporter is configured.  Spans follow the current context (a `contextvars.ContextVar`),
+so they nest across `await`s and asyncio tasks; code that hands work to another thread should run it with
+`contextvars.copy_context().run` so its spans get the right parent.
+"""
+
+import contextvars
+import logging
+import random
+import threading
+import time
+import urllib.request
+from typing import Any, Optional, Sequence
+
+from matterbot import _json
+
+logger = logging.getLogger(__name__)
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "matterbot_span", default=None
+)
+
+
+def current_span() -> Optional["Span"]:
+    """The span currently being recorded in this context, if any"""
+    return _current.get()
+
+
+class Span:
+    """One timed operation in a trace.  Use it as a context manager: it becomes the current span on entry, and is
+    ended (recording any exception) and handed to its tracer's exporter on exit."""
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "error",
+        "_tracer",
+        "_reset",
+    )
+
+    recording = True
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        parent: Optional["Span"],
+        attributes: Optional[dict],
+    ) -> None:
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else random.getrandbits(128)
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = dict(attributes) if attributes else {}
+        self.error: Optional[str] = None
+        self._tracer = tracer
+        self._reset = None
+
+    @property
+    def traceparent(self) -> str:
+        """This span's context as a W3C `traceparent` header value"""
+        return f"00-{self.trace_id:032x}-{self.span_id:016x}-01"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self._tracer._finished(self)
+
+    def __enter__(self) -> "Span":
+        self._reset = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None:
+            self.record_exception(exc)
+        _current.reset(self._reset)
+        self.end()
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": f"{self.trace_id:032x}",
+            "span_id": f"{self.span_id:016x}",
+            "parent_id": f"{self.parent_id:016x}" if self.parent_id is not None else None,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """The span handed out when nothing is exported: every operation does nothing"""
+
+    __slots__ = ()
+
+    recording = False
+    traceparent = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter:
+    """Receives batches of finished spans, on the tracer's background thread"""
+
+    def export(self, spans: Sequence[Span]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class LoggingExporter(SpanExporter):
+    """Logs each finished span as a line of JSON"""
+
+    def __init__(
+        self, logger: logging.Logger = logger, level: int = logging.INFO
+    ) -> None:
+        self.logger = logger
+        self.level = level
+
+    def export(self, spans: Sequence[Span]) -> None:
+        for span in spans:
+            self.logger.log(self.level, "%s", _json.dumps(span.to_dict()).decode())
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPExporter(SpanExporter):
+    """POSTs spans as OTLP/HTTP JSON, e.g. to a local OpenTelemetry collector (or Jaeger, Tempo, ...)"""
+
+    def __init__(
+        self,
+        endpoint: str = "http://localhost:4318/v1/traces",
+        service_name: str = "matterbot",
+        headers: Optional[dict[str, str]] = None,
+        timeout: float = 10.0,
+    ) -> None:
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.timeout = timeout
+
+    def _encode(self, spans: Sequence[Span]) -> bytes:
+        encoded = []
+        for span in spans:
+            entry = {
+                "traceId": f"{span.trace_id:032x}",
+                "spanId": f"{span.span_id:016x}",
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [
+                    {"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()
+                ],
+            }
+            if span.parent_id is not None:
+                entry["parentSpanId"] = f"{span.parent_id:016x}"
+            if span.error is not None:
+                entry["status"] = {"code": 2, "message": span.error}
+            encoded.append(entry)
+        return _json.dumps(
+            {
+                "resourceSpans": [
+                    {
+                        "resource": {
+                            "attributes": [
+                                {
+                                    "key": "service.name",
+                                    "value": {"stringValue": self.service_name},
+                                }
+                            ]
+                        },
+                        "scopeSpans": [{"scope": {"name": "matterbot"}, "spans": encoded}],
+                    }
+                ]
+            }
+        )
+
+    def export(self, spans: Sequence[Span]) -> None:
+        request = urllib.request.Request(
+            self.endpoint, data=self._encode(spans), headers=self.headers, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class Tracer:
+    """Creates spans and batches finished ones off to `exporter` from a background thread, so exporting never blocks
+    a request.  At most `max_queue` finished spans are held; beyond that, spans are dropped (and counted) rather than
+    letting a slow or unreachable collector grow memory without bound.
+
+    Without an exporter, nothing is recorded.
+
+    ## Example
+
+    ```python
+    server = MatterbotServer(app, tracer=Tracer(OTLPExporter("http://localhost:4318/v1/traces")))
+    ```
+    """
+
+    def __init__(
+        self,
+        exporter: Optional[SpanExporter] = None,
+        batch_size: int = 512,
+        export_interval: float = 2.0,
+        max_queue: int = 8192,
+    ) -> None:
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.export_interval = export_interval
+        self.max_queue = max_queue
+        self._queue: list[Span] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def span(self, name: str, attributes: Optional[dict] = None):
+        """A new span, a child of the current span (if any); use it as a context manager"""
+        if self.exporter is None:
+            return _NOOP_SPAN
+        return Span(self, name, _current.get(), attributes)
+
+    def _finished(self, span: Span) -> None:
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._queue.append(span)
+            full = len(self._queue) >= self.batch_size
+            if self._thread is None and not self._stopped:
+                self._thread = threading.Thread(
+                    target=self._run, name="matterbot-tracer", daemon=True
+                )
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.export_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Export every finished span now"""
+        with self._lock:
+            spans, self._queue = self._queue, []
+        for start in range(0, len(spans), self.batch_size):
+            batch = spans[start : start + self.batch_size]
+            try:
+                self.exporter.export(batch)
+            except Exception:
+                # Only this batch is lost; the collector may take the next one
+                logger.exception("Could not export %d spans", len(batch))
+
+    def shutdown(self, timeout: Optional[float] = 5.0) -> None:
+        """Stop the export thread, flushing what's left"""
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.exporter is not None:
+            self.flush()
+            self.exporter.shutdown()
@@ -0,0 +1,78 @@
+import fastapi
+import pytest
+
+from matterbot import MatterbotServer
+
+TOKEN = "test-token"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def slash_payload():
+    """Builds a slash command webhook, as Mattermost sends it"""
+
+    def build(command: str = "/deploy", text: str = "api", n: int = 1, **fields) -> dict:
+        return {
+            "channel_id": "c" * 26,
+            "channel_name": "town-square",
+            "command": command,
+            "response_url": f"http://mattermost.test/hooks/commands/{n}",
+            "team_domain": "example",
+            "team_id": "t" * 26,
+            "text": text,
+            "token": TOKEN,
+            "trigger_id": f"trigger-{n}",
+            "user_id": "u" * 26,
+            "user_name": "tester",
+            **fields,
+        }
+
+    return build
+
+
+@pytest.fixture
+def outgoing_payload():
+    """Builds an outgoing webhook, as Mattermost sends it"""
+
+    def build(trigger_word: str = "echo", text: str = "echo hi", n: int = 1, **fields) -> dict:
+        return {
+            "channel_id": "c" * 26,
+            "channel_name": "town-square",
+            "team_domain": "example",
+            "team_id": "t" * 26,
+            "post_id": f"post-{n}",
+            "text": text,
+            "timestamp": "2024-01-01T00:00:00Z",
+            "token": TOKEN,
+            "trigger_word": trigger_word,
+            "user_id": "u" * 26,
+            "user_name": "tester",
+            **fields,
+        }
+
+    return build
+
+
+@pytest.fixture(params=["route", "dispatch"])
+def mode(request):
+    """Runs a test against a server in route mode (a path per command) and in dispatcher mode"""
+    return request.param
+
+
+@pytest.fixture
+def make_server(mode):
+    """Builds a FastAPI app and a MatterbotServer for it, in the current `mode`; returns (app, server, url), where
+    url(path) is where a command registered at `path` is served"""
+
+    def build(**options):
+        app = fastapi.FastAPI()
+        if mode == "dispatch":
+            options.setdefault("dispatch_path", "/hooks")
+        server = MatterbotServer(app, **options)
+        return app, server, lambda path: server.dispatch_path or path
+
+    return build
@@ -0,0 +1,75 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from conftest import TOKEN
+from matterbot.server import DEFAULT_BUSY_RESPONSE
+from matterbot.server.admission import AdmissionController
+
+
+def test_global_and_per_path_limits():
+    admission = AdmissionController(max_pending=3)
+    admission.limit("/a", 2)
+    assert admission.admit("/a", 2)
+    assert not admission.admit("/a")
+    assert admission.admit("/b")
+    assert not admission.admit("/b")
+    assert admission.stats()["rejected_by_path"] == {"/a": 1, "/b": 1}
+
+    admission.release("/a")
+    assert admission.admit("/a")
+    assert admission.pending_by_path == {"/a": 2, "/b": 1}
+
+
+def test_hooks_are_admitted_all_or_nothing():
+    admission = AdmissionController(max_pending=4)
+    assert admission.admit("/a", 3)
+    assert not admission.admit("/a", 2)
+    assert admission.pending == 3
+
+
+def test_refuses_work_that_would_outlive_the_window():
+    admission = AdmissionController(concurrency=2, window=9)
+    assert admission.admit("/a")
+    admission.release("/a", runtime=4.0)
+    assert admission.estimated_wait(4) == 8.0
+    assert admission.admit("/a", 4)
+    assert not admission.admit("/a", 1)
+
+
+def test_forced_admission_ignores_limits():
+    admission = AdmissionController(max_pending=1)
+    assert admission.admit("/a")
+    assert admission.admit("/a", force=True)
+    assert admission.pending == 2
+
+
+def test_busy_response_when_saturated(make_server, slash_payload, fake_mattermost):
+    release = asyncio.Event()
+
+    async def wait(request):
+        await release.wait()
+        return {"text": "done"}
+
+    app, server, url = make_server(max_pending_hooks=2)
+    server.slash_delayed_response(
+        lambda request: {"text": "started"},
+        path="/deploy",
+        token=TOKEN,
+        command="/deploy",
+        hooks=wait,
+    )()
+    server()
+    with TestClient(app) as client:
+        texts = [
+            client.post(
+                url("/deploy"),
+                data=slash_payload(n=n, response_url=fake_mattermost.response_url(str(n))),
+            ).json()["text"]
+            for n in range(3)
+        ]
+        assert server.admission.pending == 2
+        client.portal.call(release.set)
+    assert texts == ["started", "started", DEFAULT_BUSY_RESPONSE["text"]]
+    assert server.admission.rejected == 1
+    assert server.admission.pending == 0
@@ -0,0 +1,82 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from conftest import TOKEN
+
+
+def _loop_running() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def test_coroutine_handler_runs_on_event_loop(make_server, slash_payload):
+    seen = {}
+
+    async def on_loop(request):
+        seen["async"] = _loop_running()
+        return {"text": "async"}
+
+    def in_thread(request):
+        seen["sync"] = _loop_running()
+        return {"text": "sync"}
+
+    app, server, url = make_server()
+    server.slash(on_loop, path="/async", token=TOKEN, command="/async")()
+    server.slash(in_thread, path="/sync", token=TOKEN, command="/sync")()
+    server()
+    with TestClient(app) as client:
+        assert client.post(url("/async"), data=slash_payload("/async")).json()["text"] == "async"
+        assert client.post(url("/sync"), data=slash_payload("/sync")).json()["text"] == "sync"
+    assert seen == {"async": True, "sync": False}
+
+
+def test_hooks_are_delivered(make_server, slash_payload, fake_mattermost):
+    async def async_hook(request):
+        await asyncio.sleep(0)
+        return {"text": f"async {request.text}"}
+
+    def sync_hook(request):
+        return {"text": f"sync {request.text}"}
+
+    app, server, url = make_server()
+    server.slash_delayed_response(
+        lambda request: {"text": "started"},
+        path="/deploy",
+        token=TOKEN,
+        command="/deploy",
+        hooks=[async_hook, sync_hook],
+    )()
+    server()
+    response_url = fake_mattermost.response_url("1")
+    with TestClient(app) as client:
+        response = client.post(url("/deploy"), data=slash_payload(response_url=response_url))
+        assert response.json()["text"] == "started"
+    # Shutting down waits for the hooks and their deliveries
+    texts = "\n\n".join(post.body["text"] for post in fake_mattermost.received(response_url))
+    assert "async api" in texts
+    assert "sync api" in texts
+
+
+def test_failing_hook_is_logged(make_server, slash_payload, fake_mattermost, caplog):
+    async def broken(request):
+        raise RuntimeError("boom")
+
+    app, server, url = make_server()
+    server.slash_delayed_response(
+        lambda request: {"text": "started"},
+        path="/deploy",
+        token=TOKEN,
+        command="/deploy",
+        hooks=broken,
+    )()
+    server()
+    response_url = fake_mattermost.response_url("1")
+    with TestClient(app) as client:
+        client.post(url("/deploy"), data=slash_payload(response_url=response_url))
+    assert fake_mattermost.received(response_url) == []
+    assert "hook broken failed" in caplog.text
+    assert server.admission.pending == 0
@@ -0,0 +1,107 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from matterbot import AsyncMattermostClient, Incoming
+from matterbot.client.bulk import BulkSender
+from matterbot.testing import FakeMattermost
+
+pytestmark = pytest.mark.anyio
+
+
+class FlakyClient:
+    """Fails each message's first post with `error`, then accepts it, recording accepted posts in order"""
+
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+        self.failed: set[str] = set()
+        self.posts: list[tuple[str, str]] = []
+
+    async def incoming_webhook(self, hook_url: str, body):
+        await asyncio.sleep(0)
+        text = body["text"]
+        if text not in self.failed:
+            self.failed.add(text)
+            raise self.error
+        self.posts.append((hook_url, text))
+        return SimpleNamespace(status=200)
+
+
+async def test_keeps_order_within_each_channel():
+    async with FakeMattermost(latency=(0, 0.005), seed=0) as mattermost:
+        messages = [
+            (mattermost.hook_url(str(n % 3)), Incoming(text=str(n), channel=f"channel-{n % 2}"))
+            for n in range(60)
+        ]
+        async with AsyncMattermostClient() as client:
+            results = await client.send_incoming_webhooks(messages, concurrency=8)
+    assert [result.index for result in results] == list(range(60))
+    assert all(result.ok for result in results)
+    for hook in range(3):
+        for channel in range(2):
+            posts = [
+                post.body["text"]
+                for post in mattermost.received(mattermost.hook_url(str(hook)))
+                if post.body["channel"] == f"channel-{channel}"
+            ]
+            assert posts == sorted(posts, key=int)
+
+
+async def test_retries_throttling_and_server_errors():
+    async with FakeMattermost(retry_after=0) as mattermost, AsyncMattermostClient() as client:
+        mattermost.fail_next(429)
+        mattermost.fail_next(503)
+        (result,) = await client.send_incoming_webhooks(
+            [(mattermost.hook_url("a"), {"text": "hi"})], attempts=3
+        )
+    assert result.ok
+    assert result.attempts == 3
+
+
+async def test_invalid_messages_are_not_retried():
+    async with FakeMattermost() as mattermost, AsyncMattermostClient() as client:
+        messages = [
+            (mattermost.hook_url("a"), {"username": "no text"}),
+            (mattermost.hook_url("a"), {"text": "ok"}),
+        ]
+        invalid, valid = await client.send_incoming_webhooks(messages, attempts=3)
+    assert not invalid.ok
+    assert invalid.status is None
+    assert isinstance(invalid.error, ValueError)
+    assert invalid.attempts == 1
+    assert valid.ok
+
+
+@pytest.mark.parametrize("error", [ConnectionResetError(), asyncio.TimeoutError()])
+async def test_retries_connection_errors_and_timeouts(error):
+    client = FlakyClient(error)
+    sender = BulkSender(client, backoff=0.001)
+    (result,) = await sender.run([("http://mattermost.test/hooks/a", {"text": "hi"})])
+    assert result.ok
+    assert result.attempts == 2
+
+
+async def test_splits_oversized_messages():
+    async with FakeMattermost() as mattermost, AsyncMattermostClient() as client:
+        text = "\n".join(f"line {n}" for n in range(5000))
+        (result,) = await client.send_incoming_webhooks([(mattermost.hook_url("a"), {"text": text})])
+    assert result.ok
+    assert result.posts == len(mattermost.received(mattermost.hook_url("a"))) > 1
+
+
+async def test_async_source_and_rate_limit():
+    client = FlakyClient(ConnectionResetError())
+    client.failed = {str(n) for n in range(5)}
+
+    async def source():
+        for n in range(5):
+            yield "http://mattermost.test/hooks/a", {"text": str(n)}
+
+    sender = BulkSender(client, rate_limit=200, burst=1)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    results = await sender.run(source())
+    assert [result.ok for result in results] == [True] * 5
+    assert [text for _, text in client.posts] == ["0", "1", "2", "3", "4"]
+    assert loop.time() - started >= 4 / 200
@@ -0,0 +1,79 @@
+import time
+
+from fastapi.testclient import TestClient
+from starlette.responses import Response
+
+from conftest import TOKEN
+from matterbot import ResultCache
+
+
+def test_ttl_and_lru_eviction():
+    cache = ResultCache(ttl=0.05, maxsize=2)
+    cache.set(("a",), Response(b"a"))
+    cache.set(("b",), Response(b"b"))
+    assert cache.get(("a",)).body == b"a"
+    cache.set(("c",), Response(b"c"))
+    # "b" was the least recently used
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)).body == b"a"
+    time.sleep(0.06)
+    assert cache.get(("a",)) is None
+    assert cache.stats() == {"size": 1, "hits": 2, "misses": 2}
+
+
+def test_only_successful_rendered_responses_are_kept():
+    cache = ResultCache()
+    cache.set(("error",), Response(b"no", status_code=500))
+    cache.set(("raw",), {"text": "not rendered"})
+    assert len(cache) == 0
+
+
+def test_identical_requests_skip_handler_and_hooks(make_server, slash_payload, fake_mattermost):
+    calls = []
+
+    def status(request):
+        calls.append("handler")
+        return {"text": f"status of {request.text}"}
+
+    def hook(request):
+        calls.append("hook")
+        return {"text": "details"}
+
+    app, server, url = make_server()
+    server.slash_delayed_response(
+        status,
+        path="/status",
+        token=TOKEN,
+        command="/status",
+        hooks=hook,
+        cache=ResultCache(ttl=60),
+    )()
+    server()
+    with TestClient(app) as client:
+        for n, text in enumerate(["api", "api", "db"]):
+            payload = slash_payload("/status", text, n=n, response_url=fake_mattermost.response_url(str(n)))
+            assert client.post(url("/status"), data=payload).json()["text"] == f"status of {text}"
+    assert sorted(calls) == ["handler", "handler", "hook", "hook"]
+
+
+def test_cache_keyed_per_user(make_server, slash_payload):
+    calls = []
+
+    def whoami(request):
+        calls.append(request.user_id)
+        return {"text": request.user_name}
+
+    app, server, url = make_server()
+    server.slash(
+        whoami,
+        path="/whoami",
+        token=TOKEN,
+        command="/whoami",
+        cache=ResultCache(key=("command", "user_id")),
+    )()
+    server()
+    with TestClient(app) as client:
+        for n, user in enumerate(["u1", "u2", "u1"]):
+            payload = slash_payload("/whoami", n=n, user_id=user, user_name=user)
+            assert client.post(url("/whoami"), data=payload).json()["text"] == user
+    assert calls == ["u1", "u2"]
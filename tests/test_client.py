@@ -0,0 +1,55 @@
+import aiohttp
+import pytest
+
+from matterbot import AsyncMattermostClient, Incoming, MattermostClient, SlashExtra
+from matterbot.testing import FakeMattermost
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_async_client_posts_models_and_dicts():
+    async with FakeMattermost() as mattermost, AsyncMattermostClient() as client:
+        await client.incoming_webhook(hook_url=mattermost.hook_url("a"), body=Incoming(text="model"))
+        await client.incoming_webhook(hook_url=mattermost.hook_url("a"), body={"text": "dict"})
+        await client.slash_command_delayed_response(
+            response_url=mattermost.response_url("1"), body=SlashExtra(text="later")
+        )
+    assert [post.body["text"] for post in mattermost.received(mattermost.hook_url("a"))] == [
+        "model",
+        "dict",
+    ]
+    assert mattermost.received(mattermost.response_url("1"))[0].body == {"text": "later"}
+
+
+async def test_async_client_reuses_connections():
+    mattermost = FakeMattermost()
+    connections = 0
+    handle = mattermost._handle
+
+    async def counting(reader, writer):
+        nonlocal connections
+        connections += 1
+        await handle(reader, writer)
+
+    mattermost._handle = counting
+    async with mattermost:
+        async with AsyncMattermostClient(limit_per_host=1) as client:
+            for n in range(10):
+                await client.incoming_webhook(hook_url=mattermost.hook_url("a"), body={"text": str(n)})
+    assert len(mattermost.received(mattermost.hook_url("a"))) == 10
+    assert connections == 1
+
+
+async def test_async_client_raises_for_error_status():
+    async with FakeMattermost() as mattermost, AsyncMattermostClient() as client:
+        mattermost.fail_next(503)
+        with pytest.raises(aiohttp.ClientResponseError) as raised:
+            await client.incoming_webhook(hook_url=mattermost.hook_url("a"), body={"text": "x"})
+    assert raised.value.status == 503
+
+
+def test_sync_client(fake_mattermost):
+    client = MattermostClient()
+    response = client.incoming_webhook(hook_url=fake_mattermost.hook_url("a"), body=Incoming(text="hi"))
+    assert response.status_code == 200
+    assert fake_mattermost.received(fake_mattermost.hook_url("a"))[0].body == {"text": "hi"}
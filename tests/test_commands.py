@@ -0,0 +1,123 @@
+import enum
+from typing import Optional
+
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import TOKEN
+from matterbot import Commands, SlashRequest
+from matterbot.server.commands import UsageError, _Parser
+
+pytestmark = pytest.mark.anyio
+
+
+class Env(enum.Enum):
+    staging = "staging"
+    prod = "prod"
+
+
+def request(text: str) -> SlashRequest:
+    return SlashRequest(
+        channel_id="c",
+        channel_name="c",
+        command="/ops",
+        response_url="http://mattermost.test/hooks/commands/1",
+        team_domain="t",
+        team_id="t",
+        text=text,
+        token="x",
+        trigger_id="1",
+        user_id="u",
+        user_name="u",
+    )
+
+
+@pytest.fixture
+def ops() -> Commands:
+    ops = Commands()
+
+    @ops.command("deploy")
+    async def deploy(request, service: str, env: Env = Env.staging, force: bool = False, replicas: int = 1):
+        return {"service": service, "env": env, "force": force, "replicas": replicas}
+
+    @ops.command("cache clear")
+    def clear(request, names: list[str]):
+        return {"cleared": names}
+
+    @ops.command("scale")
+    def scale(request, service: str, *counts: int, note: Optional[str] = None):
+        return {"service": service, "counts": counts, "note": note}
+
+    return ops
+
+
+async def test_typed_arguments_and_options(ops):
+    assert await ops(request("deploy api --env prod --force --replicas=3")) == {
+        "service": "api",
+        "env": Env.prod,
+        "force": True,
+        "replicas": 3,
+    }
+    assert await ops(request("deploy api --no-force")) == {
+        "service": "api",
+        "env": Env.staging,
+        "force": False,
+        "replicas": 1,
+    }
+
+
+async def test_multi_word_and_variadic_sub_commands(ops):
+    assert await ops(request("cache clear users 'team roles'")) == {"cleared": ["users", "team roles"]}
+    assert await ops(request("Scale api 1 2 --note hi")) == {
+        "service": "api",
+        "counts": (1, 2),
+        "note": "hi",
+    }
+
+
+async def test_usage_errors(ops):
+    for text in ("deploy", "deploy api --env qa", "deploy api --replicas", "deploy api extra", "deploy api --nope"):
+        response = await ops(request(text))
+        assert response["response_type"] == "ephemeral"
+        assert "Usage: `deploy <service>" in response["text"]
+
+
+async def test_unknown_sub_command_shows_usage(ops):
+    response = await ops(request("restart api"))
+    assert "cache clear [names...]" in response["text"]
+    assert "deploy <service>" in response["text"]
+
+
+async def test_root_sub_command(ops):
+    @ops.command("")
+    def default(request, words: list[str]):
+        return {"default": words}
+
+    assert await ops(request("")) == {"default": []}
+    assert await ops(request("restart api")) == {"default": ["restart", "api"]}
+    assert await ops(request("cache clear x")) == {"cleared": ["x"]}
+
+
+def test_bool_flags_take_no_value():
+    def fn(request, force: bool = False):
+        pass
+
+    parser = _Parser(fn, "deploy")
+    assert parser.parse(["--force"]) == ([], {"force": True})
+    with pytest.raises(UsageError, match="doesn't take a value"):
+        parser.parse(["--force=false"])
+    with pytest.raises(UsageError, match="doesn't take a value"):
+        parser.parse(["--no-force=1"])
+
+
+def test_served_as_a_slash_command(ops, make_server, slash_payload):
+    @ops.command("ping")
+    def ping(request, times: int = 1):
+        return {"text": "pong " * times}
+
+    app, server, url = make_server()
+    server.slash(ops, path="/ops", token=TOKEN, command="/ops")()
+    server()
+    with TestClient(app) as client:
+        response = client.post(url("/ops"), data=slash_payload("/ops", "ping --times 2"))
+    assert response.json()["text"] == "pong pong "
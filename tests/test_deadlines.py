@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import matterbot.server
+from conftest import TOKEN
+from matterbot.server.deadlines import DeadlineScheduler
+
+
+def test_enforces_deadlines_on_a_new_loop():
+    scheduler = DeadlineScheduler()
+
+    async def run(seconds: float, deadline: float) -> bool:
+        loop = asyncio.get_running_loop()
+        task = asyncio.create_task(asyncio.sleep(seconds))
+        scheduler.add(task, loop.time() + deadline)
+        try:
+            await task
+        except asyncio.CancelledError:
+            return False
+        return True
+
+    # Leaves the timer armed on a loop that's then closed
+    assert asyncio.run(run(0, 0.05))
+    assert not asyncio.run(run(1, 0.1))
+    assert scheduler.expired == 1
+
+
+@pytest.mark.anyio
+async def test_cancels_only_expired_tasks():
+    scheduler = DeadlineScheduler()
+    loop = asyncio.get_running_loop()
+    slow = asyncio.create_task(asyncio.sleep(10))
+    quick = asyncio.create_task(asyncio.sleep(0.05, "done"))
+    scheduler.add(slow, loop.time() + 0.02)
+    scheduler.add(quick, loop.time() + 5)
+    assert len(scheduler) == 2
+
+    assert await quick == "done"
+    with pytest.raises(asyncio.CancelledError):
+        await slow
+    assert scheduler.expired == 1
+    assert len(scheduler) == 0
+
+
+@pytest.mark.anyio
+async def test_rearms_for_an_earlier_deadline():
+    scheduler = DeadlineScheduler()
+    loop = asyncio.get_running_loop()
+    late = asyncio.create_task(asyncio.sleep(10))
+    early = asyncio.create_task(asyncio.sleep(10))
+    scheduler.add(late, loop.time() + 5)
+    scheduler.add(early, loop.time() + 0.01)
+    await asyncio.wait([early])
+    assert early.cancelled()
+    assert not late.done()
+    late.cancel()
+
+
+@pytest.mark.anyio
+async def test_no_thread_per_task():
+    scheduler = DeadlineScheduler()
+    loop = asyncio.get_running_loop()
+    threads = threading.active_count()
+    tasks = [asyncio.create_task(asyncio.sleep(0.01)) for _ in range(1000)]
+    for task in tasks:
+        scheduler.add(task, loop.time() + 60)
+    assert threading.active_count() == threads
+    await asyncio.gather(*tasks)
+    assert len(scheduler) == 0
+
+
+def test_hook_past_its_deadline_posts_nothing(
+    monkeypatch, make_server, slash_payload, fake_mattermost, caplog
+):
+    monkeypatch.setattr(matterbot.server, "RESPONSE_URL_TTL", 0.05)
+
+    async def slow_async(request):
+        await asyncio.sleep(1)
+        return {"text": "late"}
+
+    def slow_sync(request):
+        time.sleep(0.2)
+        return {"text": "late"}
+
+    app, server, url = make_server()
+    server.slash_delayed_response(
+        lambda request: {"text": "started"},
+        path="/deploy",
+        token=TOKEN,
+        command="/deploy",
+        hooks=[slow_async, slow_sync],
+    )()
+    server()
+    response_url = fake_mattermost.response_url("1")
+    with TestClient(app) as client:
+        client.post(url("/deploy"), data=slash_payload(response_url=response_url))
+        time.sleep(0.3)
+    assert fake_mattermost.received(response_url) == []
+    assert server._deadlines.expired == 2
+    assert "passed its deadline" in caplog.text
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.responses import Response
+
+from conftest import TOKEN
+from matterbot import DedupeStore, MemoryState
+
+pytestmark = pytest.mark.anyio
+
+
+def respond(body: bytes, calls: list):
+    async def run():
+        calls.append(body)
+        await asyncio.sleep(0.01)
+        return Response(body, media_type="application/json")
+
+    return run
+
+
+async def test_retries_get_the_original_response():
+    store = DedupeStore()
+    calls = []
+    first, retry = await asyncio.gather(
+        store.run_once("trigger-1", respond(b'{"n":1}', calls)),
+        store.run_once("trigger-1", respond(b'{"n":2}', calls)),
+    )
+    later = await store.run_once("trigger-1", respond(b'{"n":3}', calls))
+    assert calls == [b'{"n":1}']
+    assert first.body == retry.body == later.body == b'{"n":1}'
+    assert store.duplicates == 2
+
+
+async def test_failures_are_forgotten():
+    store = DedupeStore()
+
+    async def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await store.run_once("trigger-1", fail)
+    calls = []
+    response = await store.run_once("trigger-1", respond(b"{}", calls))
+    assert calls == [b"{}"]
+    assert response.body == b"{}"
+
+
+async def test_nothing_to_replay_is_an_empty_response():
+    store = DedupeStore()
+
+    async def nothing():
+        return None
+
+    assert await store.run_once("trigger-1", nothing) is None
+    replayed = await store.run_once("trigger-1", nothing)
+    assert isinstance(replayed, Response)
+    assert replayed.status_code == 200
+    assert replayed.body == b""
+
+
+async def test_window_rotation():
+    store = DedupeStore(window=600, maxsize=4)
+    calls = []
+    for n in range(6):
+        await store.run_once(f"trigger-{n}", respond(b"{}", calls))
+    # At most maxsize IDs are remembered, in two generations
+    assert len(store) <= 4
+    await store.run_once("trigger-5", respond(b"{}", calls))
+    assert len(calls) == 6
+
+
+async def test_shared_across_workers():
+    state = MemoryState()
+    first, second = DedupeStore(state=state), DedupeStore(state=state)
+    calls = []
+    original, retried = await asyncio.gather(
+        first.run_once("trigger-1", respond(b'{"n":1}', calls)),
+        second.run_once("trigger-1", respond(b'{"n":2}', calls)),
+    )
+    assert calls == [b'{"n":1}']
+    assert retried.body == original.body == b'{"n":1}'
+
+
+async def test_shared_wait_times_out_with_an_empty_response():
+    state = MemoryState()
+    first, second = DedupeStore(state=state), DedupeStore(state=state, shared_wait=0.05)
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+        return Response(b"{}", media_type="application/json")
+
+    original = asyncio.create_task(first.run_once("trigger-1", slow))
+    await asyncio.sleep(0)
+    retried = await second.run_once("trigger-1", slow)
+    assert isinstance(retried, Response)
+    assert retried.body == b""
+    release.set()
+    assert (await original).body == b"{}"
+
+
+def test_retried_webhooks_run_once(make_server, slash_payload, fake_mattermost):
+    calls = []
+
+    def hook(request):
+        calls.append(request.trigger_id)
+        return {"text": "done"}
+
+    app, server, url = make_server(dedupe=DedupeStore())
+    server.slash_delayed_response(
+        lambda request: {"text": "started"},
+        path="/deploy",
+        token=TOKEN,
+        command="/deploy",
+        hooks=hook,
+    )()
+    server.slash_delayed_response(
+        lambda request: None,
+        path="/quiet",
+        token=TOKEN,
+        command="/quiet",
+        hooks=hook,
+        null_response=True,
+    )()
+    server()
+    payload = slash_payload(response_url=fake_mattermost.response_url("1"))
+    quiet = slash_payload("/quiet", n=2, response_url=fake_mattermost.response_url("2"))
+    with TestClient(app) as client:
+        assert client.post(url("/deploy"), data=payload).json()["text"] == "started"
+        assert client.post(url("/deploy"), data=payload).json()["text"] == "started"
+        assert client.post(url("/quiet"), data=quiet).status_code == 200
+        retried = client.post(url("/quiet"), data=quiet)
+        assert retried.status_code == 200
+        assert retried.content == b""
+    assert calls == ["trigger-1", "trigger-2"]
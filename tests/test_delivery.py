@@ -0,0 +1,153 @@
+import asyncio
+import random
+
+import pytest
+import requests
+
+from matterbot import Slash
+from matterbot.server.delivery import DeliveryQueue
+
+pytestmark = pytest.mark.anyio
+
+URL = "http://mattermost.test/hooks/commands/1"
+
+
+class StatusError(Exception):
+    def __init__(self, status: int) -> None:
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class Failing:
+    """A send function that always raises `exc`"""
+
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+        self.attempts = 0
+
+    async def __call__(self, response_url: str, body: dict) -> int:
+        self.attempts += 1
+        raise self.exc
+
+
+class Recorder:
+    """A send function that records each post, failing with the statuses queued in `fail`"""
+
+    def __init__(self, *fail: int) -> None:
+        self.fail = list(fail)
+        self.posts: list[tuple[str, dict]] = []
+        self.attempts = 0
+
+    async def __call__(self, response_url: str, body: dict) -> int:
+        self.attempts += 1
+        if self.fail:
+            raise StatusError(self.fail.pop(0))
+        self.posts.append((response_url, body))
+        return 200
+
+
+def deadline(seconds: float = 60) -> float:
+    return asyncio.get_running_loop().time() + seconds
+
+
+async def test_coalesces_results_that_finish_together():
+    send = Recorder()
+    queue = DeliveryQueue(send, coalesce_window=0.01)
+    queue.submit(URL, {"text": "one"}, deadline())
+    queue.submit(URL, {"text": "two"}, deadline())
+    queue.submit(URL, {"attachments": [{"fallback": "three", "text": "three"}]}, deadline())
+    await queue.drain(1)
+    assert send.posts == [
+        (URL, {"text": "one\n\ntwo"}),
+        (URL, {"attachments": [{"fallback": "three", "text": "three"}]}),
+    ]
+    assert queue.coalesced == 1
+
+
+async def test_retries_server_errors_and_throttling():
+    send = Recorder(503, 429)
+    queue = DeliveryQueue(send, coalesce_window=0, backoff=0.001)
+    queue.submit(URL, {"text": "hi"}, deadline())
+    await queue.drain(1)
+    assert send.posts == [(URL, {"text": "hi"})]
+    assert queue.retried == 2
+
+
+async def test_does_not_retry_client_errors():
+    send = Recorder(400)
+    queue = DeliveryQueue(send, coalesce_window=0, backoff=0.001)
+    queue.submit(URL, {"text": "hi"}, deadline())
+    await queue.drain(1)
+    assert send.attempts == 1
+    assert queue.failed == 1
+
+
+async def test_gives_up_after_attempts():
+    send = Recorder(503, 503, 503)
+    queue = DeliveryQueue(send, coalesce_window=0, attempts=3, backoff=0.001)
+    queue.submit(URL, {"text": "hi"}, deadline())
+    await queue.drain(1)
+    assert send.attempts == 3
+    assert send.posts == []
+
+
+async def test_respects_the_response_url_use_limit():
+    send = Recorder()
+    queue = DeliveryQueue(send, coalesce_window=0, max_uses=2)
+    for n in range(4):
+        queue.submit(URL, {"text": str(n), "username": f"bot{n}"}, deadline())
+        await asyncio.sleep(0.01)
+    await queue.drain(1)
+    assert [body["text"] for _, body in send.posts] == ["0", "1"]
+    assert queue.dropped == 2
+    assert queue.remaining(URL) == 0
+
+
+async def test_drops_invalid_results():
+    send = Recorder()
+    queue = DeliveryQueue(send, coalesce_window=0)
+    queue.submit(URL, {"text": "hi", "icon_url": "not a url"}, deadline())
+    await queue.drain(1)
+    assert send.posts == []
+    assert queue.failed == 1
+
+
+async def test_keeps_results_in_order_while_retrying(monkeypatch):
+    monkeypatch.setattr(random, "uniform", lambda low, high: high)
+    send = Recorder(503)
+    queue = DeliveryQueue(send, coalesce_window=0, backoff=0.05, max_backoff=0.05)
+    queue.submit(URL, {"text": "step 1"}, deadline())
+    await asyncio.sleep(0.01)
+    # Submitted while step 1 is waiting to be retried
+    queue.submit(URL, {"text": "step 2", "username": "a"}, deadline())
+    await asyncio.sleep(0.01)
+    queue.submit(URL, {"text": "step 3", "username": "b"}, deadline())
+    await queue.drain(1)
+    assert [body["text"] for _, body in send.posts] == ["step 1", "step 2", "step 3"]
+
+
+async def test_accepts_models():
+    send = Recorder()
+    queue = DeliveryQueue(send, coalesce_window=0)
+    queue.submit(URL, Slash(text="hi"), deadline())
+    await queue.drain(1)
+    assert [body["text"] for _, body in send.posts] == ["hi"]
+
+
+@pytest.mark.parametrize(
+    "exc, attempts",
+    [
+        (ConnectionResetError(), 3),
+        (asyncio.TimeoutError(), 3),
+        (requests.exceptions.ConnectionError(), 3),
+        (requests.exceptions.MissingSchema(), 1),
+        (requests.exceptions.InvalidURL(), 1),
+        (TypeError("a bug"), 1),
+    ],
+)
+async def test_retries_only_transient_errors_without_a_status(exc, attempts):
+    send = Failing(exc)
+    queue = DeliveryQueue(send, coalesce_window=0, attempts=3, backoff=0.001)
+    queue.submit(URL, {"text": "hi"}, deadline())
+    await queue.drain(1)
+    assert send.attempts == attempts
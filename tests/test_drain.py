@@ -0,0 +1,67 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from conftest import TOKEN
+from matterbot.server import DEFAULT_BUSY_RESPONSE
+
+
+async def quick(request):
+    return {"text": f"quick {request.text}"}
+
+
+async def brief(request):
+    await asyncio.sleep(0.1)
+    return {"text": "brief"}
+
+
+async def slow(request):
+    await asyncio.sleep(10)
+    return {"text": "too late"}
+
+
+def test_drain_reports_finished_and_abandoned_hooks(make_server, slash_payload, fake_mattermost):
+    app, server, url = make_server()
+    server.slash_delayed_response(
+        lambda request: None, path="/brief", token=TOKEN, command="/brief", hooks=[brief], null_response=True
+    )()
+    server.slash_delayed_response(
+        lambda request: None, path="/slow", token=TOKEN, command="/slow", hooks=[slow], null_response=True
+    )()
+    server()
+    with TestClient(app) as client:
+        client.post(url("/brief"), data=slash_payload("/brief", response_url=fake_mattermost.response_url("1")))
+        client.post(url("/slow"), data=slash_payload("/slow", response_url=fake_mattermost.response_url("2")))
+        report = client.portal.call(server.drain, 0.5)
+        assert report["hooks_finished"] == 1
+        assert report["hooks_abandoned"] == ["hook slow"]
+        assert report["deliveries_sent"] == 1
+        assert report["deliveries_abandoned"] == 0
+
+        # Hooks are refused while draining
+        response = client.post(url("/brief"), data=slash_payload("/brief", n=3))
+        assert response.json()["text"] == DEFAULT_BUSY_RESPONSE["text"]
+    assert server.admission.pending == 0
+
+
+def test_hooks_run_when_the_app_is_started_again(make_server, slash_payload, fake_mattermost):
+    def in_thread(request):
+        return {"text": f"thread {request.text}"}
+
+    app, server, url = make_server()
+    server.slash_delayed_response(
+        lambda request: None,
+        path="/deploy",
+        token=TOKEN,
+        command="/deploy",
+        hooks=[quick, in_thread],
+        null_response=True,
+    )()
+    server()
+    for n in ("1", "2"):
+        response_url = fake_mattermost.response_url(n)
+        with TestClient(app) as client:
+            client.post(url("/deploy"), data=slash_payload(response_url=response_url))
+        [post] = fake_mattermost.received(response_url)
+        assert sorted(post.body["text"].split("\n\n")) == ["quick api", "thread api"]
+    assert server.delivery.coalesce_window > 0
@@ -0,0 +1,45 @@
+import subprocess
+import sys
+
+import pytest
+
+import matterbot
+import matterbot.models
+
+
+def run(code: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+def test_client_alone_does_not_import_the_server():
+    loaded = run(
+        "import sys, matterbot; matterbot.MattermostClient; matterbot.Incoming;"
+        " print(sorted(m for m in ('fastapi', 'starlette', 'matterbot.server') if m in sys.modules))"
+    )
+    assert loaded == "[]"
+
+
+def test_models_are_imported_on_first_use():
+    loaded = run(
+        "import sys, matterbot.models; matterbot.models.Incoming;"
+        " print(sorted(m for m in ('matterbot.models.slash', 'matterbot.models.outgoing') if m in sys.modules))"
+    )
+    assert loaded == "[]"
+
+
+@pytest.mark.parametrize("package", [matterbot, matterbot.models])
+def test_every_export_resolves(package):
+    for name in package.__all__:
+        assert getattr(package, name) is not None, name
+    assert set(package._EXPORTS) == set(package.__all__)
+
+
+def test_dir_lists_exports():
+    assert set(matterbot.__all__) <= set(dir(matterbot))
+
+
+def test_unknown_attribute():
+    with pytest.raises(AttributeError, match="Nothing"):
+        matterbot.Nothing
@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import TOKEN
+from matterbot.server import JobStore
+
+# The job store the hook below looks at, and the jobs on disk as it saw them while it was running
+stores: list = []
+seen: list = []
+
+
+def remember_jobs(request):
+    stores[0].flush()
+    seen.extend(payload for _, _, _, payload in stores[0].pending())
+    return {"text": f"done {request.text}"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"), commit_interval=0.001)
+    yield store
+    store.close()
+
+
+def test_add_remove_and_pending(store):
+    first = store.add("hook", {"n": 1}, time.time() + 60)
+    second = store.add("result", {"n": 2}, time.time() + 120)
+    store.flush()
+    assert [(job, kind, payload) for job, kind, _, payload in store.pending()] == [
+        (first, "hook", {"n": 1}),
+        (second, "result", {"n": 2}),
+    ]
+    store.remove(first)
+    store.flush()
+    assert [job for job, *_ in store.pending()] == [second]
+
+
+def test_expired_jobs_are_forgotten(store):
+    store.add("hook", {}, time.time() - 1)
+    store.flush()
+    assert store.pending() == []
+
+
+def test_jobs_removed_before_commit_are_never_written(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"), commit_interval=10)
+    store.remove(store.add("hook", {}, time.time() + 60))
+    store.close()
+    assert store.skipped == 1
+    assert store.pending() == []
+
+
+def owned_by(path: str, owner: str) -> None:
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.execute("UPDATE jobs SET owner = ?", (owner,))
+    connection.close()
+
+
+def test_jobs_of_exited_workers_are_claimed_once(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    first, second = JobStore(path), JobStore(path)
+    job = first.add("hook", {"n": 1}, time.time() + 60)
+    first.close()
+    # A PID no live process has
+    owned_by(path, "999999999")
+    assert [claimed for claimed, *_ in second.claim()] == [job]
+    second.close()
+    # Another worker starting up now finds it taken by this (live) one
+    claimed = subprocess.run(
+        [sys.executable, "-c", f"from matterbot.server import JobStore; print(len(JobStore({path!r}).claim()))"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert claimed.strip() == "0"
+
+
+def test_jobs_of_live_workers_are_left_alone(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store = JobStore(path)
+    store.add("hook", {"n": 1}, time.time() + 60)
+    store.close()
+    # Still running in another live worker
+    owned_by(path, str(os.getppid()))
+    assert store.claim() == []
+    assert len(store.pending()) == 1
+
+
+def test_tokens_are_not_persisted(make_server, slash_payload, fake_mattermost, store):
+    stores[:] = [store]
+    seen.clear()
+    app, server, url = make_server(jobs=store)
+    server.slash_delayed_response(
+        lambda request: None,
+        path="/deploy",
+        token=TOKEN,
+        command="/deploy",
+        hooks=[remember_jobs],
+        null_response=True,
+    )()
+    server()
+    with TestClient(app) as client:
+        client.post(url("/deploy"), data=slash_payload(response_url=fake_mattermost.response_url("1")))
+    [payload] = seen
+    assert payload["request"]["text"] == "api"
+    assert "token" not in payload["request"]
+    store.flush()
+    assert store.pending() == []
+
+
+def test_resumes_unfinished_hooks(make_server, slash_payload, fake_mattermost, store):
+    response_url = fake_mattermost.response_url("1")
+    request = {k: v for k, v in slash_payload(response_url=response_url).items() if k != "token"}
+    hook = f"{remember_jobs.__module__}.{remember_jobs.__qualname__}"
+    store.add("hook", {"path": "/deploy", "hook": hook, "request": request}, time.time() + 60)
+    store.flush()
+    stores[:] = [store]
+
+    app, server, url = make_server(jobs=store)
+    server.slash_delayed_response(
+        lambda request: None, path="/deploy", token=TOKEN, command="/deploy", hooks=[remember_jobs]
+    )()
+    server()
+    with TestClient(app):
+        pass
+    assert [post.body["text"] for post in fake_mattermost.received(response_url)] == ["done api"]
+    store.flush()
+    assert store.pending() == []
+
+
+def test_rejects_hooks_that_cant_be_resumed(make_server, store):
+    def closure(request):
+        return None
+
+    app, server, url = make_server(jobs=store)
+    for hook in (lambda request: None, closure):
+        with pytest.raises(ValueError, match="top level"):
+            server.slash_delayed_response(
+                lambda request: None, path="/deploy", token=TOKEN, hooks=[hook]
+            )
+
+
+def test_lambda_hooks_are_fine_without_a_job_store(make_server):
+    app, server, url = make_server()
+    server.slash_delayed_response(
+        lambda request: None, path="/deploy", token=TOKEN, hooks=[lambda request: None]
+    )
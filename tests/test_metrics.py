@@ -0,0 +1,77 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+from conftest import TOKEN
+from matterbot import Metrics
+from matterbot.server.metrics import Histogram
+
+
+def test_histogram_sums_shards_across_threads():
+    histogram = Histogram("latency_seconds", "Latency.", ("path",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "/a")
+    worker = threading.Thread(target=histogram.observe, args=(0.5, "/a"))
+    worker.start()
+    worker.join()
+    histogram.observe(5.0, "/a")
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{path="/a",le="0.1"} 1',
+        'latency_seconds_bucket{path="/a",le="1"} 2',
+        'latency_seconds_bucket{path="/a",le="+Inf"} 3',
+        'latency_seconds_sum{path="/a"} 5.55',
+        'latency_seconds_count{path="/a"} 3',
+    ]
+
+
+def test_gauges_are_read_when_scraped():
+    metrics = Metrics()
+    value = {"n": 1}
+    metrics.gauge("things", "Things.", lambda: value["n"])
+    value["n"] = 7
+    assert "things 7\n" in metrics.render()
+
+
+def test_metrics_endpoint(make_server, slash_payload, fake_mattermost):
+    app, server, url = make_server(metrics=True)
+    server.slash_delayed_response(
+        lambda request: {"text": "started"},
+        path="/deploy",
+        token=TOKEN,
+        command="/deploy",
+        hooks=lambda request: {"text": "done"},
+    )()
+    server()
+    with TestClient(app) as client:
+        client.post(url("/deploy"), data=slash_payload(response_url=fake_mattermost.response_url("1")))
+    # Scraped after shutdown, so the hook and its delivery are done
+    with TestClient(app) as client:
+        response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert f'matterbot_request_seconds_count{{path="{url("/deploy")}",status="200"}} 1' in text
+    for phase in ("parse", "token", "handler", "serialize"):
+        assert f'matterbot_request_phase_seconds_count{{path="/deploy",phase="{phase}"}} 1' in text
+    assert 'matterbot_hook_seconds_count{path="/deploy"} 1' in text
+    assert 'matterbot_hook_wait_seconds_count{path="/deploy"} 1' in text
+    assert 'matterbot_delivery_seconds_count{status="200"} 1' in text
+    assert "matterbot_executor_utilization 0" in text
+
+
+def test_requests_are_labelled_by_route(make_server):
+    app, server, url = make_server(metrics=True)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        return {"id": item_id}
+
+    server()
+    with TestClient(app) as client:
+        for item_id in range(3):
+            client.get(f"/items/{item_id}")
+        client.get("/unknown")
+        text = client.get("/metrics").text
+    assert 'matterbot_request_seconds_count{path="/items/{item_id}",status="200"} 3' in text
+    assert 'matterbot_request_seconds_count{path="other",status="404"} 1' in text
+    assert "/items/0" not in text
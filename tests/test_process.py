@@ -0,0 +1,77 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import TOKEN
+from matterbot.server.process import check_picklable, default_pool
+
+
+def in_worker(request):
+    """A hook importable by the pool's spawned workers"""
+    return {"text": f"{request.text} from {os.getpid()}"}
+
+
+def test_check_picklable():
+    check_picklable(in_worker)
+    with pytest.raises(ValueError, match="picklable"):
+        check_picklable(lambda request: None)
+
+
+def test_rejects_unpicklable_hooks(make_server):
+    app, server, url = make_server()
+    with pytest.raises(ValueError):
+        server.slash_delayed_response(
+            lambda request: None,
+            path="/deploy",
+            token=TOKEN,
+            hooks=[lambda request: {"text": "hi"}],
+            hook_executor="process",
+        )
+
+
+def test_unknown_hook_executor(make_server):
+    app, server, url = make_server()
+    with pytest.raises(ValueError, match="hook_executor"):
+        server.slash_delayed_response(
+            lambda request: None, path="/deploy", token=TOKEN, hook_executor="fiber"
+        )
+
+
+def test_process_hooks_run_in_another_process(make_server, slash_payload, fake_mattermost):
+    app, server, url = make_server(process_pool=default_pool(1))
+    server.slash_delayed_response(
+        lambda request: {"text": "started"},
+        path="/deploy",
+        token=TOKEN,
+        command="/deploy",
+        hooks=[in_worker],
+        hook_executor="process",
+    )()
+    server()
+    response_url = fake_mattermost.response_url("1")
+    with TestClient(app) as client:
+        client.post(url("/deploy"), data=slash_payload(response_url=response_url))
+    [post] = fake_mattermost.received(response_url)
+    text, pid = post.body["text"].rsplit(" from ", 1)
+    assert text == "api"
+    assert int(pid) != os.getpid()
+
+
+def test_loop_hooks(make_server, slash_payload, fake_mattermost):
+    app, server, url = make_server()
+    server.slash_delayed_response(
+        lambda request: {"text": "started"},
+        path="/deploy",
+        token=TOKEN,
+        command="/deploy",
+        hooks=[lambda request: {"text": f"{request.text} on the loop"}],
+        hook_executor="loop",
+    )()
+    server()
+    response_url = fake_mattermost.response_url("1")
+    with TestClient(app) as client:
+        client.post(url("/deploy"), data=slash_payload(response_url=response_url))
+    assert [post.body["text"] for post in fake_mattermost.received(response_url)] == [
+        "api on the loop"
+    ]
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from conftest import TOKEN
+from matterbot import DedupeStore, MemoryState, RateLimiter
+from matterbot.server import DEFAULT_SLOW_DOWN_RESPONSE
+
+
+def user(user_id: str, channel_id: str = "c") -> SimpleNamespace:
+    return SimpleNamespace(user_id=user_id, channel_id=channel_id, team_id="t")
+
+
+def test_limit_per_key():
+    limiter = RateLimiter(limit=2, period=60)
+    assert limiter.allow(user("a"))
+    assert limiter.allow(user("a"))
+    assert not limiter.allow(user("a"))
+    assert limiter.allow(user("b"))
+    assert limiter.stats() == {"tracked": 2, "limited": 1}
+
+
+def test_burst_and_refill():
+    limiter = RateLimiter(limit=100, period=1, burst=1, key="channel_id")
+    assert limiter.allow(user("a", "c1"))
+    assert not limiter.allow(user("b", "c1"))
+    assert limiter.allow(user("a", "c2"))
+    limiter._full_at["c1"] -= 1
+    assert limiter.allow(user("a", "c1"))
+
+
+def test_refilled_buckets_are_pruned():
+    limiter = RateLimiter(limit=1000, period=0.001)
+    for n in range(2000):
+        limiter.allow(user(str(n)))
+    assert len(limiter) < 2000
+
+
+def test_shared_buckets():
+    state = MemoryState()
+    first = RateLimiter(limit=1, state=state, namespace="/deploy")
+    second = RateLimiter(limit=1, state=state, namespace="/deploy")
+    assert first.allow(user("a"))
+    assert not second.allow(user("a"))
+    assert second.limited == 1
+
+
+def test_slow_down_response(make_server, slash_payload, outgoing_payload):
+    calls = []
+
+    def deploy(request):
+        calls.append(request.trigger_id)
+        return {"text": "deploying"}
+
+    app, server, url = make_server()
+    server.slash(
+        deploy, path="/deploy", token=TOKEN, command="/deploy", rate_limit=RateLimiter(limit=1)
+    )()
+    server.outgoing(
+        lambda request: {"text": "echo", "props": None},
+        path="/echo",
+        trigger_words=["echo"],
+        rate_limit=RateLimiter(limit=1),
+    )()
+    server()
+    with TestClient(app) as client:
+        assert client.post(url("/deploy"), data=slash_payload(n=1)).json()["text"] == "deploying"
+        limited = client.post(url("/deploy"), data=slash_payload(n=2)).json()
+        assert limited == DEFAULT_SLOW_DOWN_RESPONSE
+        assert client.post(url("/echo"), data=outgoing_payload(n=1)).json()["text"] == "echo"
+        assert client.post(url("/echo"), data=outgoing_payload(n=2)).content == b""
+    assert calls == ["trigger-1"]
+
+
+def test_retries_are_not_charged(make_server, slash_payload):
+    app, server, url = make_server(dedupe=DedupeStore())
+    server.slash(
+        lambda request: {"text": f"deploying {request.trigger_id}"},
+        path="/deploy",
+        token=TOKEN,
+        command="/deploy",
+        rate_limit=RateLimiter(limit=1),
+    )()
+    server()
+    with TestClient(app) as client:
+        first = client.post(url("/deploy"), data=slash_payload(n=1)).json()
+        # The limit is used up, but a retry still gets the original response
+        retried = client.post(url("/deploy"), data=slash_payload(n=1)).json()
+        limited = client.post(url("/deploy"), data=slash_payload(n=2)).json()
+    assert first["text"] == retried["text"] == "deploying trigger-1"
+    assert limited == DEFAULT_SLOW_DOWN_RESPONSE
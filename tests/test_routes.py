@@ -0,0 +1,109 @@
+import fastapi
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import TOKEN
+from matterbot import MatterbotServer
+
+
+def echo(request):
+    return {"text": request.text, "response_type": "in_channel"}
+
+
+def echo_outgoing(request):
+    return {"text": request.text, "props": None}
+
+
+@pytest.mark.parametrize("encoding", ["data", "json"])
+def test_slash(make_server, slash_payload, encoding):
+    app, server, url = make_server()
+    server.slash(echo, path="/echo", token=TOKEN, command="/echo")()
+    server()
+    with TestClient(app) as client:
+        response = client.post(url("/echo"), **{encoding: slash_payload("/echo", "hi")})
+    assert response.status_code == 200
+    assert response.json()["text"] == "hi"
+    assert response.json()["response_type"] == "in_channel"
+
+
+def test_slash_over_get(make_server, slash_payload):
+    app, server, url = make_server()
+    server.slash(echo, path="/echo", token=TOKEN, command="/echo", method="GET")()
+    server()
+    with TestClient(app) as client:
+        response = client.get(url("/echo"), params=slash_payload("/echo", "hi"))
+        assert response.status_code == 200
+        assert response.json()["text"] == "hi"
+        response = client.get(url("/echo"), params=slash_payload("/echo", token="wrong"))
+        assert response.status_code == 401
+
+
+def test_slash_rejects_bad_token(make_server, slash_payload):
+    app, server, url = make_server()
+    server.slash(echo, path="/echo", token=TOKEN, command="/echo")()
+    server()
+    with TestClient(app) as client:
+        response = client.post(url("/echo"), data=slash_payload("/echo", token="wrong"))
+    assert response.status_code == 401
+
+
+def test_slash_rejects_invalid_request(make_server, slash_payload):
+    app, server, url = make_server()
+    server.slash(echo, path="/echo", token=TOKEN, command="/echo")()
+    server()
+    payload = slash_payload("/echo")
+    del payload["user_id"]
+    with TestClient(app) as client:
+        response = client.post(url("/echo"), data=payload)
+    assert response.status_code == 422
+
+
+def test_outgoing(make_server, outgoing_payload):
+    app, server, url = make_server()
+    server.outgoing(echo_outgoing, path="/echo", trigger_words=["echo"])()
+    server()
+    with TestClient(app) as client:
+        response = client.post(url("/echo"), data=outgoing_payload("echo", "echo hi"))
+    assert response.status_code == 200
+    assert response.json()["text"] == "echo hi"
+
+
+def test_route_named_after_callable():
+    app = fastapi.FastAPI()
+    server = MatterbotServer(app)
+    server.slash(echo, path="/echo", token=TOKEN)()
+    server()
+    assert [route.name for route in server.router.routes] == ["echo"]
+
+
+def test_dispatch_unknown_command(slash_payload):
+    app = fastapi.FastAPI()
+    server = MatterbotServer(app, dispatch_path="/hooks")
+    server.slash(echo, path="/echo", token=TOKEN, command="/echo")()
+    server()
+    with TestClient(app) as client:
+        response = client.post("/hooks", data=slash_payload("/nope"))
+    assert response.status_code == 404
+
+
+def test_dispatch_routes_on_command_and_trigger_word(slash_payload, outgoing_payload):
+    app = fastapi.FastAPI()
+    server = MatterbotServer(app, dispatch_path="/hooks")
+    for n in range(200):
+        server.slash(
+            lambda request, n=n: {"text": f"command {n}"},
+            path=f"/c{n}",
+            token=f"token-{n}",
+            command=f"/c{n}",
+        )()
+    server.outgoing(echo_outgoing, path="/echo", trigger_words=["echo", "say"])()
+    server()
+    assert [route.path for route in server.router.routes] == ["/hooks"]
+    with TestClient(app) as client:
+        response = client.post("/hooks", data=slash_payload("/c123", token="token-123"))
+        assert response.json()["text"] == "command 123"
+        # Each command keeps its own token
+        response = client.post("/hooks", data=slash_payload("/c123", token="token-124"))
+        assert response.status_code == 401
+        response = client.post("/hooks", data=outgoing_payload("say", "say hi"))
+        assert response.json()["text"] == "say hi"
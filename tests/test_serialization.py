@@ -0,0 +1,67 @@
+import json
+
+import pydantic
+import pytest
+from fastapi.testclient import TestClient
+from starlette.responses import Response
+
+from conftest import TOKEN
+from matterbot import MattermostClient, Slash
+from matterbot.server.serialization import OUTGOING_ADAPTER, SLASH_ADAPTER, render
+
+
+def test_validates_untrusted_results():
+    response = render({"text": "hi", "response_type": "in_channel"}, SLASH_ADAPTER, exclude_none=True)
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == {"text": "hi", "response_type": "in_channel"}
+    with pytest.raises(pydantic.ValidationError):
+        render({"text": "hi", "icon_url": "not a url"}, SLASH_ADAPTER)
+
+
+def test_trusted_results_skip_validation():
+    response = render({"text": "hi", "icon_url": "not a url"}, SLASH_ADAPTER, trusted=True)
+    assert json.loads(response.body) == {"text": "hi", "icon_url": "not a url"}
+    response = render(Slash(text="model"), SLASH_ADAPTER, trusted=True, exclude_none=True)
+    assert json.loads(response.body) == {"text": "model"}
+
+
+def test_passes_responses_and_bytes_through():
+    original = Response(b"raw", media_type="text/plain")
+    assert render(original, SLASH_ADAPTER) is original
+    response = render(b'{"text":"bytes"}', OUTGOING_ADAPTER, status_code=202)
+    assert response.body == b'{"text":"bytes"}'
+    assert response.status_code == 202
+
+
+def test_trusted_command(make_server, slash_payload):
+    app, server, url = make_server()
+    server.slash(
+        lambda request: {"text": request.text, "icon_url": "not a url"},
+        path="/fast",
+        token=TOKEN,
+        command="/fast",
+        trusted=True,
+    )()
+    server.slash(
+        lambda request: {"text": request.text, "icon_url": "not a url"},
+        path="/checked",
+        token=TOKEN,
+        command="/checked",
+    )()
+    server()
+    with TestClient(app, raise_server_exceptions=False) as client:
+        response = client.post(url("/fast"), data=slash_payload("/fast", "hi"))
+        assert response.json() == {"text": "hi", "icon_url": "not a url"}
+        response = client.post(url("/checked"), data=slash_payload("/checked", "hi"))
+        assert response.status_code == 500
+
+
+def test_client_sends_bytes_as_they_are(fake_mattermost):
+    client = MattermostClient()
+    url = fake_mattermost.hook_url("a")
+    client.incoming_webhook(hook_url=url, body=b'{"text":"raw","unknown":1}')
+    client.incoming_webhook(hook_url=url, body={"text": "dict"})
+    assert [post.body for post in fake_mattermost.received(url)] == [
+        {"text": "raw", "unknown": 1},
+        {"text": "dict"},
+    ]
@@ -0,0 +1,54 @@
+import json
+
+from matterbot.models.splitting import split_post, split_slash, split_text
+from matterbot.server.serialization import SLASH_ADAPTER, render
+
+
+def test_split_text_at_line_boundaries():
+    text = "".join(f"line {i}\n" for i in range(100))
+    chunks = split_text(text, 50)
+    assert "\n".join(chunks) == text.rstrip("\n")
+    assert all(len(chunk) <= 50 and not chunk.endswith("\n") for chunk in chunks)
+
+
+def test_split_text_short_is_untouched():
+    assert split_text("hi", 50) == ["hi"]
+
+
+def test_split_post_keeps_presentation():
+    body = {"text": "a\n" * 40, "username": "bot", "props": {"x": 1}}
+    posts = split_post(body, message_limit=20)
+    assert len(posts) > 1
+    assert "\n".join(post["text"] for post in posts) == body["text"].rstrip("\n")
+    assert posts[0]["props"] == {"x": 1}
+    assert all(post["username"] == "bot" for post in posts)
+    assert all("props" not in post for post in posts[1:])
+
+
+def test_split_post_attachments():
+    attachments = [{"fallback": str(i), "text": "x" * 100} for i in range(10)]
+    posts = split_post({"attachments": attachments}, attachments_limit=300)
+    assert len(posts) > 1
+    assert [a for post in posts for a in post["attachments"]] == attachments
+
+
+def test_split_post_whitespace_only():
+    body = {"text": " \n" * 10000, "username": "bot"}
+    assert split_post(body, message_limit=100) == [{"text": "", "username": "bot"}]
+
+
+def test_split_slash_overflow_goes_to_extra_responses():
+    body = {"text": "a\n" * 40, "extra_responses": [{"text": "extra"}]}
+    result = split_slash(body, message_limit=20)
+    parts = [result, *result["extra_responses"][:-1]]
+    assert "\n".join(part["text"] for part in parts) == body["text"].rstrip("\n")
+    assert result["extra_responses"][-1] == {"text": "extra"}
+
+
+def test_split_slash_within_limits():
+    assert split_slash({"text": "hi"}) is None
+
+
+def test_render_whitespace_only():
+    response = render({"text": " \n" * 10000}, SLASH_ADAPTER, split=True)
+    assert json.loads(response.body)["text"] == ""
@@ -0,0 +1,155 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import TOKEN
+from matterbot import DedupeStore, RateLimiter, ResultCache
+from matterbot.server.admission import AdmissionController
+from matterbot.server.state import MemoryState, SQLiteState, dump_response, load_response
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state(request, tmp_path):
+    state = MemoryState() if request.param == "memory" else SQLiteState(str(tmp_path / "state.db"))
+    yield state
+    state.close()
+
+
+def test_get_set_delete(state):
+    assert state.get("k") is None
+    state.set("k", b"v")
+    assert state.get("k") == b"v"
+    state.delete("k")
+    assert state.get("k") is None
+
+
+def test_add_only_sets_missing_keys(state):
+    assert state.add("k", b"first")
+    assert not state.add("k", b"second")
+    assert state.get("k") == b"first"
+
+
+def test_update(state):
+    assert state.update("n", lambda value: (b"1", value)) is None
+    assert state.update("n", lambda value: (b"%d" % (int(value) + 1), "done")) == "done"
+    assert state.get("n") == b"2"
+    state.update("n", lambda value: (None, None))
+    assert state.get("n") is None
+
+
+def test_values_expire(state):
+    state.set("k", b"v", ttl=0.01)
+    time.sleep(0.02)
+    assert state.get("k") is None
+    assert state.add("k", b"again")
+
+
+def test_sqlite_state_is_shared_between_instances(tmp_path):
+    first = SQLiteState(str(tmp_path / "state.db"))
+    second = SQLiteState(str(tmp_path / "state.db"))
+    first.set("k", b"v")
+    assert second.get("k") == b"v"
+
+
+def test_dump_and_load_response():
+    value = dump_response(b'{"text":"hi"}', 201, "application/json")
+    assert load_response(value) == (b'{"text":"hi"}', 201, "application/json")
+    assert load_response(dump_response(b"")) == (b"", 200, None)
+
+
+class CountingState(MemoryState):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = 0
+
+    def update(self, key, fn, ttl=None):
+        self.calls += 1
+        return super().update(key, fn, ttl)
+
+
+def test_admission_is_shared_after_a_sync():
+    state = CountingState()
+    mine = AdmissionController(max_pending=3, state=state)
+    # Another live worker on the host
+    theirs = AdmissionController(max_pending=3, state=state)
+    theirs._pid = str(os.getppid())
+
+    assert theirs.admit("/a", 2)
+    assert state.calls == 0
+    theirs.sync(dict(theirs.pending_by_path))
+    mine.sync(dict(mine.pending_by_path))
+    assert mine.admit("/a")
+    assert not mine.admit("/a")
+
+    theirs.release("/a")
+    theirs.release("/a")
+    theirs.sync(dict(theirs.pending_by_path))
+    mine.sync(dict(mine.pending_by_path))
+    assert mine.admit("/a")
+
+
+def test_admission_forgets_exited_workers():
+    state = MemoryState()
+    admission = AdmissionController(max_pending=1, state=state)
+    # A PID no live process has
+    state.set("admission:pending", b'{"999999999": {"/a": 5}}')
+    admission.sync({})
+    assert admission.admit("/a")
+    admission.sync(dict(admission.pending_by_path))
+    assert state.get("admission:pending") == b'{"%d":{"/a":1}}' % os.getpid()
+
+
+def test_server_shares_admission_while_running(make_server, slash_payload, fake_mattermost):
+    state = CountingState()
+    app, server, url = make_server(state=state)
+    server.admission.sync_interval = 0.01
+    server.slash_delayed_response(
+        lambda request: None,
+        path="/deploy",
+        token=TOKEN,
+        command="/deploy",
+        hooks=[lambda request: time.sleep(0.05) or {"text": "done"}],
+        null_response=True,
+    )()
+    server()
+    with TestClient(app) as client:
+        client.post(url("/deploy"), data=slash_payload(response_url=fake_mattermost.response_url("1")))
+        time.sleep(0.03)
+        assert state.get("admission:pending") == b'{"%d":{"/deploy":1}}' % os.getpid()
+    assert state.get("admission:pending") is None
+
+
+def test_locked_state_does_not_hold_up_the_event_loop(make_server, slash_payload, tmp_path):
+    path = str(tmp_path / "state.db")
+    app, server, url = make_server(state=SQLiteState(path, timeout=5), dedupe=DedupeStore())
+    server.slash(
+        lambda request: {"text": "deployed"},
+        path="/deploy",
+        token=TOKEN,
+        command="/deploy",
+        cache=ResultCache(),
+        rate_limit=RateLimiter(limit=10),
+    )()
+    server()
+    # Another worker holding the write lock
+    lock = sqlite3.connect(path, isolation_level=None)
+    lock.execute("BEGIN IMMEDIATE")
+    responses = []
+    with TestClient(app) as client:
+        request = threading.Thread(
+            target=lambda: responses.append(client.post(url("/deploy"), data=slash_payload()))
+        )
+        request.start()
+        time.sleep(0.2)
+        started = time.perf_counter()
+        client.portal.call(asyncio.sleep, 0)
+        assert time.perf_counter() - started < 0.1
+        assert not responses
+        lock.execute("COMMIT")
+        request.join(5)
+    assert responses[0].json()["text"] == "deployed"
@@ -0,0 +1,72 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from conftest import TOKEN
+from matterbot import Slash
+
+
+def test_async_generator_answers_then_posts_progress(make_server, slash_payload, fake_mattermost):
+    async def deploy(request):
+        yield {"text": "step 1"}
+        for step in (2, 3):
+            await asyncio.sleep(0.01)
+            yield {"text": f"step {step}"}
+
+    app, server, url = make_server()
+    server.slash(deploy, path="/deploy", token=TOKEN, command="/deploy")()
+    server()
+    response_url = fake_mattermost.response_url("1")
+    with TestClient(app) as client:
+        response = client.post(url("/deploy"), data=slash_payload(response_url=response_url))
+        assert response.json()["text"] == "step 1"
+    texts = [post.body["text"] for post in fake_mattermost.received(response_url)]
+    assert "\n\n".join(texts).split("\n\n") == ["step 2", "step 3"]
+
+
+def test_sync_generator(make_server, slash_payload, fake_mattermost):
+    def count(request):
+        for n in range(3):
+            yield {"text": str(n)}
+
+    app, server, url = make_server()
+    server.slash(count, path="/count", token=TOKEN, command="/count")()
+    server()
+    response_url = fake_mattermost.response_url("1")
+    with TestClient(app) as client:
+        payload = slash_payload("/count", response_url=response_url)
+        assert client.post(url("/count"), data=payload).json()["text"] == "0"
+    texts = [post.body["text"] for post in fake_mattermost.received(response_url)]
+    assert "\n\n".join(texts).split("\n\n") == ["1", "2"]
+
+
+def test_generator_of_models(make_server, slash_payload, fake_mattermost):
+    async def deploy(request):
+        for step in (1, 2, 3):
+            await asyncio.sleep(0.01)
+            yield Slash(text=f"step {step}")
+
+    app, server, url = make_server()
+    server.slash(deploy, path="/deploy", token=TOKEN, command="/deploy")()
+    server()
+    response_url = fake_mattermost.response_url("1")
+    with TestClient(app) as client:
+        response = client.post(url("/deploy"), data=slash_payload(response_url=response_url))
+        assert response.json()["text"] == "step 1"
+    texts = [post.body["text"] for post in fake_mattermost.received(response_url)]
+    assert "\n\n".join(texts).split("\n\n") == ["step 2", "step 3"]
+
+
+def test_empty_generator_gives_an_empty_response(make_server, slash_payload):
+    async def nothing(request):
+        return
+        yield
+
+    app, server, url = make_server()
+    server.slash(nothing, path="/nothing", token=TOKEN, command="/nothing")()
+    server()
+    with TestClient(app) as client:
+        response = client.post(url("/nothing"), data=slash_payload("/nothing"))
+        assert response.status_code == 200
+        assert response.content == b""
+    assert server.admission.stats()["pending"] == 0
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from matterbot import Slash, Slot, Template
+
+
+@pytest.fixture
+def card() -> Template:
+    return Template(
+        Slash,
+        {
+            "response_type": "in_channel",
+            "attachments": [
+                {
+                    "fallback": Slot("summary"),
+                    "text": Slot("summary"),
+                    "color": "#2EB886",
+                    "actions": [
+                        {
+                            "id": "approve",
+                            "name": "Approve",
+                            "integration": {
+                                "url": "https://bot.example.com/approve",
+                                "context": {"request": Slot("request_id", sample="r")},
+                            },
+                        }
+                    ],
+                }
+            ],
+        },
+    )
+
+
+def test_render_and_render_json_agree(card):
+    rendered = card.render(summary='Deploy "api"', request_id="42")
+    assert json.loads(card.render_json(summary='Deploy "api"', request_id="42")) == rendered
+    attachment = rendered["attachments"][0]
+    assert attachment["text"] == attachment["fallback"] == 'Deploy "api"'
+    assert attachment["actions"][0]["integration"]["context"] == {"request": "42"}
+    # Static parts were normalized once, when the template was built
+    assert attachment["color"] == "#2eb886"
+
+
+def test_render_leaves_the_template_alone(card):
+    card.render(summary="one", request_id="1")
+    assert card.render(summary="two", request_id="2")["attachments"][0]["text"] == "two"
+    assert card._static["attachments"][0]["text"] == "x"
+
+
+def test_missing_values(card):
+    with pytest.raises(KeyError, match="request_id"):
+        card.render_json(summary="one")
+
+
+def test_slot_for_an_ignored_field():
+    with pytest.raises(ValueError, match="'note'"):
+        Template(Slash, {"text": "hi", "note": Slot("note")})
+
+
+def test_slot_with_a_none_sample():
+    with pytest.raises(ValueError, match="'user'"):
+        Template(Slash, {"text": "hi", "username": Slot("user", sample=None)})
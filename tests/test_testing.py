@@ -0,0 +1,61 @@
+import requests
+
+from matterbot.testing import FakeMattermost
+
+
+def post(url: str, body=None, **kwargs) -> requests.Response:
+    return requests.post(url, json=body, timeout=5, **kwargs)
+
+
+def test_accepts_posts(fake_mattermost):
+    url = fake_mattermost.hook_url("alerts")
+    assert post(url, {"text": "hi"}).status_code == 200
+    assert requests.post(url, data={"payload": '{"text": "form"}'}, timeout=5).status_code == 200
+    assert [p.body["text"] for p in fake_mattermost.received(url)] == ["hi", "form"]
+
+
+def test_rejects_what_mattermost_would(fake_mattermost):
+    url = fake_mattermost.hook_url("alerts")
+    assert post(url, {"username": "no text"}).status_code == 400
+    assert post(url, {"text": "x" * (fake_mattermost.max_text_length + 1)}).status_code == 400
+    assert requests.post(url, data="not json", timeout=5).status_code == 400
+    assert requests.get(url, timeout=5).status_code == 405
+    assert post(fake_mattermost.url + "/api/v4/posts", {"text": "hi"}).status_code == 404
+    fake_mattermost.max_payload_bytes = 100
+    assert post(url, {"text": "x" * 200}).status_code == 413
+    assert fake_mattermost.received(url) == []
+
+
+def test_response_url_use_limit(fake_mattermost):
+    url = fake_mattermost.response_url("1")
+    statuses = [post(url, {"text": str(n)}).status_code for n in range(6)]
+    assert statuses == [200] * 5 + [400]
+
+
+def test_response_url_expiry():
+    with FakeMattermost(response_url_ttl=0) as mattermost:
+        url = mattermost.response_url("1")
+        assert post(url, {"text": "first"}).status_code == 200
+        assert post(url, {"text": "late"}).status_code == 404
+
+
+def test_injected_failures(fake_mattermost):
+    url = fake_mattermost.hook_url("alerts")
+    fake_mattermost.fail_next(429)
+    fake_mattermost.fail_next(503)
+    throttled = post(url, {"text": "hi"})
+    assert throttled.status_code == 429
+    assert throttled.headers["Retry-After"] == "1"
+    assert post(url, {"text": "hi"}).status_code == 503
+    assert post(url, {"text": "hi"}).status_code == 200
+    assert fake_mattermost.stats() == {"posts": 3, "by_status": {429: 1, 503: 1, 200: 1}}
+
+
+def test_random_failures_are_reproducible():
+    def statuses() -> list[int]:
+        with FakeMattermost(error_rate=0.3, throttle_rate=0.2, seed=1) as mattermost:
+            return [post(mattermost.hook_url("a"), {"text": "x"}).status_code for _ in range(20)]
+
+    first = statuses()
+    assert first == statuses()
+    assert {200, 429, 503} <= set(first)
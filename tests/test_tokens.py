@@ -0,0 +1,104 @@
+import json
+import os
+
+from fastapi.testclient import TestClient
+
+from conftest import TOKEN
+from matterbot.server.tokens import TokenRegistry
+
+
+def test_several_tokens_per_key():
+    tokens = TokenRegistry()
+    tokens.add("/deploy", ["old", "new"])
+    assert tokens.verify("/deploy", "old")
+    assert tokens.verify("/deploy", "new")
+    assert not tokens.verify("/deploy", "other")
+    assert not tokens.verify("/deploy", None)
+    # Unprotected keys accept anything
+    assert tokens.verify("/open", None)
+
+
+def test_reloads_from_a_file(tmp_path):
+    path = tmp_path / "tokens.json"
+    path.write_text(json.dumps({"/deploy": ["one"]}))
+    tokens = TokenRegistry(source=path, reload_interval=0)
+    tokens.add("/deploy", "static")
+    assert tokens.verify("/deploy", "one")
+
+    path.write_text(json.dumps({"/deploy": ["two"]}))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert tokens.verify("/deploy", "two")
+    assert not tokens.verify("/deploy", "one")
+    assert tokens.verify("/deploy", "static")
+
+
+def test_keeps_tokens_when_reload_fails(tmp_path):
+    loaded = {"/deploy": ["one"]}
+
+    def source():
+        if loaded is None:
+            raise OSError("unavailable")
+        return loaded
+
+    tokens = TokenRegistry(source=source, reload_interval=0)
+    assert tokens.verify("/deploy", "one")
+    loaded = None
+    assert tokens.verify("/deploy", "one")
+
+
+def test_middleware_rejects_before_validation(make_server, slash_payload):
+    calls = []
+
+    def deploy(request):
+        calls.append(request)
+        return {"text": "ok"}
+
+    app, server, url = make_server()
+    server.slash(deploy, path="/deploy", token=TOKEN, command="/deploy")()
+    server()
+    with TestClient(app) as client:
+        # Not even a valid request, but the token is checked first
+        response = client.post(url("/deploy"), data={"command": "/deploy", "token": "wrong"})
+        assert response.status_code == 401
+        response = client.post(url("/deploy"), json=slash_payload(token="wrong"))
+        assert response.status_code == 401
+        response = client.post(url("/deploy"), data=slash_payload())
+        assert response.status_code == 200
+    assert len(calls) == 1
+
+
+def test_rotates_tokens_without_restarting(make_server, slash_payload, tmp_path):
+    path = tmp_path / "tokens.json"
+    path.write_text(json.dumps({}))
+    app, server, url = make_server(tokens=TokenRegistry(source=path, reload_interval=0))
+    server.slash(lambda request: {"text": "ok"}, path="/deploy", token=TOKEN, command="/deploy")()
+    server()
+    with TestClient(app) as client:
+        assert client.post(url("/deploy"), data=slash_payload(token="rotated")).status_code == 401
+        path.write_text(json.dumps({"/deploy": ["rotated"]}))
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert client.post(url("/deploy"), data=slash_payload(token="rotated")).status_code == 200
+        assert client.post(url("/deploy"), data=slash_payload()).status_code == 200
+
+
+def test_middleware_rejects_tokens_and_commands_that_are_not_strings(make_server, slash_payload):
+    app, server, url = make_server()
+    server.slash(lambda request: {"text": "ok"}, path="/deploy", token=TOKEN, command="/deploy")()
+    server()
+    with TestClient(app) as client:
+        for token in (123, [TOKEN], {"token": TOKEN}):
+            assert client.post(url("/deploy"), json=slash_payload(token=token)).status_code == 401
+        # In dispatcher mode the command picks the token to check; otherwise it's left to validation
+        response = client.post(url("/deploy"), json=slash_payload(command=["/deploy"]))
+        assert response.status_code == (401 if server.dispatch_path is not None else 422)
+
+
+def test_middleware_refuses_oversized_bodies(make_server, slash_payload):
+    app, server, url = make_server()
+    server.slash(lambda request: {"text": "ok"}, path="/deploy", token=TOKEN, command="/deploy")()
+    server()
+    with TestClient(app) as client:
+        response = client.post(url("/deploy"), data=slash_payload(text="x" * 400_000))
+        assert response.status_code == 413
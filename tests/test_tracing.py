@@ -0,0 +1,99 @@
+import asyncio
+import contextvars
+import threading
+
+from fastapi.testclient import TestClient
+
+from conftest import TOKEN
+from matterbot import Tracer
+from matterbot.tracing import SpanExporter, current_span
+
+
+class Collector(SpanExporter):
+    def __init__(self, fail: int = 0) -> None:
+        self.fail = fail
+        self.batches = []
+
+    def export(self, spans) -> None:
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("collector unavailable")
+        self.batches.append(list(spans))
+
+    @property
+    def spans(self) -> list:
+        return [span for batch in self.batches for span in batch]
+
+
+def test_noop_by_default():
+    tracer = Tracer()
+    with tracer.span("a") as span:
+        assert not span.recording
+        assert current_span() is None
+
+
+def test_spans_nest_across_threads():
+    collector = Collector()
+    tracer = Tracer(collector)
+
+    def hook():
+        with tracer.span("hook"):
+            pass
+
+    with tracer.span("request") as request:
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(hook,))
+        worker.start()
+        worker.join()
+    tracer.flush()
+    hook, parent = sorted(collector.spans, key=lambda span: span.name)
+    assert parent is request
+    assert hook.parent_id == request.span_id
+    assert hook.trace_id == request.trace_id
+
+
+def test_flush_carries_on_after_a_failed_batch(caplog):
+    collector = Collector(fail=1)
+    tracer = Tracer(collector, batch_size=2)
+    for n in range(5):
+        with tracer.span(str(n)):
+            pass
+    tracer.flush()
+    assert [span.name for span in collector.spans] == ["2", "3", "4"]
+    assert "Could not export 2 spans" in caplog.text
+
+
+def test_queue_is_bounded():
+    tracer = Tracer(Collector(), max_queue=3, export_interval=60)
+    for n in range(5):
+        with tracer.span(str(n)):
+            pass
+    assert tracer.dropped == 2
+    tracer.shutdown()
+
+
+def test_request_hook_and_delivery_share_a_trace(make_server, slash_payload, fake_mattermost):
+    collector = Collector()
+
+    async def hook(request):
+        await asyncio.sleep(0)
+        return {"text": "done"}
+
+    app, server, url = make_server(tracer=Tracer(collector))
+    server.slash_delayed_response(
+        lambda request: {"text": "started"},
+        path="/deploy",
+        token=TOKEN,
+        command="/deploy",
+        hooks=hook,
+    )()
+    server()
+    response_url = fake_mattermost.response_url("1")
+    with TestClient(app) as client:
+        client.post(url("/deploy"), data=slash_payload(response_url=response_url))
+    spans = {span.name: span for span in collector.spans}
+    assert {"slash /deploy", "handler", "hook hook", "deliver"} <= spans.keys()
+    root = spans["slash /deploy"]
+    assert {span.trace_id for span in spans.values()} == {root.trace_id}
+    assert spans["hook hook"].parent_id == root.span_id
+    (post,) = fake_mattermost.received(response_url)
+    assert post.headers["traceparent"].split("-")[1] == f"{root.trace_id:032x}"